@@ -1,5 +1,11 @@
 """Empire OS prototype package."""
+import time
+
+_import_started = time.perf_counter()
 
 __all__ = ["create_app"]
 
 from .main import create_app  # noqa: E402
+from .instrumentation import record_startup_phase  # noqa: E402
+
+record_startup_phase("import", time.perf_counter() - _import_started)
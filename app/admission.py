@@ -0,0 +1,320 @@
+"""Admission control: per-client rate limits and per-class concurrency caps.
+
+Every request is assigned an endpoint class (``ingest``, ``search``,
+``heavy`` or ``reads``) by path prefix. ``heavy`` covers the endpoints that
+scan whole tables (analytics exports, rule backtests, chain verification).
+Each class has its own :class:`AdmissionPolicy`:
+
+* a token bucket per client (``rate`` requests/second, ``burst`` deep);
+  an empty bucket answers ``429`` with ``Retry-After`` set to the refill time;
+* a concurrency limit shared by all clients; requests that find it full wait
+  at most ``queue_timeout`` seconds behind at most ``max_queue`` others and
+  are otherwise shed with ``503``.
+
+Separate limits keep a burst of uploads or expensive searches from starving
+dashboard reads of the SQLite writer and CPU. Policies default to generous
+values and can be tuned with ``EMPIRE_ADMISSION_<CLASS>`` (for example
+``EMPIRE_ADMISSION_INGEST="rate=2,burst=10,concurrency=2"``); set
+``EMPIRE_ADMISSION=0`` to disable the middleware. ``/metrics`` is never
+limited so overload stays observable.
+
+Clients are keyed by peer address. ``X-Forwarded-For`` is only honoured when
+the peer is a trusted proxy listed in ``EMPIRE_TRUSTED_PROXIES`` (comma
+separated addresses or networks); the client is then the nearest forwarded
+address that is not itself a trusted proxy.
+"""
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from typing import Awaitable, Callable, Iterable, Mapping, Optional, Sequence
+
+from .instrumentation import ENABLED as METRICS_ENABLED, count, registry
+
+ENABLED = os.getenv("EMPIRE_ADMISSION", "1") != "0"
+
+# First matching prefix wins; anything unmatched is a read.
+ENDPOINT_CLASSES: tuple[tuple[str, str], ...] = (
+    ("/ingest/", "ingest"),
+    ("/search/", "search"),
+    ("/analytics/exports", "heavy"),
+    ("/agents/rules/evaluate", "heavy"),
+    ("/events/verify", "heavy"),
+)
+DEFAULT_CLASS = "reads"
+EXEMPT_PATHS = frozenset({"/metrics"})
+MAX_TRACKED_CLIENTS = 10_000
+
+Scope = dict
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    rate: float
+    burst: int
+    concurrency: int
+    queue_timeout: float = 2.0
+    max_queue: int = 64
+
+    def with_overrides(self, spec: str) -> "AdmissionPolicy":
+        """Apply ``key=value`` pairs (comma separated) from an env var."""
+        kinds = {field.name: field.type for field in fields(self)}
+        changes: dict[str, float | int] = {}
+        for item in spec.split(","):
+            if not item.strip():
+                continue
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in kinds:
+                raise ValueError(f"Unknown admission setting {key!r}")
+            changes[key] = float(value) if kinds[key] == "float" else int(value)
+        return replace(self, **changes)
+
+
+DEFAULT_POLICIES: dict[str, AdmissionPolicy] = {
+    "ingest": AdmissionPolicy(rate=10.0, burst=100, concurrency=4, queue_timeout=5.0),
+    "search": AdmissionPolicy(rate=20.0, burst=100, concurrency=8),
+    "heavy": AdmissionPolicy(rate=1.0, burst=30, concurrency=2, queue_timeout=10.0, max_queue=8),
+    "reads": AdmissionPolicy(rate=100.0, burst=400, concurrency=64, max_queue=256),
+}
+
+
+def classify(path: str) -> Optional[str]:
+    """Endpoint class for ``path``; ``None`` for exempt paths."""
+    if path in EXEMPT_PATHS:
+        return None
+    for prefix, endpoint_class in ENDPOINT_CLASSES:
+        if path.startswith(prefix):
+            return endpoint_class
+    return DEFAULT_CLASS
+
+
+class TokenBucket:
+    """Lazily refilled token bucket; not thread-safe on its own."""
+
+    def __init__(self, rate: float, burst: int, now: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now: Optional[float] = None) -> float:
+        """Consume a token; return ``0.0`` or the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (1.0 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets keyed by ``(endpoint_class, client)``, LRU bounded."""
+
+    def __init__(
+        self,
+        policies: Mapping[str, AdmissionPolicy],
+        max_clients: int = MAX_TRACKED_CLIENTS,
+    ) -> None:
+        self.policies = policies
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, endpoint_class: str, client: str, now: Optional[float] = None) -> float:
+        key = (endpoint_class, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                policy = self.policies[endpoint_class]
+                bucket = self._buckets[key] = TokenBucket(policy.rate, policy.burst, now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """Bounded concurrency with a bounded, time-limited wait queue."""
+
+    def __init__(self, endpoint_class: str, policy: AdmissionPolicy) -> None:
+        self.endpoint_class = endpoint_class
+        self.policy = policy
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.policy.concurrency)
+        if self._semaphore.locked():
+            if self.waiting >= self.policy.max_queue:
+                raise Shed("queue_full", self.policy.queue_timeout)
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.policy.queue_timeout)
+            except asyncio.TimeoutError:
+                raise Shed("queue_timeout", self.policy.queue_timeout) from None
+            finally:
+                self.waiting -= 1
+                if METRICS_ENABLED:
+                    registry.histogram(
+                        "empire_admission_queue_seconds",
+                        "Time requests waited for a concurrency slot.",
+                        endpoint_class=self.endpoint_class,
+                    ).observe(time.perf_counter() - started)
+        else:
+            await self._semaphore.acquire()
+        self._set_in_flight(1)
+
+    def release(self) -> None:
+        self._set_in_flight(-1)
+        assert self._semaphore is not None
+        self._semaphore.release()
+
+    def _set_in_flight(self, delta: int) -> None:
+        self.in_flight += delta
+        if METRICS_ENABLED:
+            registry.gauge(
+                "empire_admission_in_flight",
+                "Requests currently admitted per endpoint class.",
+                endpoint_class=self.endpoint_class,
+            ).set(self.in_flight)
+
+
+def policies_from_env(base: Mapping[str, AdmissionPolicy] = DEFAULT_POLICIES) -> dict[str, AdmissionPolicy]:
+    policies = dict(base)
+    for endpoint_class, policy in base.items():
+        spec = os.getenv(f"EMPIRE_ADMISSION_{endpoint_class.upper()}")
+        if spec:
+            policies[endpoint_class] = policy.with_overrides(spec)
+    return policies
+
+
+Network = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def parse_trusted_proxies(spec: str | Iterable[str]) -> tuple[Network, ...]:
+    """Networks from comma separated (or listed) addresses and CIDR blocks."""
+    items = spec.split(",") if isinstance(spec, str) else spec
+    return tuple(ipaddress.ip_network(item.strip(), strict=False) for item in items if item.strip())
+
+
+def _is_trusted(address: str, proxies: Sequence[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_id(scope: Scope, trusted_proxies: Sequence[Network] = ()) -> str:
+    """Rate-limit key: the peer address, or the forwarded client behind a trusted proxy.
+
+    Client-supplied headers are ignored unless the peer is a trusted proxy,
+    so callers cannot pick their own bucket.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "anonymous"
+    if not trusted_proxies or not _is_trusted(peer, trusted_proxies):
+        return peer
+    forwarded: list[str] = []
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            forwarded.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+    # Walk back from the nearest hop; earlier entries are client controlled.
+    for hop in reversed(forwarded):
+        if hop and not _is_trusted(hop, trusted_proxies):
+            return hop
+    return peer
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying :class:`RateLimiter` and :class:`ConcurrencyGate`.
+
+    Classes missing from ``policies`` keep their :data:`DEFAULT_POLICIES`, so
+    a partial override never leaves an endpoint class unlimited.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        policies: Optional[Mapping[str, AdmissionPolicy]] = None,
+        trusted_proxies: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.app = app
+        self.policies = policies_from_env() if policies is None else {**DEFAULT_POLICIES, **policies}
+        self.trusted_proxies = parse_trusted_proxies(
+            os.getenv("EMPIRE_TRUSTED_PROXIES", "") if trusted_proxies is None else trusted_proxies
+        )
+        self.limiter = RateLimiter(self.policies)
+        self.gates = {name: ConcurrencyGate(name, policy) for name, policy in self.policies.items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint_class = classify(scope["path"])
+        if endpoint_class is None or endpoint_class not in self.policies:
+            await self.app(scope, receive, send)
+            return
+
+        wait = self.limiter.check(endpoint_class, client_id(scope, self.trusted_proxies))
+        if wait:
+            await self._reject(send, 429, "rate_limited", endpoint_class, wait)
+            return
+        gate = self.gates[endpoint_class]
+        try:
+            await gate.acquire()
+        except Shed as shed:
+            await self._reject(send, 503, shed.reason, endpoint_class, shed.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    async def _reject(
+        self, send: Send, status: int, reason: str, endpoint_class: str, retry_after: float
+    ) -> None:
+        count(
+            "empire_admission_shed_total",
+            "Requests rejected by admission control.",
+            endpoint_class=endpoint_class,
+            reason=reason,
+        )
+        seconds = str(max(1, math.ceil(min(retry_after, 3600))))
+        body = f'{{"detail":"{reason.replace("_", " ")}"}}'.encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", seconds.encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
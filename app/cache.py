@@ -0,0 +1,173 @@
+"""Response caching for read-heavy dashboard endpoints."""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Protocol, Sequence, Union
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_TTL_SECONDS = 5.0
+DEFAULT_MAX_ENTRIES = 512
+
+_DIRTY_KEY = "response_cache_tags"
+
+# Backends in use by this process; a commit bumps tag versions in each. Tag
+# versions live in the backend itself so a shared backend (e.g. Redis) sees
+# invalidations made by every worker.
+_backends: "weakref.WeakSet[CacheBackend]" = weakref.WeakSet()
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    media_type: str = "application/json"
+    headers: tuple[tuple[str, str], ...] = ()
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def tag_versions(self, tags: Sequence[str]) -> list[int]:
+        """Current version counter of each tag (``0`` if never bumped)."""
+        ...
+
+    def bump_tags(self, tags: Iterable[str]) -> None:
+        """Atomically increment the version counter of each tag."""
+        ...
+
+
+class LRUCacheBackend:
+    """In-process LRU with per-entry expiry.
+
+    Bumping a tag changes every cache key built from it, so stale entries
+    simply stop being addressed and age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def tag_versions(self, tags: Sequence[str]) -> list[int]:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+def invalidate(*tags: str) -> None:
+    for backend in list(_backends):
+        backend.bump_tags(tags)
+
+
+def mark_dirty(session: Session, *tags: str) -> None:
+    """Invalidate ``tags`` once the session's current transaction commits."""
+    session.info.setdefault(_DIRTY_KEY, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    tags = session.info.pop(_DIRTY_KEY, None)
+    if tags:
+        invalidate(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def compute_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """Cache serialized responses keyed by request URL and tag versions."""
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        ttl: float = DEFAULT_TTL_SECONDS,
+    ) -> None:
+        self.backend = backend or LRUCacheBackend()
+        self.ttl = ttl
+        _backends.add(self.backend)
+
+    def key_for(self, request: Request, tags: Iterable[str]) -> str:
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        names = sorted(tags)
+        versions = ",".join(
+            f"{tag}:{version}" for tag, version in zip(names, self.backend.tag_versions(names))
+        )
+        return f"{request.url.path}?{query}|{versions}"
+
+    def respond(
+        self,
+        request: Request,
+        tags: Iterable[str],
+        produce: Callable[[], Union[bytes, tuple[bytes, dict[str, str]]]],
+    ) -> Response:
+        """Serve ``produce()`` from cache; it may return ``(body, headers)``."""
+        key = self.key_for(request, tags)
+        cached = self.backend.get(key)
+        if cached is None:
+            produced = produce()
+            body, extra = produced if isinstance(produced, tuple) else (produced, {})
+            cached = CachedResponse(
+                body=body, etag=compute_etag(body), headers=tuple(extra.items())
+            )
+            self.backend.set(key, cached, self.ttl)
+
+        headers = {"ETag": cached.etag, "Cache-Control": "no-cache", **dict(cached.headers)}
+        if _etag_matches(request.headers.get("if-none-match"), cached.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=cached.body, media_type=cached.media_type, headers=headers)
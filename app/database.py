@@ -1,10 +1,13 @@
 """Database utilities for the Empire OS prototype."""
 from __future__ import annotations
 
+import threading
+import zlib
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, Iterator, Optional, Sequence, TypeVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 DATABASE_URL = "sqlite:///./empire.db"
@@ -16,12 +19,68 @@ engine = create_engine(
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 Base = declarative_base()
 
+# Keep IN (...) lists well below SQLite's bound-parameter limit.
+IN_CLAUSE_CHUNK = 500
 
-def init_db() -> None:
-    """Import models and create all tables."""
+T = TypeVar("T")
+
+
+def chunked(values: Sequence[T], size: int = IN_CLAUSE_CHUNK) -> Iterator[Sequence[T]]:
+    """Yield consecutive slices of ``values`` small enough for an ``IN`` list."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+_checked_engines: set[str] = set()
+_schema_lock = threading.Lock()
+
+
+def schema_fingerprint() -> int:
+    """Stable 31-bit digest of the declared tables, columns and indexes."""
     from . import models  # noqa: F401  # Ensure models are registered
 
-    Base.metadata.create_all(bind=engine)
+    parts: list[str] = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        parts.extend(f"{column.name}:{column.type!r}" for column in table.columns)
+        parts.extend(sorted(index.name or "" for index in table.indexes))
+    return zlib.crc32("|".join(parts).encode("utf-8")) & 0x7FFFFFFF
+
+
+def init_db(bind: Optional[Engine] = None) -> None:
+    """Import models, then create or migrate the schema.
+
+    The schema fingerprint is kept in SQLite's ``user_version`` so processes
+    starting against an up-to-date database skip reflection, and each engine
+    is only checked once per process. On a mismatch, missing tables, columns
+    and indexes are added by :func:`app.migrations.migrate`; the fingerprint
+    is only stamped once every declared column exists, otherwise
+    :class:`app.migrations.SchemaMismatch` is raised.
+    """
+    bind = bind or SessionLocal.kw.get("bind") or engine
+    key = str(bind.url)
+    if key in _checked_engines:
+        return
+    with _schema_lock:
+        if key in _checked_engines:
+            return
+        fingerprint = schema_fingerprint()
+        is_sqlite = bind.dialect.name == "sqlite"
+        current = None
+        if is_sqlite:
+            with bind.connect() as conn:
+                current = conn.execute(text("PRAGMA user_version")).scalar()
+        if current != fingerprint:
+            from .migrations import SchemaMismatch, migrate, missing_columns
+
+            migrate(bind)
+            missing = missing_columns(bind)
+            if missing:
+                raise SchemaMismatch(f"Schema migration left columns missing: {', '.join(missing)}")
+            if is_sqlite:
+                with bind.begin() as conn:
+                    conn.execute(text(f"PRAGMA user_version = {fingerprint}"))
+        _checked_engines.add(key)
 
 
 def get_db() -> Generator[Session, None, None]:
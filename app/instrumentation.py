@@ -0,0 +1,204 @@
+"""Lightweight timing spans, SQL statistics and Prometheus exposition.
+
+Set ``EMPIRE_METRICS=0`` to disable collection; spans then return a shared
+no-op context manager and the SQLAlchemy hooks are never installed.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Iterator, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENABLED = os.getenv("EMPIRE_METRICS", "1") != "0"
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_NULL_SPAN: ContextManager[None] = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+class Registry:
+    """Process-wide metric families keyed by name and label set."""
+
+    def __init__(self) -> None:
+        self._families: dict[str, tuple[str, str, dict[LabelKey, object]]] = {}
+        self._lock = threading.Lock()
+
+    def _child(self, kind: str, name: str, help_text: str, labels: dict[str, str], factory):
+        key: LabelKey = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is None or key not in family[2]:
+            with self._lock:
+                family = self._families.setdefault(name, (kind, help_text, {}))
+                family[2].setdefault(key, factory())
+        return family[2][key]
+
+    def histogram(self, name: str, help_text: str, **labels: str) -> Histogram:
+        return self._child("histogram", name, help_text, labels, Histogram)
+
+    def counter(self, name: str, help_text: str, **labels: str) -> Counter:
+        return self._child("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name: str, help_text: str, **labels: str) -> Gauge:
+        return self._child("gauge", name, help_text, labels, Gauge)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            families = sorted((name, (kind, help_text, dict(children)))
+                              for name, (kind, help_text, children) in self._families.items())
+        for name, (kind, help_text, children) in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(children.items()):
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, float("inf")), metric.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(key, le=le)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(key)} {metric.sum}")
+                    lines.append(f"{name}_count{_labels(key)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_labels(key)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: LabelKey, **extra: str) -> str:
+    pairs = [*key, *extra.items()]
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = Registry()
+
+
+@contextmanager
+def _timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.histogram(
+            "empire_stage_duration_seconds",
+            "Duration of instrumented ingest and search stages.",
+            stage=stage,
+        ).observe(time.perf_counter() - start)
+
+
+def span(stage: str) -> ContextManager[None]:
+    """Time a block of work under ``stage``; a no-op when metrics are disabled."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _timed(stage)
+
+
+def count(name: str, help_text: str, amount: float = 1.0, **labels: str) -> None:
+    """Increment a counter; a no-op when metrics are disabled."""
+    if ENABLED:
+        registry.counter(name, help_text, **labels).inc(amount)
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._empire_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = getattr(context, "_empire_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    kind = _statement_kind(statement)
+    registry.histogram(
+        "empire_sql_duration_seconds",
+        "Duration of SQL statements by statement kind.",
+        operation=kind,
+    ).observe(elapsed)
+    registry.counter(
+        "empire_sql_statements_total",
+        "Number of SQL statements executed by statement kind.",
+        operation=kind,
+    ).inc()
+
+
+_hooks_installed = False
+
+
+def install_sql_hooks(target: Optional[object] = None) -> None:
+    """Attach SQL timing hooks to ``target`` (every engine by default)."""
+    global _hooks_installed
+    if not ENABLED or _hooks_installed:
+        return
+    target = target or Engine
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    _hooks_installed = True
+
+
+def record_startup_phase(phase: str, seconds: float) -> None:
+    """Record how long a startup phase (import, schema) took; always kept."""
+    registry.gauge(
+        "empire_startup_seconds",
+        "Duration of application startup phases.",
+        phase=phase,
+    ).set(seconds)
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -1,29 +1,125 @@
 """FastAPI application wiring for Empire OS prototype."""
 from __future__ import annotations
 
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, Iterator, List, Mapping, Optional
 
-from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from . import models, schemas
-from .database import get_db, init_db
+from . import models, schemas, serializers
+from .admission import ENABLED as ADMISSION_ENABLED, AdmissionMiddleware, AdmissionPolicy
+from .cache import CacheBackend, ResponseCache
+from .database import chunked, get_db, init_db
+from .instrumentation import install_sql_hooks, record_startup_phase, render_metrics
+from .services import analytics
 from .services.agent import FinanceAgent
-from .services.ingest import IngestService, list_events, search_documents
+from .services.chain import shutdown_pool, verify_incremental, verify_segments
+from .services.embeddings import shared_strategy
+from .services.events import list_events, parse_entity
+from .services.ingest import IngestService
+from .services.rules import RuleSet, load_columns, load_rules
+from .services.search import search_documents
+from .services.suggestions import (
+    encode_cursor,
+    queue_filters,
+    select_queue,
+    sort_key,
+    summarize,
+)
+from .sharding import ShardRouter, ShardScope, UnknownLLC, merge_sorted
 
 
-def create_app() -> FastAPI:
+def _timed_init_db() -> None:
+    started = time.perf_counter()
     init_db()
-    app = FastAPI(title="Empire OS Prototype", version="0.1.0")
+    record_startup_phase("schema", time.perf_counter() - started)
 
+
+@contextmanager
+def _llc_scope(
+    router: ShardRouter, db: Session, llc: Optional[str], llc_id: Optional[int] = None
+) -> Iterator[ShardScope]:
+    try:
+        with router.scope(db, llc, llc_id=llc_id) as scope:
+            yield scope
+    except UnknownLLC as exc:
+        raise HTTPException(status_code=404, detail=f"LLC {exc.args[0]!r} not found") from exc
+
+
+def _locate_suggestions(sessions: List[Session], ids: List[int]) -> List[set[int]]:
+    """The ``ids`` present in each session; 409 if any is held by several shards.
+
+    Suggestion ids are shard-local, so an id found in more than one shard is
+    ambiguous and the caller must narrow the scope with ``llc`` or ``llc_id``.
+    """
+    located = [
+        {
+            found
+            for chunk in chunked(ids)
+            for found in session.scalars(
+                select(models.AgentSuggestion.id).where(models.AgentSuggestion.id.in_(chunk))
+            )
+        }
+        for session in sessions
+    ]
+    holders = Counter(found for ids_found in located for found in ids_found)
+    ambiguous = sorted(found for found, shards in holders.items() if shards > 1)
+    if ambiguous:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Suggestion ids {ambiguous} exist in several shards; pass llc_id",
+        )
+    return located
+
+
+def create_app(
+    cache_backend: Optional[CacheBackend] = None,
+    *,
+    eager_init: bool = False,
+    shard_router: Optional[ShardRouter] = None,
+    admission_policies: Optional[Mapping[str, AdmissionPolicy]] = None,
+) -> FastAPI:
+    """Build the API application.
+
+    By default the schema check runs in the lifespan hook, so importing the
+    module (workers, CLIs, tests) does not touch the database; pass
+    ``eager_init=True`` to check it during construction instead. Admission
+    control uses ``admission_policies`` when given, else the environment.
+    """
+    install_sql_hooks()
+    if eager_init:
+        _timed_init_db()
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+        _timed_init_db()
+        yield
+        shutdown_pool()
+
+    app = FastAPI(title="Empire OS Prototype", version="0.1.0", lifespan=lifespan)
+    cache = ResponseCache(cache_backend)
+    app.state.response_cache = cache
+    router = shard_router or ShardRouter.from_env()
+    app.state.shard_router = router
+
+    if admission_policies is not None or ADMISSION_ENABLED:
+        # Added before CORS so rejections still carry CORS headers.
+        app.add_middleware(AdmissionMiddleware, policies=admission_policies)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor", "Retry-After"],
     )
 
     @app.post("/ingest/purchase", response_model=schemas.PurchaseIngestResponse)
@@ -39,29 +135,164 @@ def create_app() -> FastAPI:
             db.commit()
             db.refresh(llc)
 
-        service = IngestService(db)
-        purchase_order, events, suggestions = service.ingest_purchase(llc, file)
-        return schemas.PurchaseIngestResponse(
-            purchase_order=purchase_order,
-            events=events,
-            suggestions=suggestions,
-        )
+        with router.session_for(db, llc) as session:
+            service = IngestService(session)
+            purchase_order, events, suggestions = service.ingest_purchase(
+                router.local_llc(session, llc), file
+            )
+            return schemas.PurchaseIngestResponse(
+                purchase_order=purchase_order,
+                events=events,
+                suggestions=suggestions,
+            )
+
+    @app.post("/ingest/statement", response_model=schemas.StatementIngestResponse)
+    def ingest_statement(
+        llc_name: str = Form(...),
+        file: UploadFile = File(...),
+        db: Session = Depends(get_db),
+    ) -> schemas.StatementIngestResponse:
+        llc = db.query(models.LLC).filter(models.LLC.name == llc_name).one_or_none()
+        if not llc:
+            llc = models.LLC(name=llc_name)
+            db.add(llc)
+            db.commit()
+            db.refresh(llc)
+
+        with router.session_for(db, llc) as session:
+            service = IngestService(session)
+            try:
+                result = service.ingest_statement(router.local_llc(session, llc), file)
+            except ValueError as exc:
+                session.rollback()
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
+            return schemas.StatementIngestResponse(
+                media_object=result.media,
+                purchase_order_ids=result.purchase_order_ids,
+                credit_line_items=result.credit_line_items,
+                total_amount_base=result.total_amount_base,
+                events=result.events,
+                suggestions=result.suggestions,
+            )
 
     @app.get("/events", response_model=List[schemas.Event])
-    def get_events(limit: int = 50, db: Session = Depends(get_db)) -> List[schemas.Event]:
-        return list(list_events(db, limit=limit))
+    def get_events(
+        request: Request,
+        limit: int = 50,
+        entity: Optional[str] = None,
+        type: Optional[str] = None,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> Response:
+        entity_ref = None
+        if entity:
+            try:
+                entity_ref = parse_entity(entity)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    @app.get("/purchase_orders", response_model=List[schemas.PurchaseOrder])
-    def get_purchase_orders(db: Session = Depends(get_db)) -> List[schemas.PurchaseOrder]:
-        return (
-            db.query(models.PurchaseOrder)
-            .order_by(models.PurchaseOrder.created_at.desc())
-            .all()
+        def produce() -> bytes:
+            with _llc_scope(router, db, llc) as scope:
+                scoped_entity = entity_ref
+                if scoped_entity is None and scope.llc_id is not None:
+                    scoped_entity = ("llc", scope.llc_id)
+                rows = [
+                    list_events(
+                        session,
+                        limit=limit,
+                        entity=scoped_entity,
+                        event_type=type,
+                        columns=serializers.EVENT_COLUMNS,
+                    ).all()
+                    for session in scope.sessions
+                ]
+            return serializers.encode_events(
+                merge_sorted(rows, key=lambda row: (row[3], row[0]), limit=limit)
+            )
+
+        return cache.respond(request, ["events"], produce)
+
+    @app.post("/events/verify", response_model=schemas.ChainVerification)
+    def verify_events(
+        mode: str = "incremental",
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> schemas.ChainVerification:
+        """Verify the event chain of every database in scope.
+
+        Each shard keeps its own chain, so without ``llc`` the primary database
+        and every dedicated shard are verified; the top-level fields describe
+        the first broken chain (else the primary's) and ``shards`` has each one.
+        """
+        if mode not in ("incremental", "full", "segments"):
+            raise HTTPException(status_code=400, detail=f"Unknown verification mode {mode!r}")
+        with _llc_scope(router, db, llc) as scope:
+            shards = []
+            for session, shard in zip(scope.sessions, scope.shards):
+                if mode == "segments":
+                    result = verify_segments(session)
+                else:
+                    result = verify_incremental(session, from_checkpoint=mode == "incremental")
+                verified = schemas.ShardChainVerification.from_orm(result)
+                verified.shard_llc_id = shard
+                shards.append(verified)
+        head = next((shard for shard in shards if not shard.ok), shards[0])
+        return schemas.ChainVerification(
+            **{
+                **head.dict(),
+                "ok": all(shard.ok for shard in shards),
+                "verified_events": sum(shard.verified_events for shard in shards),
+                "segments_verified": sum(shard.segments_verified for shard in shards),
+            },
+            shards=shards,
         )
 
+    @app.get("/purchase_orders", response_model=List[schemas.PurchaseOrder])
+    def get_purchase_orders(
+        request: Request,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> Response:
+        def produce() -> bytes:
+            with _llc_scope(router, db, llc) as scope:
+                stmt = serializers.select_purchase_orders().order_by(
+                    models.PurchaseOrder.created_at.desc(), models.PurchaseOrder.id.desc()
+                )
+                if scope.llc_id is not None:
+                    stmt = stmt.where(models.PurchaseOrder.llc_id == scope.llc_id)
+                rows = [session.execute(stmt).all() for session in scope.sessions]
+            return serializers.encode_purchase_orders(
+                merge_sorted(rows, key=lambda row: (row[12], row[0], row[14]))
+            )
+
+        return cache.respond(request, ["purchase_orders"], produce)
+
     @app.get("/search/documents", response_model=List[schemas.SearchResult])
-    def search(query: str, db: Session = Depends(get_db)) -> List[schemas.SearchResult]:
-        results = search_documents(db, query)
+    def search(
+        query: str,
+        mode: str = "hybrid",
+        limit: int = 20,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> List[schemas.SearchResult]:
+        with _llc_scope(router, db, llc) as scope:
+            # Cosine scores are only comparable within one embedding strategy.
+            strategy = shared_strategy(scope.sessions)
+            if strategy is None:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Shards use different embedding strategies; finish the backfill on every shard",
+                )
+            try:
+                per_shard = [
+                    search_documents(
+                        session, query, mode=mode, limit=limit, llc_id=scope.llc_id, strategy=strategy
+                    )
+                    for session in scope.sessions
+                ]
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
+        results = merge_sorted(per_shard, key=lambda item: item[1], limit=limit)
         payload: List[schemas.SearchResult] = []
         for media, score in results:
             excerpt = (
@@ -73,6 +304,7 @@ def create_app() -> FastAPI:
             payload.append(
                 schemas.SearchResult(
                     media_object_id=media.id,
+                    llc_id=media.llc_id,
                     score=score,
                     excerpt=excerpt,
                     filename=filename,
@@ -83,14 +315,118 @@ def create_app() -> FastAPI:
 
     @app.get("/agents/suggestions", response_model=List[schemas.AgentSuggestion])
     def get_suggestions(
-        limit: int = 50, db: Session = Depends(get_db)
-    ) -> List[schemas.AgentSuggestion]:
-        query = db.query(models.AgentSuggestion).order_by(
-            models.AgentSuggestion.created_at.desc()
+        request: Request,
+        limit: int = 50,
+        approved: Optional[bool] = None,
+        suggestion_type: Optional[str] = None,
+        purchase_order_id: Optional[int] = None,
+        vendor_id: Optional[int] = None,
+        llc: Optional[str] = None,
+        order: str = "recent",
+        cursor: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> Response:
+        """Review queue page; pass the ``X-Next-Cursor`` header back as ``cursor``."""
+
+        def produce() -> tuple[bytes, dict[str, str]]:
+            with _llc_scope(router, db, llc) as scope:
+                filters = queue_filters(
+                    approved=approved,
+                    suggestion_type=suggestion_type,
+                    purchase_order_id=purchase_order_id,
+                    vendor_id=vendor_id,
+                    llc_id=scope.llc_id,
+                )
+                try:
+                    stmt = select_queue(filters, order=order, cursor=cursor, limit=limit)
+                except ValueError as exc:
+                    raise HTTPException(status_code=400, detail=str(exc)) from exc
+                rows = [session.execute(stmt).all() for session in scope.sessions]
+            page = merge_sorted(rows, key=lambda row: sort_key(order, row), limit=limit)
+            headers = {}
+            if limit and len(page) == limit:
+                headers["X-Next-Cursor"] = encode_cursor(order, page[-1])
+            return serializers.encode_suggestions(page), headers
+
+        return cache.respond(request, ["suggestions"], produce)
+
+    @app.get(
+        "/agents/suggestions/summary", response_model=List[schemas.SuggestionTypeSummary]
+    )
+    def get_suggestion_summary(
+        request: Request,
+        approved: Optional[bool] = None,
+        vendor_id: Optional[int] = None,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> Response:
+        def produce() -> bytes:
+            totals: dict[str, list[int]] = {}
+            with _llc_scope(router, db, llc) as scope:
+                filters = queue_filters(approved=approved, vendor_id=vendor_id, llc_id=scope.llc_id)
+                for session in scope.sessions:
+                    for suggestion_type, total, approved_count in summarize(session, filters):
+                        counts = totals.setdefault(suggestion_type, [0, 0])
+                        counts[0] += total
+                        counts[1] += approved_count
+            return serializers.dumps(
+                [
+                    {
+                        "suggestion_type": suggestion_type,
+                        "total": total,
+                        "pending": total - approved_count,
+                        "approved": approved_count,
+                    }
+                    for suggestion_type, (total, approved_count) in sorted(totals.items())
+                ]
+            )
+
+        return cache.respond(request, ["suggestions"], produce)
+
+    @app.post("/agents/suggestions/approve", response_model=schemas.BulkApprovalResponse)
+    def approve_suggestions(
+        request: schemas.BulkApprovalRequest,
+        llc: Optional[str] = None,
+        llc_id: Optional[int] = None,
+        db: Session = Depends(get_db),
+    ) -> schemas.BulkApprovalResponse:
+        if request.ids is None and not request.suggestion_type and not llc and llc_id is None:
+            raise HTTPException(
+                status_code=400, detail="Pass ids or at least one of suggestion_type and llc"
+            )
+        approved_ids: List[int] = []
+        already_approved = not_found = 0
+        with _llc_scope(router, db, llc, llc_id) as scope:
+            # Filters fan out over every shard in scope. Suggestion ids are
+            # shard-local, so each id goes to the one shard holding it.
+            targets: list[tuple[Session, Optional[list[int]]]]
+            if request.ids is None:
+                targets = [(session, None) for session in scope.sessions]
+            else:
+                requested = list(dict.fromkeys(request.ids))
+                located = _locate_suggestions(scope.sessions, requested)
+                not_found = len(set(requested) - set().union(*located))
+                targets = [
+                    (session, [i for i in requested if i in found])
+                    for session, found in zip(scope.sessions, located)
+                    if found
+                ]
+            for session, ids in targets:
+                result = FinanceAgent(session).approve_suggestions(
+                    ids,
+                    suggestion_type=request.suggestion_type,
+                    llc_id=scope.llc_id,
+                )
+                session.commit()
+                approved_ids.extend(result.approved_ids)
+                already_approved += result.already_approved
+                not_found += result.not_found
+        return schemas.BulkApprovalResponse(
+            approved=len(approved_ids),
+            already_approved=already_approved,
+            not_found=not_found,
+            approved_ids=approved_ids,
         )
-        if limit:
-            query = query.limit(limit)
-        return query.all()
 
     @app.post(
         "/agents/suggestions/{suggestion_id}/approve",
@@ -98,20 +434,141 @@ def create_app() -> FastAPI:
     )
     def approve_suggestion(
         suggestion_id: int,
+        llc: Optional[str] = None,
+        llc_id: Optional[int] = None,
         db: Session = Depends(get_db),
     ) -> schemas.SuggestionApprovalResponse:
-        suggestion = db.get(models.AgentSuggestion, suggestion_id)
-        if not suggestion:
-            raise HTTPException(status_code=404, detail="Suggestion not found")
-        if suggestion.approved:
-            raise HTTPException(status_code=400, detail="Suggestion already approved")
-
-        agent = FinanceAgent(db)
-        event = agent.approve_suggestion(suggestion)
-        db.commit()
-        db.refresh(suggestion)
-        db.refresh(event)
-        return schemas.SuggestionApprovalResponse(suggestion=suggestion, event=event)
+        """Approve one suggestion; pass its ``llc_id`` when shards are fanned out."""
+        with _llc_scope(router, db, llc, llc_id) as scope:
+            located = _locate_suggestions(scope.sessions, [suggestion_id])
+            holders = [session for session, found in zip(scope.sessions, located) if found]
+            if not holders:
+                raise HTTPException(status_code=404, detail="Suggestion not found")
+            session = holders[0]
+            suggestion = session.get(models.AgentSuggestion, suggestion_id)
+            if scope.llc_id is not None and suggestion.llc_id != scope.llc_id:
+                raise HTTPException(status_code=404, detail="Suggestion not found")
+            if suggestion.approved:
+                raise HTTPException(status_code=400, detail="Suggestion already approved")
+
+            agent = FinanceAgent(session)
+            event = agent.approve_suggestion(suggestion)
+            session.commit()
+            session.refresh(suggestion)
+            session.refresh(event)
+            return schemas.SuggestionApprovalResponse(suggestion=suggestion, event=event)
+
+    @app.post("/agents/rules/evaluate", response_model=List[schemas.RuleBacktestResult])
+    def evaluate_rules(
+        request: Optional[schemas.RuleBacktestRequest] = None,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> List[schemas.RuleBacktestResult]:
+        request = request or schemas.RuleBacktestRequest()
+        try:
+            rules = (
+                RuleSet.from_data(request.rules, observed=False)
+                if request.rules is not None
+                else load_rules()
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+        evaluated = 0
+        hits = {rule.id: 0 for rule in rules.rules}
+        samples: dict[str, list[int]] = {rule.id: [] for rule in rules.rules}
+        with _llc_scope(router, db, llc) as scope:
+            for session in scope.sessions:
+                result = rules.evaluate_batch(load_columns(session, llc_id=scope.llc_id))
+                evaluated += len(result.columns)
+                for rule_id, mask in result.hits.items():
+                    hits[rule_id] += int(mask.sum())
+                    remaining = request.sample_size - len(samples[rule_id])
+                    if remaining > 0:
+                        samples[rule_id].extend(result.purchase_order_ids(rule_id)[:remaining])
+        return [
+            schemas.RuleBacktestResult(
+                rule=rule_id,
+                hits=hits[rule_id],
+                evaluated=evaluated,
+                purchase_order_ids=samples[rule_id],
+            )
+            for rule_id in hits
+        ]
+
+    @app.post("/analytics/exports", response_model=schemas.AnalyticsExport)
+    def export_analytics(
+        request: Request,
+        table: str = "purchase_orders",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> schemas.AnalyticsExport:
+        """Write ``table`` as memory-mappable NumPy column files plus a manifest.
+
+        ``download_url`` serves the export as a zip archive until it expires.
+        """
+        with _llc_scope(router, db, llc) as scope:
+            try:
+                manifest = analytics.export_table(
+                    scope.sessions, table, start=start, end=end, llc_id=scope.llc_id
+                )
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
+        download_url = str(request.url_for("download_export", export_id=manifest["id"]))
+        return schemas.AnalyticsExport.parse_obj({**manifest, "download_url": download_url})
+
+    @app.get("/analytics/exports/{export_id}", name="download_export")
+    def download_export(export_id: str) -> StreamingResponse:
+        try:
+            directory = analytics.export_dir(export_id)
+        except LookupError as exc:
+            raise HTTPException(status_code=404, detail=f"Export {export_id!r} not found") from exc
+        return StreamingResponse(
+            analytics.iter_export_archive(directory),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{export_id}.zip"'},
+        )
+
+    @app.delete("/analytics/exports/{export_id}", status_code=204)
+    def delete_export(export_id: str) -> Response:
+        try:
+            analytics.delete_export(export_id)
+        except LookupError as exc:
+            raise HTTPException(status_code=404, detail=f"Export {export_id!r} not found") from exc
+        return Response(status_code=204)
+
+    @app.get("/analytics/spend", response_model=List[schemas.SpendSummaryRow])
+    def spend_summary(
+        request: Request,
+        table: str = "purchase_orders",
+        group_by: str = "vendor,month,currency",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        llc: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ) -> Response:
+        keys = [key.strip() for key in group_by.split(",") if key.strip()]
+
+        def produce() -> bytes:
+            with _llc_scope(router, db, llc) as scope:
+                try:
+                    columns = analytics.load_columns(
+                        scope.sessions, table, start=start, end=end, llc_id=scope.llc_id
+                    )
+                    rows = analytics.spend_summary(columns, keys)
+                except ValueError as exc:
+                    raise HTTPException(status_code=400, detail=str(exc)) from exc
+            return serializers.dumps(rows)
+
+        return cache.respond(request, ["purchase_orders"], produce)
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
 
     return app
 
@@ -0,0 +1,406 @@
+"""Additive migrations for databases created by earlier schema versions.
+
+``create_all`` only creates missing tables, so columns and indexes added to
+existing tables are applied here: each missing column is added with ``ALTER
+TABLE`` and the registered backfills for what was added are queued in
+``schema_backfills``, all in one transaction. Backfills then populate new
+columns (and new index tables) from existing rows in keyset batches, one
+transaction per batch, recording the last id done so an interrupted
+migration resumes where it stopped and no batch holds the write lock for
+long. Missing indexes are created last; :func:`missing_columns` then
+confirms the result before the caller stamps the schema fingerprint, which
+only happens once every queued backfill has completed.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy import Column, bindparam, insert, inspect, literal, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from .database import Base, chunked
+
+logger = logging.getLogger(__name__)
+
+# Rows per backfill transaction; also bounds the IN lists a batch builds.
+BACKFILL_BATCH_SIZE = 500
+
+# A backfill handles one batch of rows with ids above ``after_id`` and returns
+# the last id it handled, or ``None`` once no rows are left.
+Backfill = Callable[[Connection, int], Optional[int]]
+
+# Keyed by ``table.column`` for added columns or ``table`` for created tables;
+# run in registration order, so register dependencies first.
+BACKFILLS: dict[str, Backfill] = {}
+
+
+def backfill(target: str) -> Callable[[Backfill], Backfill]:
+    def register(fn: Backfill) -> Backfill:
+        BACKFILLS[target] = fn
+        return fn
+
+    return register
+
+
+class SchemaMismatch(RuntimeError):
+    pass
+
+
+def _column_ddl(column: Column, conn: Connection) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=conn.dialect)}"
+    if not column.nullable:
+        default = column.default
+        if default is None or not default.is_scalar:
+            raise SchemaMismatch(
+                f"Cannot add NOT NULL column {column.table.name}.{column.name} without a default"
+            )
+        value = literal(default.arg).compile(
+            dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" NOT NULL DEFAULT {value}"
+    return ddl
+
+
+def migrate(bind: Engine) -> list[str]:
+    """Bring ``bind`` up to the declared schema; return the tables/columns added."""
+    from . import models
+
+    inspector = inspect(bind)
+    existing = set(inspector.get_table_names())
+    added: list[str] = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                if existing:
+                    added.append(table.name)
+                continue
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, conn)}"))
+                added.append(f"{table.name}.{column.name}")
+        Base.metadata.create_all(bind=conn)
+        queued = [target for target in BACKFILLS if target in added]
+        if queued:
+            conn.execute(
+                insert(models.SchemaBackfill), [{"target": target, "last_id": 0} for target in queued]
+            )
+
+    _run_backfills(bind)
+
+    with bind.begin() as conn:
+        # SQLite cannot add a UNIQUE column; enforce it with an index instead.
+        for column in _unenforced_unique(bind):
+            conn.execute(
+                text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{column.table.name}_{column.name} "
+                    f"ON {column.table.name} ({column.name})"
+                )
+            )
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    if added:
+        logger.info("Migrated schema: added %s", ", ".join(added))
+    return added
+
+
+def _run_backfills(bind: Engine) -> None:
+    """Run queued backfills to completion, committing after every batch."""
+    from .models import SchemaBackfill
+
+    progress = SchemaBackfill.__table__
+    with bind.connect() as conn:
+        pending = dict(
+            conn.execute(
+                select(progress.c.target, progress.c.last_id).where(progress.c.completed_at.is_(None))
+            ).all()
+        )
+    for target, fn in BACKFILLS.items():
+        if target not in pending:
+            continue
+        last_id = pending[target]
+        logger.info("Backfilling %s from id %d", target, last_id)
+        while last_id is not None:
+            with bind.begin() as conn:
+                last_id = fn(conn, last_id)
+                values = {"last_id": last_id} if last_id is not None else {"completed_at": datetime.utcnow()}
+                conn.execute(update(progress).where(progress.c.target == target).values(**values))
+
+
+def _unenforced_unique(bind: Engine) -> list[Column]:
+    """Declared unique columns with no unique constraint or index behind them."""
+    inspector = inspect(bind)
+    columns: list[Column] = []
+    for table in Base.metadata.sorted_tables:
+        covered = {tuple(c["column_names"]) for c in inspector.get_unique_constraints(table.name)}
+        covered |= {tuple(i["column_names"]) for i in inspector.get_indexes(table.name) if i["unique"]}
+        columns.extend(c for c in table.columns if c.unique and (c.name,) not in covered)
+    return columns
+
+
+def missing_columns(bind: Engine) -> list[str]:
+    """Declared ``table.column`` names absent from the database."""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    missing: list[str] = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in present)
+    return missing
+
+
+def _update_rows(conn: Connection, table, rows: list[dict]) -> None:
+    """executemany ``UPDATE table SET ... WHERE id = :row_id``."""
+    for chunk in chunked(rows):
+        conn.execute(update(table).where(table.c.id == bindparam("row_id")), list(chunk))
+
+
+def _next_batch(conn: Connection, stmt, id_column, after_id: int) -> list:
+    """The next ``BACKFILL_BATCH_SIZE`` rows of ``stmt`` with ids above ``after_id``."""
+    return conn.execute(
+        stmt.where(id_column > after_id).order_by(id_column).limit(BACKFILL_BATCH_SIZE)
+    ).all()
+
+
+def _update_range(conn: Connection, stmt, table, after_id: int) -> Optional[int]:
+    """Run a correlated ``UPDATE`` over the next id range of ``table``."""
+    upper = after_id + BACKFILL_BATCH_SIZE
+    conn.execute(stmt.where(table.c.id > after_id, table.c.id <= upper))
+    more = conn.execute(select(table.c.id).where(table.c.id > upper).limit(1)).first()
+    return upper if more else None
+
+
+@backfill("vendors.normalized_name")
+def _vendor_names(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import Vendor
+    from .services.vendors import normalize_vendor_name
+
+    table = Vendor.__table__
+    rows = _next_batch(conn, select(table.c.id, table.c.name), table.c.id, after_id)
+    if not rows:
+        return None
+    names = [(vendor_id, normalize_vendor_name(name or "")) for vendor_id, name in rows]
+    # The first vendor with a normalized name keeps it; later duplicates stay
+    # unnamed (and are never matched) rather than being merged silently.
+    taken = set(
+        conn.execute(
+            select(table.c.normalized_name).where(
+                table.c.normalized_name.in_({normalized for _, normalized in names if normalized})
+            )
+        ).scalars()
+    )
+    updates = []
+    for vendor_id, normalized in names:
+        if normalized and normalized not in taken:
+            taken.add(normalized)
+            updates.append({"row_id": vendor_id, "normalized_name": normalized})
+    _update_rows(conn, table, updates)
+    return rows[-1][0]
+
+
+@backfill("events.chain_hash")
+def _chain_events(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import Event
+    from .services.chain import GENESIS_HASH, event_hash
+
+    table = Event.__table__
+    rows = _next_batch(
+        conn,
+        select(table.c.id, table.c.event_type, table.c.payload, table.c.created_at),
+        table.c.id,
+        after_id,
+    )
+    if not rows:
+        return None
+    prev_hash = GENESIS_HASH
+    if after_id:
+        prev_hash = conn.execute(select(table.c.chain_hash).where(table.c.id == after_id)).scalar_one()
+    updates = []
+    for event_id, event_type, payload, created_at in rows:
+        created_at = created_at or datetime.utcnow()
+        chain_hash = event_hash(prev_hash, event_type, payload, created_at)
+        updates.append(
+            {"row_id": event_id, "prev_hash": prev_hash, "chain_hash": chain_hash, "created_at": created_at}
+        )
+        prev_hash = chain_hash
+    _update_rows(conn, table, updates)
+    return rows[-1][0]
+
+
+@backfill("event_entities")
+def _event_entities(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import Event, EventEntity
+    from .services.events import payload_entities
+
+    table = Event.__table__
+    rows = _next_batch(conn, select(table.c.id, table.c.payload), table.c.id, after_id)
+    if not rows:
+        return None
+    entities = [
+        {"event_id": event_id, "entity_type": entity_type, "entity_id": entity_id}
+        for event_id, payload in rows
+        for entity_type, entity_id in payload_entities(payload or {})
+    ]
+    for chunk in chunked(entities):
+        conn.execute(EventEntity.__table__.insert(), list(chunk))
+    return rows[-1][0]
+
+
+def _llc_from_media(conn: Connection, table, after_id: int) -> Optional[int]:
+    from .models import MediaObject
+
+    media = MediaObject.__table__
+    return _update_range(
+        conn,
+        update(table).values(
+            llc_id=select(media.c.llc_id).where(media.c.id == table.c.media_object_id).scalar_subquery()
+        ),
+        table,
+        after_id,
+    )
+
+
+@backfill("document_vectors.llc_id")
+def _vector_llcs(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import DocumentVector
+
+    return _llc_from_media(conn, DocumentVector.__table__, after_id)
+
+
+@backfill("document_terms")
+def _index_documents(conn: Connection, after_id: int) -> Optional[int]:
+    from sqlalchemy.orm import Session
+
+    from .models import MediaObject
+    from .services.search import index_terms
+
+    media = MediaObject.__table__
+    rows = _next_batch(
+        conn, select(media.c.id, media.c.llc_id, media.c.storage_path), media.c.id, after_id
+    )
+    if not rows:
+        return None
+    with Session(bind=conn) as session:
+        for media_id, llc_id, path in rows:
+            try:
+                content = Path(path).read_text(errors="ignore") if path else ""
+            except OSError:
+                content = ""
+            index_terms(session, media_id, content, llc_id=llc_id)
+    return rows[-1][0]
+
+
+@backfill("document_terms.llc_id")
+def _term_llcs(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import DocumentTerm
+
+    return _llc_from_media(conn, DocumentTerm.__table__, after_id)
+
+
+@backfill("purchase_orders.amount_base")
+def _amount_base(conn: Connection, after_id: int) -> Optional[int]:
+    import numpy as np
+
+    from .models import PurchaseOrder
+    from .services.fx import load_rates, rates_configured
+
+    if not rates_configured():
+        # Left NULL; readers convert stored-unrated rows once a feed exists.
+        logger.warning("Skipping purchase_orders.amount_base backfill: no FX feed configured")
+        return None
+    table = PurchaseOrder.__table__
+    rows = _next_batch(
+        conn,
+        select(table.c.id, table.c.total_amount, table.c.currency, table.c.created_at),
+        table.c.id,
+        after_id,
+    )
+    if not rows:
+        return None
+    ids, totals, currencies, created = zip(*rows)
+    converted = load_rates().convert_many(
+        [np.nan if total is None else total for total in totals],
+        currencies,
+        [np.datetime64("NaT") if day is None else day for day in created],
+    )
+    _update_rows(
+        conn,
+        table,
+        [
+            {"row_id": order_id, "amount_base": None if np.isnan(value) else float(value)}
+            for order_id, value in zip(ids, converted.tolist())
+        ],
+    )
+    return ids[-1]
+
+
+@backfill("agent_suggestions.llc_id")
+def _suggestion_order_fields(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import AgentSuggestion, PurchaseOrder
+
+    suggestions, orders = AgentSuggestion.__table__, PurchaseOrder.__table__
+    return _update_range(
+        conn,
+        update(suggestions).values(
+            llc_id=select(orders.c.llc_id)
+            .where(orders.c.id == suggestions.c.purchase_order_id)
+            .scalar_subquery(),
+            vendor_id=select(orders.c.vendor_id)
+            .where(orders.c.id == suggestions.c.purchase_order_id)
+            .scalar_subquery(),
+        ),
+        suggestions,
+        after_id,
+    )
+
+
+@backfill("agent_suggestions.priority")
+def _suggestion_priority(conn: Connection, after_id: int) -> Optional[int]:
+    from .models import AgentSuggestion, PurchaseOrder
+    from .services.agent import suggestion_priority
+    from .services.fx import load_rates
+
+    suggestions, orders = AgentSuggestion.__table__, PurchaseOrder.__table__
+    rows = _next_batch(
+        conn,
+        select(
+            suggestions.c.id,
+            suggestions.c.created_at,
+            orders.c.amount_base,
+            orders.c.total_amount,
+            orders.c.currency,
+            orders.c.created_at,
+            orders.c.due_date,
+        ).join(orders, orders.c.id == suggestions.c.purchase_order_id),
+        suggestions.c.id,
+        after_id,
+    )
+    if not rows:
+        return None
+    rates = load_rates()
+    # Same snapshot a suggestion created at ``created_at`` would have taken:
+    # orders stored unrated are converted now, and rank at 0 if still unrated.
+    _update_rows(
+        conn,
+        suggestions,
+        [
+            {
+                "row_id": suggestion_id,
+                "priority": suggestion_priority(
+                    rates.convert(total, currency, ordered_at) if amount_base is None else amount_base,
+                    due_date,
+                    now=created_at,
+                ),
+            }
+            for suggestion_id, created_at, amount_base, total, currency, ordered_at, due_date in rows
+        ],
+    )
+    return rows[-1][0]
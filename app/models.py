@@ -4,7 +4,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Optional
 
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.dialects.sqlite import JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -73,6 +73,7 @@ class Vendor(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str | None] = mapped_column(String)
+    normalized_name: Mapped[str | None] = mapped_column(String, unique=True)
     vendor_identifier: Mapped[str | None] = mapped_column(String)
     platform_id: Mapped[int | None] = mapped_column(ForeignKey("platforms.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -85,7 +86,7 @@ class MediaObject(Base):
     __tablename__ = "media_objects"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    llc_id: Mapped[int | None] = mapped_column(ForeignKey("llcs.id"))
+    llc_id: Mapped[int | None] = mapped_column(ForeignKey("llcs.id"), index=True)
     media_type: Mapped[str | None] = mapped_column(String)
     mime: Mapped[str | None] = mapped_column(String)
     storage_path: Mapped[str | None] = mapped_column(String)
@@ -99,9 +100,14 @@ class MediaObject(Base):
 
 class DocumentVector(Base):
     __tablename__ = "document_vectors"
+    __table_args__ = (
+        Index("ix_document_vectors_strategy_media", "embedding_strategy", "media_object_id"),
+        Index("ix_document_vectors_llc_strategy", "llc_id", "embedding_strategy"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     media_object_id: Mapped[int] = mapped_column(ForeignKey("media_objects.id"))
+    llc_id: Mapped[int | None] = mapped_column(ForeignKey("llcs.id"))
     vector: Mapped[list[float]] = mapped_column(JSON)
     embedding_strategy: Mapped[str] = mapped_column(String, default="hash-v1")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -109,24 +115,143 @@ class DocumentVector(Base):
     media_object: Mapped["MediaObject"] = relationship(back_populates="vectors")
 
 
+class AppSetting(Base):
+    """Small key/value store for runtime switches such as the active embedding."""
+
+    __tablename__ = "app_settings"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[str] = mapped_column(String)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class EmbeddingBackfill(Base):
+    """Progress of a re-embedding job; ``last_media_object_id`` is the checkpoint."""
+
+    __tablename__ = "embedding_backfills"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    strategy: Mapped[str] = mapped_column(String, index=True)
+    status: Mapped[str] = mapped_column(String, default="running")
+    last_media_object_id: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class SchemaBackfill(Base):
+    """Progress of a migration backfill; ``last_id`` is the checkpoint."""
+
+    __tablename__ = "schema_backfills"
+
+    target: Mapped[str] = mapped_column(String, primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class ParseCacheEntry(Base):
+    """Parse result and embedding memoized by document content hash."""
+
+    __tablename__ = "parse_cache"
+    __table_args__ = (
+        UniqueConstraint("sha256", "parser_version", "embedding_strategy"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sha256: Mapped[str] = mapped_column(String)
+    parser_version: Mapped[str] = mapped_column(String)
+    embedding_strategy: Mapped[str] = mapped_column(String)
+    parsed: Mapped[dict[str, Any]] = mapped_column(JSON)
+    confidence: Mapped[float] = mapped_column(Float)
+    vector: Mapped[list[float]] = mapped_column(JSON)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class DocumentTerm(Base):
+    """Inverted index posting: a token occurring in a media object's text."""
+
+    __tablename__ = "document_terms"
+    __table_args__ = (
+        Index("ix_document_terms_term", "term", "media_object_id"),
+        Index("ix_document_terms_llc_term", "llc_id", "term"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    media_object_id: Mapped[int] = mapped_column(ForeignKey("media_objects.id"), index=True)
+    llc_id: Mapped[int | None] = mapped_column(ForeignKey("llcs.id"))
+    term: Mapped[str] = mapped_column(String)
+    term_frequency: Mapped[int] = mapped_column(Integer, default=1)
+
+
 class Event(Base):
     __tablename__ = "events"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    event_type: Mapped[str] = mapped_column(String)
+    event_type: Mapped[str] = mapped_column(String, index=True)
     payload: Mapped[dict[str, Any]] = mapped_column(JSON)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    prev_hash: Mapped[str | None] = mapped_column(String, unique=True)
+    chain_hash: Mapped[str | None] = mapped_column(String)
+
+    entities: Mapped[list["EventEntity"]] = relationship(back_populates="event", cascade="all, delete-orphan")
+
+
+class EventEntity(Base):
+    """Index row linking an event to an entity referenced by its payload."""
+
+    __tablename__ = "event_entities"
+    __table_args__ = (
+        Index("ix_event_entities_entity", "entity_type", "entity_id", "event_id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id"), index=True)
+    entity_type: Mapped[str] = mapped_column(String)
+    entity_id: Mapped[int] = mapped_column(Integer)
+
+    event: Mapped["Event"] = relationship(back_populates="entities")
+
+
+class EventChainCheckpoint(Base):
+    """Last event verified by an audit run; the next run resumes after it."""
+
+    __tablename__ = "event_chain_checkpoints"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id"))
+    chain_hash: Mapped[str] = mapped_column(String)
+    verified_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class EventChainSegment(Base):
+    """Sealed run of chained events summarised by a Merkle root."""
+
+    __tablename__ = "event_chain_segments"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    start_event_id: Mapped[int] = mapped_column(Integer)
+    end_event_id: Mapped[int] = mapped_column(Integer, unique=True)
+    start_prev_hash: Mapped[str] = mapped_column(String)
+    end_hash: Mapped[str] = mapped_column(String)
+    merkle_root: Mapped[str] = mapped_column(String)
+    event_count: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    llc_id: Mapped[int] = mapped_column(ForeignKey("llcs.id"))
+    llc_id: Mapped[int] = mapped_column(ForeignKey("llcs.id"), index=True)
     vendor_id: Mapped[int] = mapped_column(ForeignKey("vendors.id"))
     media_object_id: Mapped[int] = mapped_column(ForeignKey("media_objects.id"))
     total_amount: Mapped[float] = mapped_column(Float)
     currency: Mapped[str] = mapped_column(String, default="USD")
+    # ``total_amount`` in the FX base currency at ingest time (None if unrated).
+    amount_base: Mapped[float | None] = mapped_column(Float)
     status: Mapped[str] = mapped_column(String, default="pending")
     due_date: Mapped[datetime | None] = mapped_column(DateTime)
     received_at: Mapped[datetime | None] = mapped_column(DateTime)
@@ -180,9 +305,22 @@ class Transaction(Base):
 
 class AgentSuggestion(Base):
     __tablename__ = "agent_suggestions"
+    __table_args__ = (
+        # Review queue: pending/approved pages by recency or priority, overall
+        # and per LLC, plus per-type summaries.
+        Index("ix_agent_suggestions_queue_recent", "approved", "created_at", "id"),
+        Index("ix_agent_suggestions_queue_priority", "approved", "priority", "id"),
+        Index("ix_agent_suggestions_llc_recent", "llc_id", "approved", "created_at", "id"),
+        Index("ix_agent_suggestions_llc_priority", "llc_id", "approved", "priority", "id"),
+        Index("ix_agent_suggestions_type", "suggestion_type", "approved"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    purchase_order_id: Mapped[int] = mapped_column(ForeignKey("purchase_orders.id"))
+    purchase_order_id: Mapped[int] = mapped_column(ForeignKey("purchase_orders.id"), index=True)
+    # Denormalized from the purchase order so the queue filters without joins.
+    llc_id: Mapped[int | None] = mapped_column(ForeignKey("llcs.id"))
+    vendor_id: Mapped[int | None] = mapped_column(ForeignKey("vendors.id"), index=True)
+    priority: Mapped[float] = mapped_column(Float, default=0.0)
     agent_name: Mapped[str] = mapped_column(String)
     suggestion_type: Mapped[str] = mapped_column(String)
     message: Mapped[str] = mapped_column(Text)
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -27,8 +27,10 @@ class Vendor(BaseModel):
 
 class PurchaseOrder(BaseModel):
     id: int
+    llc_id: int
     total_amount: float
     currency: str
+    amount_base: Optional[float]
     status: str
     due_date: Optional[datetime]
     description: Optional[str]
@@ -58,19 +60,40 @@ class AgentSuggestion(BaseModel):
     approved: bool
     created_at: datetime
     approved_at: Optional[datetime]
+    purchase_order_id: int
+    llc_id: Optional[int]
+    vendor_id: Optional[int]
+    priority: float = 0.0
 
     class Config:
         orm_mode = True
 
 
+class SuggestionTypeSummary(BaseModel):
+    suggestion_type: str
+    total: int
+    pending: int
+    approved: int
+
+
 class PurchaseIngestResponse(BaseModel):
     purchase_order: PurchaseOrder
     events: List[Event]
     suggestions: List[AgentSuggestion]
 
 
+class StatementIngestResponse(BaseModel):
+    media_object: MediaObject
+    purchase_order_ids: List[int]
+    credit_line_items: int = 0
+    total_amount_base: float
+    events: List[Event]
+    suggestions: Dict[str, int]
+
+
 class SearchResult(BaseModel):
     media_object_id: int
+    llc_id: Optional[int] = None
     score: float = Field(..., ge=0)
     excerpt: str
     filename: Optional[str] = None
@@ -80,3 +103,75 @@ class SearchResult(BaseModel):
 class SuggestionApprovalResponse(BaseModel):
     suggestion: AgentSuggestion
     event: Event
+
+
+class BulkApprovalRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    suggestion_type: Optional[str] = None
+
+
+class BulkApprovalResponse(BaseModel):
+    approved: int
+    already_approved: int
+    not_found: int
+    approved_ids: List[int]
+
+
+class ShardChainVerification(BaseModel):
+    ok: bool
+    verified_events: int
+    last_event_id: Optional[int]
+    first_invalid_event_id: Optional[int] = None
+    reason: Optional[str] = None
+    segments_verified: int = 0
+    # Dedicated shard the event ids belong to; None for the primary database.
+    shard_llc_id: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ChainVerification(ShardChainVerification):
+    """Combined result over every chain in scope, with one entry per chain."""
+
+    shards: List[ShardChainVerification] = []
+
+
+class RuleBacktestRequest(BaseModel):
+    rules: Optional[List[dict]] = None
+    sample_size: int = Field(10, ge=0, le=1000)
+
+
+class RuleBacktestResult(BaseModel):
+    rule: str
+    hits: int
+    evaluated: int
+    purchase_order_ids: List[int]
+
+
+class AnalyticsExportColumn(BaseModel):
+    name: str
+    dtype: str
+    file: str
+    dictionary: Optional[List[str]] = None
+
+
+class AnalyticsExport(BaseModel):
+    id: str
+    table: str
+    rows: int
+    path: str
+    download_url: Optional[str] = None
+    created_at: datetime
+    filters: dict
+    columns: List[AnalyticsExportColumn]
+
+
+class SpendSummaryRow(BaseModel):
+    vendor: Optional[str] = None
+    month: Optional[str] = None
+    currency: Optional[str] = None
+    total: float
+    total_base: float
+    count: int
+    unrated: int = 0
@@ -0,0 +1,145 @@
+"""Fast JSON encoders for list endpoints.
+
+The list endpoints select only the columns their schema exposes and encode
+the resulting row tuples directly, skipping ORM instantiation and Pydantic
+``orm_mode`` validation. Output matches the corresponding models in
+``schemas`` field for field.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import Select, select
+
+from . import models
+
+try:  # pragma: no cover - exercised implicitly when orjson is installed
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+PURCHASE_ORDER_COLUMNS = (
+    models.PurchaseOrder.id,
+    models.PurchaseOrder.total_amount,
+    models.PurchaseOrder.currency,
+    models.PurchaseOrder.status,
+    models.PurchaseOrder.due_date,
+    models.PurchaseOrder.description,
+    models.Vendor.id,
+    models.Vendor.name,
+    models.MediaObject.id,
+    models.MediaObject.media_type,
+    models.MediaObject.mime,
+    models.MediaObject.storage_path,
+    models.PurchaseOrder.created_at,
+    models.PurchaseOrder.amount_base,
+    models.PurchaseOrder.llc_id,
+)
+
+EVENT_COLUMNS = (
+    models.Event.id,
+    models.Event.event_type,
+    models.Event.payload,
+    models.Event.created_at,
+)
+
+SUGGESTION_COLUMNS = (
+    models.AgentSuggestion.id,
+    models.AgentSuggestion.agent_name,
+    models.AgentSuggestion.suggestion_type,
+    models.AgentSuggestion.message,
+    models.AgentSuggestion.approved,
+    models.AgentSuggestion.created_at,
+    models.AgentSuggestion.approved_at,
+    models.AgentSuggestion.purchase_order_id,
+    models.AgentSuggestion.llc_id,
+    models.AgentSuggestion.vendor_id,
+    models.AgentSuggestion.priority,
+)
+
+
+def select_purchase_orders() -> Select:
+    return (
+        select(*PURCHASE_ORDER_COLUMNS)
+        .join(models.Vendor, models.PurchaseOrder.vendor_id == models.Vendor.id)
+        .join(models.MediaObject, models.PurchaseOrder.media_object_id == models.MediaObject.id)
+    )
+
+
+def select_events() -> Select:
+    return select(*EVENT_COLUMNS)
+
+
+def select_suggestions() -> Select:
+    return select(*SUGGESTION_COLUMNS)
+
+
+def encode_purchase_orders(rows: Iterable[Sequence[Any]]) -> bytes:
+    return dumps(
+        [
+            {
+                "id": row[0],
+                "total_amount": float(row[1]),
+                "currency": row[2],
+                "status": row[3],
+                "due_date": row[4],
+                "description": row[5],
+                "vendor": {"id": row[6], "name": row[7]},
+                "media_object": {
+                    "id": row[8],
+                    "media_type": row[9],
+                    "mime": row[10],
+                    "storage_path": row[11],
+                },
+                "created_at": row[12],
+                "amount_base": row[13],
+                "llc_id": row[14],
+            }
+            for row in rows
+        ]
+    )
+
+
+def encode_events(rows: Iterable[Sequence[Any]]) -> bytes:
+    return dumps(
+        [
+            {"id": row[0], "event_type": row[1], "payload": row[2], "created_at": row[3]}
+            for row in rows
+        ]
+    )
+
+
+def encode_suggestions(rows: Iterable[Sequence[Any]]) -> bytes:
+    return dumps(
+        [
+            {
+                "id": row[0],
+                "agent_name": row[1],
+                "suggestion_type": row[2],
+                "message": row[3],
+                "approved": bool(row[4]),
+                "created_at": row[5],
+                "approved_at": row[6],
+                "purchase_order_id": row[7],
+                "llc_id": row[8],
+                "vendor_id": row[9],
+                "priority": float(row[10] or 0.0),
+            }
+            for row in rows
+        ]
+    )
@@ -1,21 +1,63 @@
 """Finance agent prototype."""
 from __future__ import annotations
 
-import re
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import Set
+from typing import Optional, Sequence, Set
 
+from sqlalchemy import false, insert, select, update
 from sqlalchemy.orm import Session
 
 from .. import models
+from ..cache import mark_dirty
+from ..database import chunked
+from .events import record_event, record_events
+from .rules import OrderFacts, RuleSet, load_columns, load_rules, order_amount_base
+
+
+def suggestion_priority(
+    total_amount: Optional[float],
+    due_date: Optional[datetime],
+    now: Optional[datetime] = None,
+) -> float:
+    """Review-queue priority: the amount, weighted up by a month per overdue month.
+
+    Snapshotted when the suggestion is created so the queue can be served from
+    an index instead of sorting on a computed expression. Overdue days are
+    counted up to ``now`` (the creation time) and are not refreshed later.
+    Orders with no base amount (unrated currencies) get priority 0.
+    """
+    amount = total_amount or 0.0
+    if due_date is None:
+        return amount
+    now = now or datetime.utcnow()
+    overdue_days = max(0, (now - due_date.replace(tzinfo=None)).days)
+    return amount * (1 + overdue_days / 30)
+
+
+@dataclass
+class BulkApproval:
+    """Outcome of a bulk approval.
+
+    ``already_approved`` and ``not_found`` account for requested ids; a
+    filter-only approval requests none, so both stay 0.
+    """
+
+    approved_ids: list[int] = field(default_factory=list)
+    already_approved: int = 0
+    not_found: int = 0
 
 
 class FinanceAgent:
-    """Heuristic finance agent to surface risk across the purchasing pipeline."""
+    """Heuristic finance agent to surface risk across the purchasing pipeline.
 
-    def __init__(self, session: Session) -> None:
+    The heuristics live in :mod:`app.services.rules`; pass ``rules`` to
+    evaluate a custom rule set instead of the configured one.
+    """
+
+    def __init__(self, session: Session, rules: Optional[RuleSet] = None) -> None:
         self.session = session
+        self.rules = rules or load_rules()
 
     def evaluate_purchase_order(
         self, purchase_order: models.PurchaseOrder
@@ -24,70 +66,13 @@ class FinanceAgent:
         existing_types: Set[str] = {
             suggestion.suggestion_type for suggestion in purchase_order.suggestions
         }
-
-        # Overdue payments
-        if purchase_order.due_date:
-            now = datetime.now(timezone.utc)
-            if (
-                purchase_order.due_date.replace(tzinfo=timezone.utc) < now
-                and purchase_order.status != "paid"
-            ):
-                suggestions.extend(
-                    self._ensure_suggestion(
-                        purchase_order,
-                        suggestion_type="flag-overdue",
-                        message="Payment appears overdue. Flag for follow-up.",
-                        existing_types=existing_types,
-                    )
-                )
-
-        # Large purchase repayment plan
-        if purchase_order.total_amount >= 10000:
-            suggestions.extend(
-                self._ensure_suggestion(
-                    purchase_order,
-                    suggestion_type="create-repayment-plan",
-                    message="Consider creating a repayment plan for this large purchase.",
-                    existing_types=existing_types,
-                )
-            )
-
-        # Status reconciliation
-        normalized_status = (purchase_order.status or "").lower()
-        if normalized_status in {"overdue", "late", "past-due"}:
-            suggestions.extend(
-                self._ensure_suggestion(
-                    purchase_order,
-                    suggestion_type="reconcile-payment-status",
-                    message="Invoice is marked overdue in the source packet. Confirm collections status.",
-                    existing_types=existing_types,
-                )
-            )
-
-        # Vendor history review
-        open_history = self._open_orders_for_vendor(purchase_order)
-        if open_history >= 2:
-            suggestions.extend(
-                self._ensure_suggestion(
-                    purchase_order,
-                    suggestion_type="review-vendor-history",
-                    message=(
-                        f"{purchase_order.vendor.name} has {open_history} other open orders. "
-                        "Review payment cadence before approving new spend."
-                    ),
-                    existing_types=existing_types,
-                )
-            )
-
-        # Related claim links
-        claim_links = self._claim_links_from_media(purchase_order.media_object)
-        if claim_links:
-            first_link = claim_links[0]
+        facts = OrderFacts(self.session, purchase_order)
+        for suggestion_type, message in self.rules.evaluate(facts, skip=existing_types):
             suggestions.extend(
                 self._ensure_suggestion(
                     purchase_order,
-                    suggestion_type="review-related-claim",
-                    message=f"Source packet references an open claim ({first_link}). Verify status prior to approval.",
+                    suggestion_type=suggestion_type,
+                    message=message,
                     existing_types=existing_types,
                 )
             )
@@ -97,22 +82,153 @@ class FinanceAgent:
         self.session.flush()
         return suggestions
 
+    def evaluate_batch(self, purchase_order_ids: Sequence[int]) -> dict[str, int]:
+        """Evaluate freshly inserted orders with the batch rule evaluator.
+
+        Suggestions are bulk inserted; returns the number created per type.
+        """
+        if not purchase_order_ids:
+            return {}
+        columns = load_columns(self.session, purchase_order_ids=purchase_order_ids)
+        result = self.rules.evaluate_batch(columns)
+        arrays = columns.arrays
+        rows = []
+        created: dict[str, int] = {}
+        for index, suggestion_type, message in self.rules.batch_suggestions(result):
+            amount = float(arrays["amount_base"][index])
+            if amount != amount:  # unrated: no base value to rank by
+                amount = None
+            rows.append(
+                {
+                    "purchase_order_id": int(arrays["id"][index]),
+                    "llc_id": int(arrays["llc_id"][index]),
+                    "vendor_id": int(arrays["vendor_id"][index]) or None,
+                    "priority": suggestion_priority(amount, arrays["due_date"][index].item()),
+                    "agent_name": "FinanceAgent",
+                    "suggestion_type": suggestion_type,
+                    "message": message,
+                }
+            )
+            created[suggestion_type] = created.get(suggestion_type, 0) + 1
+        if rows:
+            self.session.execute(insert(models.AgentSuggestion), rows)
+        return created
+
     def approve_suggestion(self, suggestion: models.AgentSuggestion) -> models.Event:
         suggestion.approved = True
         suggestion.approved_at = datetime.now(timezone.utc)
-        event = models.Event(
-            event_type="agent_suggestion.approved",
-            payload={
+        event = record_event(
+            self.session,
+            "agent_suggestion.approved",
+            {
                 "suggestion_id": suggestion.id,
                 "agent_name": suggestion.agent_name,
                 "suggestion_type": suggestion.suggestion_type,
                 "message": suggestion.message,
             },
+            entities=[
+                ("purchase_order", suggestion.purchase_order_id),
+                ("llc", suggestion.purchase_order.llc_id),
+            ],
         )
-        self.session.add(event)
+        mark_dirty(self.session, "suggestions", "events")
         self.session.flush()
         return event
 
+    def approve_suggestions(
+        self,
+        ids: Optional[Sequence[int]] = None,
+        *,
+        suggestion_type: Optional[str] = None,
+        llc_id: Optional[int] = None,
+    ) -> BulkApproval:
+        """Approve every pending suggestion matching ``ids`` and the filters.
+
+        Each chunk is one ``UPDATE ... WHERE approved = 0 RETURNING``,
+        so a suggestion approved concurrently is counted as already approved
+        rather than approved twice. Only requested ``ids`` are counted as
+        already approved or not found; with filters alone a concurrent
+        approval is simply not in ``approved_ids``. Events are bulk inserted
+        in id order.
+        """
+        table = models.AgentSuggestion
+        approved_at = datetime.now(timezone.utc)
+        filters = []
+        if suggestion_type:
+            filters.append(table.suggestion_type == suggestion_type)
+        if llc_id is not None:
+            filters.append(table.llc_id == llc_id)
+
+        result = BulkApproval()
+        approved: list = []
+        requested = list(dict.fromkeys(ids)) if ids is not None else None
+        chunks = (
+            list(chunked(requested))
+            if requested is not None
+            else [None]
+        )
+        for chunk in chunks:
+            scoped = list(filters)
+            if chunk is not None:
+                scoped.append(table.id.in_(chunk))
+            rows = self.session.execute(
+                update(table)
+                .where(table.approved == false(), *scoped)
+                .values(approved=True, approved_at=approved_at)
+                .returning(
+                    table.id,
+                    table.agent_name,
+                    table.suggestion_type,
+                    table.message,
+                    table.purchase_order_id,
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            approved.extend(rows)
+            if chunk is not None:
+                won = {row.id for row in rows}
+                existing = set(
+                    self.session.scalars(select(table.id).where(table.id.in_(chunk), *filters))
+                )
+                result.already_approved += len(existing - won)
+                result.not_found += len(chunk) - len(existing)
+
+        if not approved:
+            return result
+        approved.sort(key=lambda row: row.id)
+        order_ids = sorted({row.purchase_order_id for row in approved})
+        llc_by_order = dict(
+            row
+            for chunk in chunked(order_ids)
+            for row in self.session.execute(
+                select(models.PurchaseOrder.id, models.PurchaseOrder.llc_id).where(
+                    models.PurchaseOrder.id.in_(chunk)
+                )
+            )
+        )
+        record_events(
+            self.session,
+            "agent_suggestion.approved",
+            [
+                (
+                    {
+                        "suggestion_id": row.id,
+                        "agent_name": row.agent_name,
+                        "suggestion_type": row.suggestion_type,
+                        "message": row.message,
+                    },
+                    [
+                        ("purchase_order", row.purchase_order_id),
+                        ("llc", llc_by_order[row.purchase_order_id]),
+                    ],
+                )
+                for row in approved
+            ],
+        )
+        mark_dirty(self.session, "suggestions", "events")
+        result.approved_ids = [row.id for row in approved]
+        return result
+
     def _ensure_suggestion(
         self,
         purchase_order: models.PurchaseOrder,
@@ -127,35 +243,13 @@ class FinanceAgent:
         return [
             models.AgentSuggestion(
                 purchase_order=purchase_order,
+                llc_id=purchase_order.llc_id,
+                vendor_id=purchase_order.vendor_id,
+                priority=suggestion_priority(
+                    order_amount_base(purchase_order), purchase_order.due_date
+                ),
                 agent_name="FinanceAgent",
                 suggestion_type=suggestion_type,
                 message=message,
             )
         ]
-
-    def _open_orders_for_vendor(self, purchase_order: models.PurchaseOrder) -> int:
-        return (
-            self.session.query(models.PurchaseOrder)
-            .filter(
-                models.PurchaseOrder.vendor_id == purchase_order.vendor_id,
-                models.PurchaseOrder.id != purchase_order.id,
-                models.PurchaseOrder.status != "paid",
-            )
-            .count()
-        )
-
-    def _claim_links_from_media(self, media: models.MediaObject | None) -> list[str]:
-        if not media or not media.storage_path:
-            return []
-        path = Path(media.storage_path)
-        if not path.exists():
-            return []
-        try:
-            content = path.read_text(errors="ignore")
-        except OSError:
-            return []
-        return [
-            link
-            for link in re.findall(r"https?://\S+", content)
-            if re.search(r"claim|ticket|case", link, re.IGNORECASE)
-        ]
@@ -0,0 +1,475 @@
+"""Columnar analytics over purchase orders and transactions.
+
+Tables are streamed out of the database in id-ordered chunks into NumPy
+columns: numbers as ``float64``/``int64``, timestamps as ``datetime64[us]``
+(``NaT`` for missing) and strings dictionary-encoded as ``int32`` codes
+(``-1`` for missing) with the dictionary kept alongside. Date-range and LLC
+filters are pushed down into the SQL, so only matching rows are read.
+
+An export writes each column to ``<column>.npy`` plus a ``manifest.json``;
+:func:`load_export` memory-maps them back, e.g. for ``pandas`` or plain NumPy.
+Remote clients download an export by id as a zip archive
+(:func:`iter_export_archive`). Exports older than ``EMPIRE_EXPORT_RETENTION_HOURS``
+(default 24) are removed whenever a new one is written.
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import re
+import shutil
+import time
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..instrumentation import span
+from .fx import load_rates
+
+EXPORT_ROOT = Path(os.getenv("EMPIRE_EXPORT_DIR", "exports"))
+EXPORT_RETENTION = timedelta(hours=float(os.getenv("EMPIRE_EXPORT_RETENTION_HOURS", "24")))
+CHUNK_SIZE = 50_000
+SUMMARY_KEYS = ("vendor", "month", "currency")
+
+# ``<table>-<UTC timestamp to the microsecond>``, as named by export_table.
+_EXPORT_ID = re.compile(r"[a-z_]+-\d{8}T\d{12}")
+
+_KINDS = {"int": "int64", "float": "float64", "datetime": "datetime64[us]", "string": "int32"}
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """How one table is exported: ``(name, kind, SQL expression)`` per column."""
+
+    name: str
+    columns: tuple[tuple[str, str, Any], ...]
+    date: Any
+    llc_id: Any
+    joins: Callable[[Any], Any]
+    amount: str
+
+    def select(self):
+        return self.joins(select(*(expr for _, _, expr in self.columns)))
+
+
+PO = models.PurchaseOrder
+TX = models.Transaction
+
+TABLES = {
+    "purchase_orders": TableSpec(
+        name="purchase_orders",
+        columns=(
+            ("id", "int", PO.id),
+            ("llc", "string", models.LLC.name),
+            ("vendor", "string", models.Vendor.name),
+            ("total_amount", "float", PO.total_amount),
+            ("amount_base", "float", PO.amount_base),
+            ("currency", "string", PO.currency),
+            ("status", "string", PO.status),
+            ("due_date", "datetime", PO.due_date),
+            ("created_at", "datetime", PO.created_at),
+        ),
+        date=PO.created_at,
+        llc_id=PO.llc_id,
+        joins=lambda stmt: stmt.select_from(PO)
+        .outerjoin(models.LLC, PO.llc_id == models.LLC.id)
+        .outerjoin(models.Vendor, PO.vendor_id == models.Vendor.id),
+        amount="total_amount",
+    ),
+    "transactions": TableSpec(
+        name="transactions",
+        columns=(
+            ("id", "int", TX.id),
+            ("purchase_order_id", "int", func.coalesce(TX.purchase_order_id, -1)),
+            ("llc", "string", models.LLC.name),
+            ("vendor", "string", models.Vendor.name),
+            ("amount", "float", TX.amount),
+            ("currency", "string", TX.currency),
+            ("direction", "string", TX.direction),
+            ("happened_at", "datetime", func.coalesce(TX.happened_at, TX.created_at)),
+        ),
+        date=func.coalesce(TX.happened_at, TX.created_at),
+        llc_id=PO.llc_id,
+        joins=lambda stmt: stmt.select_from(TX)
+        .outerjoin(PO, TX.purchase_order_id == PO.id)
+        .outerjoin(models.LLC, PO.llc_id == models.LLC.id)
+        .outerjoin(models.Vendor, PO.vendor_id == models.Vendor.id),
+        amount="amount",
+    ),
+}
+
+
+def table_spec(table: str) -> TableSpec:
+    try:
+        return TABLES[table]
+    except KeyError:
+        raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(TABLES)}") from None
+
+
+@dataclass
+class ColumnSet:
+    """Columns of one table; string columns hold codes into ``dictionaries``."""
+
+    table: str
+    rows: int
+    arrays: dict[str, Any]
+    dictionaries: dict[str, list[str]] = field(default_factory=dict)
+
+    def decode(self, column: str) -> list[Optional[str]]:
+        values = self.dictionaries[column]
+        return [values[code] if code >= 0 else None for code in self.arrays[column].tolist()]
+
+
+def _filters(spec: TableSpec, start: Optional[datetime], end: Optional[datetime], llc_id: Optional[int]):
+    clauses = []
+    if start is not None:
+        clauses.append(spec.date >= start)
+    if end is not None:
+        clauses.append(spec.date < end)
+    if llc_id is not None:
+        clauses.append(spec.llc_id == llc_id)
+    return clauses
+
+
+def _id_column(spec: TableSpec):
+    return spec.columns[0][2]
+
+
+def _extract(
+    sessions: Sequence[Session],
+    spec: TableSpec,
+    allocate: Callable[[str, str, int], Any],
+    *,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    llc_id: Optional[int],
+    chunk_size: int,
+) -> ColumnSet:
+    """Stream matching rows from every session into arrays from ``allocate``."""
+    import numpy as np
+
+    clauses = _filters(spec, start, end, llc_id)
+    id_col = _id_column(spec)
+    # Pin each session's id range up front so rows inserted mid-export are
+    # excluded instead of overflowing the preallocated columns.
+    bounds = []
+    for session in sessions:
+        total, max_id = session.execute(
+            spec.joins(select(func.count(), func.max(id_col))).where(*clauses)
+        ).one()
+        bounds.append((session, total, max_id))
+    rows = sum(total for _, total, _ in bounds)
+
+    arrays = {name: allocate(name, _KINDS[kind], rows) for name, kind, _ in spec.columns}
+    codes: dict[str, dict[str, int]] = {
+        name: {} for name, kind, _ in spec.columns if kind == "string"
+    }
+    offset = 0
+    for session, total, max_id in bounds:
+        last_id = None
+        while total:
+            stmt = spec.select().where(*clauses, id_col <= max_id)
+            if last_id is not None:
+                stmt = stmt.where(id_col > last_id)
+            chunk = session.execute(stmt.order_by(id_col).limit(chunk_size)).all()
+            if not chunk:
+                break
+            chunk = chunk[: rows - offset]
+            size = len(chunk)
+            for index, (name, kind, _) in enumerate(spec.columns):
+                values = [row[index] for row in chunk]
+                target = arrays[name][offset:offset + size]
+                if kind == "string":
+                    mapping = codes[name]
+                    target[:] = [
+                        -1 if value is None else mapping.setdefault(value, len(mapping))
+                        for value in values
+                    ]
+                elif kind == "datetime":
+                    target[:] = np.array(values, dtype="datetime64[us]")
+                elif kind == "float":
+                    target[:] = np.array(values, dtype=float)
+                else:
+                    target[:] = values
+            offset += size
+            last_id = chunk[-1][0]
+            if offset >= rows:
+                break
+    # Rows deleted mid-export leave a shorter result; trim the tail.
+    arrays = {name: array[:offset] for name, array in arrays.items()}
+    return ColumnSet(
+        table=spec.name,
+        rows=offset,
+        arrays=arrays,
+        dictionaries={name: list(mapping) for name, mapping in codes.items()},
+    )
+
+
+def load_columns(
+    sessions: Sequence[Session],
+    table: str,
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    llc_id: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> ColumnSet:
+    """Read ``table`` into in-memory columns."""
+    import numpy as np
+
+    spec = table_spec(table)
+    with span(f"analytics.load.{table}"):
+        return _extract(
+            sessions,
+            spec,
+            lambda name, dtype, rows: np.empty(rows, dtype=dtype),
+            start=start,
+            end=end,
+            llc_id=llc_id,
+            chunk_size=chunk_size,
+        )
+
+
+def export_table(
+    sessions: Sequence[Session],
+    table: str,
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    llc_id: Optional[int] = None,
+    root: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict[str, Any]:
+    """Write ``table`` as memory-mappable ``.npy`` columns; returns the manifest.
+
+    Expired exports under ``root`` are pruned first (see :func:`prune_exports`).
+    """
+    import numpy as np
+    from numpy.lib.format import open_memmap
+
+    def allocate(name: str, dtype: str, rows: int):
+        path = directory / f"{name}.npy"
+        if not rows:
+            # Zero-length files cannot be mapped; write a plain empty array.
+            np.save(path, np.empty(0, dtype=dtype))
+            return np.empty(0, dtype=dtype)
+        return open_memmap(path, mode="w+", dtype=dtype, shape=(rows,))
+
+    spec = table_spec(table)
+    prune_exports(root)
+    created_at = datetime.utcnow()
+    directory = Path(root or EXPORT_ROOT) / f"{table}-{created_at:%Y%m%dT%H%M%S%f}"
+    directory.mkdir(parents=True, exist_ok=True)
+    with span(f"analytics.export.{table}"):
+        columns = _extract(
+            sessions,
+            spec,
+            allocate,
+            start=start,
+            end=end,
+            llc_id=llc_id,
+            chunk_size=chunk_size,
+        )
+        for array in columns.arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    manifest = {
+        "id": directory.name,
+        "table": table,
+        "rows": columns.rows,
+        "path": str(directory),
+        "created_at": created_at.isoformat(),
+        "filters": {
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "llc_id": llc_id,
+        },
+        "columns": [
+            {
+                "name": name,
+                "dtype": _KINDS[kind],
+                "file": f"{name}.npy",
+                **({"dictionary": columns.dictionaries[name]} if kind == "string" else {}),
+            }
+            for name, kind, _ in spec.columns
+        ],
+    }
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def export_dir(export_id: str, root: Optional[Path] = None) -> Path:
+    """The directory of export ``export_id``; ``LookupError`` if there is none."""
+    directory = Path(root or EXPORT_ROOT) / export_id
+    if not _EXPORT_ID.fullmatch(export_id) or not (directory / "manifest.json").is_file():
+        raise LookupError(export_id)
+    return directory
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only sink collecting what :mod:`zipfile` writes, for streaming."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self.chunks = self.chunks, []
+        return iter(chunks)
+
+
+def iter_export_archive(directory: Path, *, block_size: int = 1 << 20) -> Iterator[bytes]:
+    """Stream an export directory as a zip archive, one block at a time.
+
+    Entries are stored uncompressed: the columns are binary and the archive
+    is only a container. The archive is never materialized on disk.
+    """
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for path in sorted(directory.iterdir()):
+            with path.open("rb") as source, archive.open(path.name, "w", force_zip64=True) as entry:
+                while block := source.read(block_size):
+                    entry.write(block)
+                    yield from sink.drain()
+    yield from sink.drain()
+
+
+def prune_exports(
+    root: Optional[Path] = None,
+    *,
+    retention: Optional[timedelta] = None,
+    now: Optional[float] = None,
+) -> list[str]:
+    """Delete exports older than ``retention``; returns the removed ids."""
+    root = Path(root or EXPORT_ROOT)
+    if not root.is_dir():
+        return []
+    cutoff = (now or time.time()) - (retention or EXPORT_RETENTION).total_seconds()
+    removed = []
+    for directory in root.iterdir():
+        if _EXPORT_ID.fullmatch(directory.name) and directory.stat().st_mtime < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed.append(directory.name)
+    return removed
+
+
+def delete_export(export_id: str, root: Optional[Path] = None) -> None:
+    shutil.rmtree(export_dir(export_id, root))
+
+
+def load_export(directory: Path | str) -> ColumnSet:
+    """Memory-map an export written by :func:`export_table`."""
+    import numpy as np
+
+    directory = Path(directory)
+    manifest = json.loads((directory / "manifest.json").read_text())
+    arrays: dict[str, Any] = {}
+    dictionaries: dict[str, list[str]] = {}
+    for column in manifest["columns"]:
+        array = np.load(directory / column["file"], mmap_mode="r" if manifest["rows"] else None)
+        # ``rows`` is authoritative: rows deleted mid-export leave unused tail slots.
+        arrays[column["name"]] = array[: manifest["rows"]]
+        if "dictionary" in column:
+            dictionaries[column["name"]] = column["dictionary"]
+    return ColumnSet(
+        table=manifest["table"], rows=manifest["rows"], arrays=arrays, dictionaries=dictionaries
+    )
+
+
+def spend_summary(columns: ColumnSet, group_by: Iterable[str] = SUMMARY_KEYS) -> list[dict[str, Any]]:
+    """Spend per group, largest first.
+
+    ``total`` sums raw amounts (only meaningful when grouping by currency);
+    ``total_base`` sums amounts converted to the FX base currency, using the
+    stored ``amount_base`` where present and a vectorized conversion at the
+    row's date otherwise. Rows in a currency with no known rate are left out
+    of ``total_base`` and counted in ``unrated`` instead; the rules treat them
+    the same way. Transactions only count ``outgoing`` rows as spend.
+    """
+    import numpy as np
+
+    keys = list(dict.fromkeys(group_by))
+    unknown = set(keys) - set(SUMMARY_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}")
+    spec = table_spec(columns.table)
+    date_column = "created_at" if spec.name == "purchase_orders" else "happened_at"
+
+    mask = np.ones(columns.rows, dtype=bool)
+    if "direction" in columns.arrays:
+        outgoing = columns.dictionaries["direction"]
+        code = outgoing.index("outgoing") if "outgoing" in outgoing else -2
+        mask &= np.asarray(columns.arrays["direction"]) == code
+    raw = np.asarray(columns.arrays[spec.amount], dtype=float)[mask]
+    stored = (
+        np.asarray(columns.arrays["amount_base"], dtype=float)[mask]
+        if "amount_base" in columns.arrays
+        else np.full(len(raw), np.nan)
+    )
+    missing = np.flatnonzero(np.isnan(stored))
+    if len(missing):
+        currency_names = np.array([*columns.dictionaries["currency"], None], dtype=object)
+        codes = np.asarray(columns.arrays["currency"])[mask][missing]
+        stored[missing] = load_rates().convert_many(
+            raw[missing],
+            currency_names[codes],
+            np.asarray(columns.arrays[date_column])[mask][missing],
+        )
+    unrated = np.isnan(stored)
+    amounts = np.nan_to_num(raw)
+    amounts_base = np.where(unrated, 0.0, stored)
+
+    key_arrays = []
+    for key in keys:
+        if key == "month":
+            months = np.asarray(columns.arrays[date_column])[mask].astype("datetime64[M]")
+            key_arrays.append(months.astype(np.int64))
+        else:
+            key_arrays.append(np.asarray(columns.arrays[key])[mask].astype(np.int64))
+    if key_arrays:
+        groups, inverse = np.unique(np.stack(key_arrays, axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        groups = np.zeros((1 if len(amounts) else 0, 0), dtype=np.int64)
+        inverse = np.zeros(len(amounts), dtype=np.int64)
+    totals = np.bincount(inverse, weights=amounts, minlength=len(groups))
+    totals_base = np.bincount(inverse, weights=amounts_base, minlength=len(groups))
+    counts = np.bincount(inverse, minlength=len(groups))
+    unrated_counts = np.bincount(inverse, weights=unrated, minlength=len(groups))
+
+    nat = np.datetime64("NaT").astype("datetime64[M]").astype(np.int64)
+    result = []
+    for group, total, total_base, count, unrated_count in zip(
+        groups.tolist(),
+        totals.tolist(),
+        totals_base.tolist(),
+        counts.tolist(),
+        unrated_counts.astype(np.int64).tolist(),
+    ):
+        row: dict[str, Any] = {}
+        for key, value in zip(keys, group):
+            if key == "month":
+                row[key] = None if value == nat else str(np.datetime64(value, "M"))
+            else:
+                row[key] = columns.dictionaries[key][value] if value >= 0 else None
+        row["total"] = total
+        row["total_base"] = total_base
+        row["count"] = count
+        row["unrated"] = unrated_count
+        result.append(row)
+    result.sort(key=lambda row: row["total_base"], reverse=True)
+    return result
@@ -0,0 +1,209 @@
+"""Resumable re-embedding backfill for rolling out a new embedding strategy.
+
+Usage::
+
+    python -m app.services.backfill --strategy hash-v2 --workers 4
+
+The command backfills the primary database and then every dedicated shard
+under ``EMPIRE_SHARD_DIR``, each with its own job. A job walks media objects
+in id order, embeds chunks of documents across a process pool, bulk inserts
+the new vectors and records the last processed id after every chunk, so an
+interrupted run resumes where it stopped. Once every media object has a
+vector for the strategy, search is switched to it in the same transaction
+that marks the job complete.
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import and_, exists, func, insert, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .embeddings import set_active_strategy
+from .vectorizer import EMBEDDING_STRATEGIES, embed_text
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _embed_batch(args: tuple[str, list[str]]) -> list[list[float]]:
+    strategy, texts = args
+    return [embed_text(text, strategy) for text in texts]
+
+
+def _read_text(storage_path: Optional[str]) -> str:
+    if not storage_path:
+        return ""
+    try:
+        return Path(storage_path).read_text(errors="ignore")
+    except OSError:
+        return ""
+
+
+def _missing_vector(strategy: str):
+    return ~exists().where(
+        and_(
+            models.DocumentVector.media_object_id == models.MediaObject.id,
+            models.DocumentVector.embedding_strategy == strategy,
+        )
+    )
+
+
+def _job_for(session: Session, strategy: str) -> models.EmbeddingBackfill:
+    job = session.scalars(
+        select(models.EmbeddingBackfill)
+        .where(
+            models.EmbeddingBackfill.strategy == strategy,
+            models.EmbeddingBackfill.status == "running",
+        )
+        .order_by(models.EmbeddingBackfill.id.desc())
+        .limit(1)
+    ).first()
+    if job is None:
+        job = models.EmbeddingBackfill(strategy=strategy, status="running")
+        session.add(job)
+        session.commit()
+    return job
+
+
+def _embed_chunks(
+    executor: Optional[Executor],
+    strategy: str,
+    texts: list[str],
+    workers: int,
+) -> list[list[float]]:
+    if executor is None:
+        return _embed_batch((strategy, texts))
+    size = max(1, -(-len(texts) // workers))
+    batches = [(strategy, texts[i:i + size]) for i in range(0, len(texts), size)]
+    return [vector for batch in executor.map(_embed_batch, batches) for vector in batch]
+
+
+def run_backfill(
+    session_factory: Callable[[], Session],
+    strategy: str,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    activate: bool = True,
+    max_chunks: Optional[int] = None,
+) -> models.EmbeddingBackfill:
+    """Embed every media object lacking a ``strategy`` vector.
+
+    ``max_chunks`` bounds the work done in this call (the job stays
+    ``running`` and the next call resumes from its checkpoint).
+    """
+    if strategy not in EMBEDDING_STRATEGIES:
+        raise ValueError(f"Unknown embedding strategy {strategy!r}")
+
+    executor: Optional[Executor] = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        with session_factory() as session:
+            job = _job_for(session, strategy)
+            chunks = 0
+            while max_chunks is None or chunks < max_chunks:
+                rows = session.execute(
+                    select(
+                        models.MediaObject.id,
+                        models.MediaObject.llc_id,
+                        models.MediaObject.storage_path,
+                    )
+                    .where(models.MediaObject.id > job.last_media_object_id, _missing_vector(strategy))
+                    .order_by(models.MediaObject.id)
+                    .limit(chunk_size)
+                ).all()
+                if not rows:
+                    if _finish(session, job, activate=activate):
+                        break
+                    # Documents below the checkpoint still lack vectors (e.g.
+                    # ingested before the job was registered); sweep again.
+                    job.last_media_object_id = 0
+                    continue
+
+                texts = [_read_text(path) for _, _, path in rows]
+                vectors = _embed_chunks(executor, strategy, texts, workers)
+                session.execute(
+                    insert(models.DocumentVector),
+                    [
+                        {
+                            "media_object_id": media_id,
+                            "llc_id": llc_id,
+                            "vector": vector,
+                            "embedding_strategy": strategy,
+                        }
+                        for (media_id, llc_id, _), vector in zip(rows, vectors)
+                    ],
+                )
+                job.last_media_object_id = rows[-1][0]
+                job.processed += len(rows)
+                session.commit()
+                chunks += 1
+            return job
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _finish(session: Session, job: models.EmbeddingBackfill, *, activate: bool) -> bool:
+    """Atomically mark the job complete (and activate it) if coverage is full."""
+    remaining = session.execute(
+        select(func.count()).select_from(models.MediaObject).where(_missing_vector(job.strategy))
+    ).scalar_one()
+    if remaining:
+        return False
+    job.status = "completed"
+    job.completed_at = datetime.utcnow()
+    if activate:
+        set_active_strategy(session, job.strategy)
+    session.commit()
+    return True
+
+
+def coverage(session: Session, strategy: str) -> tuple[int, int]:
+    """Return ``(media objects with a strategy vector, total media objects)``."""
+    total = session.execute(select(func.count()).select_from(models.MediaObject)).scalar_one()
+    missing = session.execute(
+        select(func.count()).select_from(models.MediaObject).where(_missing_vector(strategy))
+    ).scalar_one()
+    return total - missing, total
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .. import database
+    from ..sharding import ShardRouter
+
+    parser = argparse.ArgumentParser(description="Re-embed stored documents with a new strategy.")
+    parser.add_argument("--strategy", required=True, choices=EMBEDDING_STRATEGIES)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--no-activate", action="store_true")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    router = ShardRouter.from_env()
+    targets = [("primary", database.SessionLocal)] + [
+        (f"llc_{llc_id}", router.sessionmaker_for(llc_id)) for llc_id in router.shard_ids()
+    ]
+    for label, factory in targets:
+        job = run_backfill(
+            factory,
+            args.strategy,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            activate=not args.no_activate,
+        )
+        with factory() as session:
+            covered, total = coverage(session, args.strategy)
+        print(
+            f"{label} {args.strategy}: {job.status}, {job.processed} embedded, "
+            f"{covered}/{total} covered"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,355 @@
+"""Hash chaining and verification for the append-only event stream."""
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import create_engine, event as sa_event, false, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+GENESIS_HASH = "0" * 64
+SEGMENT_SIZE = 10_000
+VERIFY_BATCH_SIZE = 5_000
+
+_HEAD_KEY = "event_chain_head"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def event_hash(
+    prev_hash: str,
+    event_type: str,
+    payload: dict[str, Any],
+    created_at: datetime,
+) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256()
+    for part in (prev_hash, event_type, created_at.isoformat(), canonical):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def merkle_root(hashes: Sequence[str]) -> str:
+    if not hashes:
+        return GENESIS_HASH
+    level = [bytes.fromhex(value) for value in hashes]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [
+            hashlib.sha256(level[i] + level[i + 1]).digest()
+            for i in range(0, len(level), 2)
+        ]
+    return level[0].hex()
+
+
+def link_event(session: Session, event: models.Event) -> None:
+    """Stamp ``event`` with its chain hashes; call before it is flushed.
+
+    The chain head is cached on the session so several events added within one
+    unit of work link to each other in insertion order. The first call in a
+    transaction takes the write lock (see :func:`_stored_head`), which keeps
+    the cached head current until commit.
+    """
+    prev_hash = session.info.get(_HEAD_KEY)
+    if prev_hash is None:
+        prev_hash = _stored_head(session)
+    if event.created_at is None:
+        event.created_at = datetime.utcnow()
+    event.prev_hash = prev_hash
+    event.chain_hash = event_hash(prev_hash, event.event_type, event.payload, event.created_at)
+    session.info[_HEAD_KEY] = event.chain_hash
+
+
+def link_rows(session: Session, rows: list[dict[str, Any]]) -> None:
+    """Stamp bulk-insert parameter dicts with chain hashes, in list order.
+
+    Flush pending ORM events first so ids follow chain order.
+    """
+    prev_hash = session.info.get(_HEAD_KEY)
+    if prev_hash is None:
+        prev_hash = _stored_head(session)
+    for row in rows:
+        row.setdefault("created_at", datetime.utcnow())
+        row["prev_hash"] = prev_hash
+        row["chain_hash"] = prev_hash = event_hash(
+            prev_hash, row["event_type"], row["payload"], row["created_at"]
+        )
+    session.info[_HEAD_KEY] = prev_hash
+
+
+def _stored_head(session: Session) -> str:
+    """The committed chain head, read while holding the write lock.
+
+    Two sessions linking from the same head would both claim it as their
+    ``prev_hash`` and the second flush would hit the unique constraint. On
+    SQLite a no-op UPDATE takes the database write lock first, so concurrent
+    writers queue behind this transaction and read the head it leaves;
+    elsewhere the head row is selected ``FOR UPDATE``.
+    """
+    stmt = (
+        select(models.Event.chain_hash)
+        .where(models.Event.chain_hash.isnot(None))
+        .order_by(models.Event.id.desc())
+        .limit(1)
+    )
+    if session.get_bind().dialect.name == "sqlite":
+        events = models.Event.__table__
+        session.execute(update(events).where(false()).values(id=events.c.id))
+    else:
+        stmt = stmt.with_for_update()
+    return session.execute(stmt).scalar_one_or_none() or GENESIS_HASH
+
+
+@sa_event.listens_for(Session, "after_commit")
+@sa_event.listens_for(Session, "after_rollback")
+def _reset_head(session: Session) -> None:
+    session.info.pop(_HEAD_KEY, None)
+
+
+@dataclass
+class ChainVerification:
+    ok: bool
+    verified_events: int
+    last_event_id: Optional[int]
+    first_invalid_event_id: Optional[int] = None
+    reason: Optional[str] = None
+    segments_verified: int = 0
+
+
+def _chained_rows(
+    session: Session,
+    *,
+    after_id: int = 0,
+    until_id: Optional[int] = None,
+    batch_size: int = VERIFY_BATCH_SIZE,
+) -> Iterator[tuple]:
+    """Stream chained events in id order using keyset batches."""
+    columns = (
+        models.Event.id,
+        models.Event.event_type,
+        models.Event.payload,
+        models.Event.created_at,
+        models.Event.prev_hash,
+        models.Event.chain_hash,
+    )
+    while True:
+        stmt = (
+            select(*columns)
+            .where(models.Event.id > after_id, models.Event.chain_hash.isnot(None))
+            .order_by(models.Event.id)
+            .limit(batch_size)
+        )
+        if until_id is not None:
+            stmt = stmt.where(models.Event.id <= until_id)
+        rows = session.execute(stmt).all()
+        if not rows:
+            return
+        yield from rows
+        after_id = rows[-1][0]
+
+
+def _verify_rows(rows: Iterable[tuple], expected_prev: str) -> tuple[ChainVerification, list[str]]:
+    count = 0
+    last_id: Optional[int] = None
+    hashes: list[str] = []
+    for event_id, event_type, payload, created_at, prev_hash, chain_hash in rows:
+        if prev_hash != expected_prev:
+            return ChainVerification(False, count, last_id, event_id, "broken link"), hashes
+        if event_hash(prev_hash, event_type, payload, created_at) != chain_hash:
+            return ChainVerification(False, count, last_id, event_id, "hash mismatch"), hashes
+        expected_prev = chain_hash
+        last_id = event_id
+        hashes.append(chain_hash)
+        count += 1
+    return ChainVerification(True, count, last_id), hashes
+
+
+def verify_incremental(
+    session: Session,
+    *,
+    from_checkpoint: bool = True,
+    segment_size: int = SEGMENT_SIZE,
+) -> ChainVerification:
+    """Verify events appended since the last checkpoint, then advance it.
+
+    Newly verified events are sealed into Merkle segments so later audits can
+    re-check history in parallel without walking the chain from genesis.
+    """
+    checkpoint = None
+    if from_checkpoint:
+        checkpoint = (
+            session.query(models.EventChainCheckpoint)
+            .order_by(models.EventChainCheckpoint.event_id.desc())
+            .first()
+        )
+    after_id = checkpoint.event_id if checkpoint else 0
+    expected_prev = checkpoint.chain_hash if checkpoint else GENESIS_HASH
+
+    result, hashes = _verify_rows(_chained_rows(session, after_id=after_id), expected_prev)
+    if not result.ok or result.last_event_id is None:
+        if result.last_event_id is None and checkpoint:
+            result.last_event_id = checkpoint.event_id
+        return result
+
+    session.add(
+        models.EventChainCheckpoint(event_id=result.last_event_id, chain_hash=hashes[-1])
+    )
+    session.flush()
+    seal_segments(session, segment_size=segment_size)
+    session.commit()
+    return result
+
+
+def seal_segments(session: Session, *, segment_size: int = SEGMENT_SIZE) -> list[models.EventChainSegment]:
+    """Seal full segments of verified events that are not yet covered."""
+    checkpoint_id = session.execute(
+        select(models.EventChainCheckpoint.event_id)
+        .order_by(models.EventChainCheckpoint.event_id.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+    if checkpoint_id is None:
+        return []
+    last_sealed = (
+        session.query(models.EventChainSegment)
+        .order_by(models.EventChainSegment.end_event_id.desc())
+        .first()
+    )
+    after_id = last_sealed.end_event_id if last_sealed else 0
+
+    sealed: list[models.EventChainSegment] = []
+    batch: list[tuple] = []
+    for row in _chained_rows(session, after_id=after_id, until_id=checkpoint_id):
+        batch.append(row)
+        if len(batch) < segment_size:
+            continue
+        segment = models.EventChainSegment(
+            start_event_id=batch[0][0],
+            end_event_id=batch[-1][0],
+            start_prev_hash=batch[0][4],
+            end_hash=batch[-1][5],
+            merkle_root=merkle_root([item[5] for item in batch]),
+            event_count=len(batch),
+        )
+        session.add(segment)
+        sealed.append(segment)
+        batch = []
+    session.flush()
+    return sealed
+
+
+SegmentTask = tuple[int, int, str, int, str]
+
+
+def _check_segment(session: Session, task: SegmentTask) -> ChainVerification:
+    """Rehash one sealed segment over ``session`` and compare its Merkle root."""
+    start_id, end_id, start_prev_hash, event_count, root = task
+    rows = _chained_rows(session, after_id=start_id - 1, until_id=end_id)
+    result, hashes = _verify_rows(rows, start_prev_hash)
+    if result.ok and (len(hashes) != event_count or merkle_root(hashes) != root):
+        result.ok = False
+        result.first_invalid_event_id = start_id
+        result.reason = "merkle root mismatch"
+    return result
+
+
+def _verify_segment(args: tuple[str, SegmentTask]) -> ChainVerification:
+    """Worker entry point: check one segment over a fresh engine for ``url``."""
+    url, task = args
+    engine = create_engine(url)
+    try:
+        with Session(engine) as worker:
+            return _check_segment(worker, task)
+    finally:
+        engine.dispose()
+
+
+def _segment_pool(max_workers: int) -> ProcessPoolExecutor:
+    """The shared audit pool, started on first use.
+
+    Workers are spawned rather than forked: the API process runs request
+    threads and holds open connections, neither of which survive a fork.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the audit pool's workers, if it was started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def verify_segments(session: Session, *, max_workers: int = 4) -> ChainVerification:
+    """Re-verify every sealed segment in parallel.
+
+    Each segment is self-contained (its first ``prev_hash`` and Merkle root are
+    stored), so worker processes rehash disjoint ranges over their own
+    connections; only the segment boundaries are compared sequentially.
+    Hashing is CPU bound, hence processes rather than threads. The pool is
+    shared across calls and sized by the first caller's ``max_workers``.
+    In-memory databases, single segments and ``max_workers=1`` are checked
+    inline over ``session``.
+    """
+    segments = (
+        session.query(models.EventChainSegment)
+        .order_by(models.EventChainSegment.start_event_id)
+        .all()
+    )
+    if not segments:
+        return ChainVerification(True, 0, None)
+
+    expected_prev = GENESIS_HASH
+    for segment in segments:
+        if segment.start_prev_hash != expected_prev:
+            return ChainVerification(
+                False, 0, None, segment.start_event_id, "segment boundary mismatch"
+            )
+        expected_prev = segment.end_hash
+
+    tasks = [
+        (
+            segment.start_event_id,
+            segment.end_event_id,
+            segment.start_prev_hash,
+            segment.event_count,
+            segment.merkle_root,
+        )
+        for segment in segments
+    ]
+    url = session.get_bind().url
+    if max_workers > 1 and len(tasks) > 1 and url.database not in (None, "", ":memory:"):
+        rendered = url.render_as_string(hide_password=False)
+        pool = _segment_pool(max_workers)
+        results = list(pool.map(_verify_segment, [(rendered, task) for task in tasks]))
+    else:
+        results = [_check_segment(session, task) for task in tasks]
+
+    total = 0
+    for index, result in enumerate(results):
+        total += result.verified_events
+        if not result.ok:
+            result.verified_events = total
+            result.segments_verified = index
+            return result
+    return ChainVerification(
+        True, total, segments[-1].end_event_id, segments_verified=len(segments)
+    )
@@ -0,0 +1,61 @@
+"""Embedding strategy selection shared by ingest, search and backfills."""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .vectorizer import EMBEDDING_STRATEGIES, EMBEDDING_STRATEGY
+
+ACTIVE_STRATEGY_KEY = "search.embedding_strategy"
+
+
+def active_strategy(session: Session) -> str:
+    """Strategy search queries are embedded with and matched against."""
+    value = session.execute(
+        select(models.AppSetting.value).where(models.AppSetting.key == ACTIVE_STRATEGY_KEY)
+    ).scalar_one_or_none()
+    return value or EMBEDDING_STRATEGY
+
+
+def shared_strategy(sessions: Sequence[Session]) -> Optional[str]:
+    """Strategy every session can be searched with, so scores stay comparable.
+
+    That is the active strategy when all databases agree. During a rollout
+    that has switched only some of them, it is the first active strategy
+    covering every document in every database. ``None`` if there is none.
+    """
+    from .backfill import coverage
+
+    active = list(dict.fromkeys(active_strategy(session) for session in sessions))
+    if len(active) == 1:
+        return active[0]
+    for candidate in active:
+        counts = [coverage(session, candidate) for session in sessions]
+        if all(covered == total for covered, total in counts):
+            return candidate
+    return None
+
+
+def set_active_strategy(session: Session, strategy: str) -> None:
+    if strategy not in EMBEDDING_STRATEGIES:
+        raise ValueError(f"Unknown embedding strategy {strategy!r}")
+    setting = session.get(models.AppSetting, ACTIVE_STRATEGY_KEY)
+    if setting is None:
+        session.add(models.AppSetting(key=ACTIVE_STRATEGY_KEY, value=strategy))
+    else:
+        setting.value = strategy
+
+
+def ingest_strategies(session: Session) -> list[str]:
+    """Strategies new documents are embedded with: the active one first,
+    followed by any strategy a running backfill is rolling out."""
+    active = active_strategy(session)
+    pending = session.scalars(
+        select(models.EmbeddingBackfill.strategy)
+        .where(models.EmbeddingBackfill.status == "running")
+        .distinct()
+    ).all()
+    return [active, *sorted(set(pending) - {active})]
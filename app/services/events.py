@@ -0,0 +1,116 @@
+"""Event stream helpers for Empire OS prototype."""
+from __future__ import annotations
+
+from typing import Any, Iterable, Optional, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from .chain import link_event, link_rows
+
+# Payload keys that reference canonical entities, mapped to the entity type
+# recorded in the ``event_entities`` index.
+ENTITY_KEYS = {
+    "llc_id": "llc",
+    "media_object_id": "media_object",
+    "purchase_order_id": "purchase_order",
+    "suggestion_id": "suggestion",
+    "vendor_id": "vendor",
+}
+
+
+def parse_entity(value: str) -> tuple[str, int]:
+    """Parse an ``entity_type:id`` reference such as ``purchase_order:123``."""
+    entity_type, sep, raw_id = value.partition(":")
+    if not sep or not entity_type or not raw_id.isdigit():
+        raise ValueError(f"Invalid entity reference {value!r}; expected '<type>:<id>'")
+    if entity_type not in ENTITY_KEYS.values():
+        raise ValueError(f"Unknown entity type {entity_type!r}")
+    return entity_type, int(raw_id)
+
+
+def payload_entities(payload: dict[str, Any]) -> list[tuple[str, int]]:
+    entities: list[tuple[str, int]] = []
+    for key, entity_type in ENTITY_KEYS.items():
+        value = payload.get(key)
+        if isinstance(value, int):
+            entities.append((entity_type, value))
+    return entities
+
+
+def _event_entities(
+    payload: dict[str, Any], entities: Iterable[tuple[str, int]]
+) -> list[tuple[str, int]]:
+    return list(dict.fromkeys([*payload_entities(payload), *entities]))
+
+
+def record_event(
+    session: Session,
+    event_type: str,
+    payload: dict[str, Any],
+    *,
+    entities: Iterable[tuple[str, int]] = (),
+) -> models.Event:
+    """Add a hash-chained event together with its entity index rows.
+
+    Entities referenced by id in ``payload`` are indexed automatically; callers
+    pass ``entities`` for references that are not part of the payload.
+    """
+    event = models.Event(event_type=event_type, payload=payload)
+    for entity_type, entity_id in _event_entities(payload, entities):
+        event.entities.append(
+            models.EventEntity(entity_type=entity_type, entity_id=entity_id)
+        )
+    link_event(session, event)
+    session.add(event)
+    return event
+
+
+def record_events(
+    session: Session,
+    event_type: str,
+    items: Sequence[tuple[dict[str, Any], Iterable[tuple[str, int]]]],
+) -> list[int]:
+    """Bulk insert ``(payload, entities)`` events of one type; returns their ids.
+
+    Events are chained in ``items`` order exactly as :func:`record_event`
+    would chain them, but written with two executemany statements.
+    """
+    if not items:
+        return []
+    session.flush()
+    rows = [{"event_type": event_type, "payload": payload} for payload, _ in items]
+    link_rows(session, rows)
+    event_ids = session.scalars(
+        insert(models.Event).returning(models.Event.id, sort_by_parameter_order=True),
+        rows,
+    ).all()
+    entity_rows = [
+        {"event_id": event_id, "entity_type": entity_type, "entity_id": entity_id}
+        for event_id, (payload, entities) in zip(event_ids, items)
+        for entity_type, entity_id in _event_entities(payload, entities)
+    ]
+    if entity_rows:
+        session.execute(insert(models.EventEntity), entity_rows)
+    return list(event_ids)
+
+
+def list_events(
+    session: Session,
+    limit: int = 50,
+    *,
+    entity: Optional[tuple[str, int]] = None,
+    event_type: Optional[str] = None,
+    columns: Sequence[Any] = (),
+) -> Iterable[Any]:
+    query = session.query(*(columns or (models.Event,)))
+    if entity:
+        entity_type, entity_id = entity
+        query = query.join(models.EventEntity, models.EventEntity.event_id == models.Event.id).filter(
+            models.EventEntity.entity_type == entity_type,
+            models.EventEntity.entity_id == entity_id,
+        )
+    if event_type:
+        query = query.filter(models.Event.event_type == event_type)
+    return query.order_by(models.Event.created_at.desc(), models.Event.id.desc()).limit(limit)
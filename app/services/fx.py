@@ -0,0 +1,169 @@
+"""Foreign-exchange normalization to a single base currency.
+
+Rates come from a CSV table with ``date,currency,rate`` rows, where ``rate``
+is the amount of :data:`BASE_CURRENCY` one unit of ``currency`` buys on that
+date. ``EMPIRE_FX_RATES_PATH`` points at that feed (the file is re-read when
+it changes). No rates ship with the package: without a feed every currency
+other than :data:`BASE_CURRENCY` is unrated, so ``amount_base`` stays NULL
+and callers apply their unrated-order handling. A date uses the latest rate
+on or before it, or the earliest known rate for dates before the table
+starts.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from ..instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = "USD"
+
+
+class RateTable:
+    """Per-currency sorted day/rate arrays with a memo of point lookups."""
+
+    def __init__(self, rows: dict[str, list[tuple[date, float]]], base: str = BASE_CURRENCY) -> None:
+        import numpy as np
+
+        self.base = base
+        self._days: dict[str, Any] = {}
+        self._rates: dict[str, Any] = {}
+        for currency, points in rows.items():
+            points = sorted(points)
+            self._days[currency] = np.array([day for day, _ in points], dtype="datetime64[D]")
+            self._rates[currency] = np.array([rate for _, rate in points], dtype=float)
+        self._memo: dict[tuple[str, date], Optional[float]] = {}
+
+    @classmethod
+    def from_csv(cls, path: Path | str, base: str = BASE_CURRENCY) -> "RateTable":
+        rows: dict[str, list[tuple[date, float]]] = {}
+        with open(path, newline="") as handle:
+            for record in csv.DictReader(handle):
+                try:
+                    day = date.fromisoformat(record["date"].strip())
+                    rate = float(record["rate"])
+                except (KeyError, ValueError, AttributeError) as exc:
+                    raise ValueError(f"Invalid FX rate row {record!r} in {path}") from exc
+                rows.setdefault(record["currency"].strip().upper(), []).append((day, rate))
+        return cls(rows, base=base)
+
+    @property
+    def currencies(self) -> set[str]:
+        return {self.base, *self._rates}
+
+    def rate(self, currency: Optional[str], on: Optional[date | datetime] = None) -> Optional[float]:
+        """Base units per unit of ``currency`` on ``on``; ``None`` if unknown."""
+        import numpy as np
+
+        code = (currency or self.base).upper()
+        if code == self.base:
+            return 1.0
+        day = _day(on)
+        key = (code, day)
+        if key in self._memo:
+            return self._memo[key]
+        days = self._days.get(code)
+        if days is None:
+            value = None
+        else:
+            index = max(int(np.searchsorted(days, np.datetime64(day, "D"), side="right")) - 1, 0)
+            value = float(self._rates[code][index])
+        self._memo[key] = value
+        return value
+
+    def convert(
+        self,
+        amount: Optional[float],
+        currency: Optional[str],
+        on: Optional[date | datetime] = None,
+    ) -> Optional[float]:
+        if amount is None:
+            return None
+        rate = self.rate(currency, on)
+        if rate is None:
+            count(
+                "empire_fx_missing_rate_total",
+                "Conversions skipped for lack of a rate.",
+                currency=(currency or "").upper(),
+            )
+            return None
+        return amount * rate
+
+    def convert_many(self, amounts, currencies, dates):
+        """Vectorized :meth:`convert`: one ``searchsorted`` per distinct currency.
+
+        ``currencies`` is a sequence of codes (``None`` means the base
+        currency) and ``dates`` anything ``datetime64`` accepts; unknown
+        currencies yield ``NaN``.
+        """
+        import numpy as np
+
+        amounts = np.asarray(amounts, dtype=float)
+        codes = np.array([(c or self.base).upper() for c in currencies], dtype=object)
+        days = np.asarray(dates, dtype="datetime64[D]")
+        # Missing dates convert at today's rate, like :meth:`rate` with no date.
+        days = np.where(np.isnat(days), np.datetime64(date.today(), "D"), days)
+        rates = np.full(len(amounts), np.nan)
+        for code in set(codes.tolist()):
+            rows = codes == code
+            if code == self.base:
+                rates[rows] = 1.0
+                continue
+            table_days = self._days.get(code)
+            if table_days is None:
+                continue
+            index = np.searchsorted(table_days, days[rows], side="right") - 1
+            rates[rows] = self._rates[code][np.clip(index, 0, None)]
+        return amounts * rates
+
+
+def _day(on: Optional[date | datetime]) -> date:
+    if on is None:
+        return date.today()
+    if isinstance(on, datetime):
+        return on.date()
+    return on
+
+
+_tables: dict[str, tuple[int, RateTable]] = {}
+_tables_lock = threading.Lock()
+_unconfigured: Optional[RateTable] = None
+
+
+def rates_configured() -> bool:
+    return bool(os.getenv("EMPIRE_FX_RATES_PATH"))
+
+
+def load_rates(path: Optional[Path | str] = None) -> RateTable:
+    """Rates from ``path`` or ``EMPIRE_FX_RATES_PATH``.
+
+    Without either, returns an empty table (only the base currency converts)
+    and logs a warning the first time.
+    """
+    global _unconfigured
+    path = path or os.getenv("EMPIRE_FX_RATES_PATH")
+    if not path:
+        if _unconfigured is None:
+            logger.warning(
+                "EMPIRE_FX_RATES_PATH is not set; amounts outside %s are stored unrated",
+                BASE_CURRENCY,
+            )
+            _unconfigured = RateTable({})
+        return _unconfigured
+    path = Path(path)
+    key = str(path)
+    mtime = path.stat().st_mtime_ns
+    cached = _tables.get(key)
+    if cached is None or cached[0] != mtime:
+        with _tables_lock:
+            cached = _tables.get(key)
+            if cached is None or cached[0] != mtime:
+                cached = _tables[key] = (mtime, RateTable.from_csv(path))
+    return cached[1]
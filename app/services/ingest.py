@@ -2,20 +2,82 @@
 from __future__ import annotations
 
 import hashlib
+import io
+import math
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import BinaryIO, Iterator, Optional, Tuple
 
 from fastapi import UploadFile
+from sqlalchemy import insert, inspect
 from sqlalchemy.orm import Session
 
 from .. import models
+from ..cache import mark_dirty
+from ..instrumentation import span
 from .agent import FinanceAgent
-from .parser import PurchaseParser, parser_event_payload
+from .embeddings import ingest_strategies
+from .events import record_event, record_events
+from .fx import RateTable, load_rates
+from .parse_cache import ParseCache
+from .parser import ParsedPurchase, PurchaseParser, parser_event_payload
+from .search import index_terms
 from .vectorizer import embed_text
+from .vendors import VendorResolver
 
 MEDIA_ROOT = Path("storage")
-MEDIA_ROOT.mkdir(exist_ok=True)
+STATEMENT_BATCH_SIZE = 500
+_ORDER_COLUMNS = [attr.key for attr in inspect(models.PurchaseOrder).column_attrs]
+_created_roots: set[Path] = set()
+
+
+def _media_root() -> Path:
+    """Return the media directory, creating it on first use."""
+    root = MEDIA_ROOT
+    if root not in _created_roots:
+        root.mkdir(parents=True, exist_ok=True)
+        _created_roots.add(root)
+    return root
+
+
+@dataclass
+class StatementIngest:
+    media: models.MediaObject
+    purchase_order_ids: list[int]
+    credit_line_items: int
+    total_amount_base: float
+    events: list[models.Event]
+    suggestions: dict[str, int]
+
+
+class _HashingReader(io.RawIOBase):
+    """Read ``source`` while copying every chunk to ``sink`` and a SHA-256."""
+
+    def __init__(self, source: BinaryIO, sink: BinaryIO) -> None:
+        self.source = source
+        self.sink = sink
+        self.digest = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self.source.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        self.sink.write(chunk)
+        self.digest.update(chunk)
+        return len(chunk)
+
+    def hexdigest(self) -> str:
+        return self.digest.hexdigest()
+
+
+def _order_status(parsed: ParsedPurchase) -> str:
+    status = parsed.payment_status or (
+        parsed.status.lower().replace(" ", "-") if parsed.status else None
+    )
+    return status or "pending"
 
 
 class IngestService:
@@ -31,61 +93,263 @@ class IngestService:
         raw_bytes = upload.file.read()
         text = raw_bytes.decode("utf-8", errors="ignore")
 
-        media = self._store_media(
-            llc,
-            upload.filename or "purchase.txt",
-            raw_bytes,
-            upload.content_type or "text/plain",
-        )
-        parsed, confidence = self.parser.parse_text(text)
-        vendor = self._get_or_create_vendor(parsed.vendor_name)
-        status = parsed.payment_status or (
-            parsed.status.lower().replace(" ", "-") if parsed.status else None
-        )
+        with span("ingest.store_media"):
+            media = self._store_media(
+                llc,
+                upload.filename or "purchase.txt",
+                raw_bytes,
+                upload.content_type or "text/plain",
+            )
+        strategy, *pending_strategies = ingest_strategies(self.session)
+        parse_cache = ParseCache(self.session, strategy=strategy)
+        with span("ingest.parse_cache"):
+            cached = parse_cache.lookup(media.sha256)
+        if cached:
+            parsed, confidence, embedding = cached
+        else:
+            with span("ingest.parse"):
+                parsed, confidence = self.parser.parse_text(text)
+            with span("ingest.embed"):
+                embedding = embed_text(text, strategy)
+            parse_cache.store(media.sha256, parsed, confidence, embedding)
+        with span("ingest.vendor"):
+            vendor = self._get_or_create_vendor(parsed.vendor_name)
 
-        purchase_order = models.PurchaseOrder(
-            llc=llc,
-            vendor=vendor,
-            media_object=media,
-            total_amount=parsed.total_amount,
-            currency=parsed.currency,
-            due_date=parsed.due_date,
-            description=parsed.description,
-            status=status or "pending",
-        )
-        self.session.add(purchase_order)
+        with span("ingest.purchase_order"):
+            purchase_order = models.PurchaseOrder(
+                llc=llc,
+                vendor=vendor,
+                media_object=media,
+                total_amount=parsed.total_amount,
+                currency=parsed.currency,
+                amount_base=load_rates().convert(parsed.total_amount, parsed.currency),
+                due_date=parsed.due_date,
+                description=parsed.description,
+                status=_order_status(parsed),
+            )
+            self.session.add(purchase_order)
 
-        if parsed.asset_name:
-            asset = models.Asset(
+            if parsed.asset_name:
+                asset = models.Asset(
+                    purchase_order=purchase_order,
+                    name=parsed.asset_name,
+                    status="pending",
+                )
+                self.session.add(asset)
+
+            self.session.flush()
+
+        with span("ingest.events"):
+            events = self._create_events(
+                media=media,
+                llc=llc,
+                parsed_payload=parser_event_payload(parsed, confidence),
                 purchase_order=purchase_order,
-                name=parsed.asset_name,
-                status="pending",
             )
-            self.session.add(asset)
 
-        self.session.flush()
+        self._index_document(media, llc, text, {strategy: embedding}, pending_strategies)
 
-        events = self._create_events(
-            media=media,
-            llc=llc,
-            parsed_payload=parser_event_payload(parsed, confidence),
-            purchase_order=purchase_order,
-        )
+        with span("ingest.agent"):
+            agent = FinanceAgent(self.session)
+            suggestions = agent.evaluate_purchase_order(purchase_order)
 
-        vector = models.DocumentVector(media_object=media, vector=embed_text(text))
-        self.session.add(vector)
+        with span("ingest.commit"):
+            mark_dirty(self.session, "purchase_orders", "events", "suggestions")
+            self.session.commit()
+            # Columns only: the vendor and media already attached stay loaded.
+            self.session.refresh(purchase_order, _ORDER_COLUMNS)
+            for event in events:
+                self.session.refresh(event)
+            for suggestion in suggestions:
+                self.session.refresh(suggestion)
 
-        agent = FinanceAgent(self.session)
-        suggestions = agent.evaluate_purchase_order(purchase_order)
+        return purchase_order, events, suggestions
 
-        self.session.commit()
-        self.session.refresh(purchase_order)
-        for event in events:
-            self.session.refresh(event)
-        for suggestion in suggestions:
-            self.session.refresh(suggestion)
+    def ingest_statement(self, llc: models.LLC, upload: UploadFile) -> StatementIngest:
+        """Ingest a multi-invoice statement as one media object and many orders.
 
-        return purchase_order, events, suggestions
+        Line items stream from :meth:`PurchaseParser.iter_statement` and are
+        written in batches of :data:`STATEMENT_BATCH_SIZE` with bulk inserts;
+        the finance rules then run once over all new orders in batch mode.
+        Credits (negative amounts such as ``(50.00)``) are not orders: they
+        are counted in ``credit_line_items`` and skipped. The upload is read
+        once, in chunks: bytes are hashed and written to storage as the
+        parser consumes them, and only the decoded text is kept, for the
+        embedding and term index. Raises ``ValueError`` when the statement
+        has no purchase line items; the stored copy is removed on any failure.
+        """
+        with span("ingest.store_media"):
+            media = self._new_media(
+                llc, upload.filename or "statement.csv", upload.content_type or "text/plain"
+            )
+
+        resolver = VendorResolver(self.session)
+        rates = load_rates()
+        order_ids: list[int] = []
+        references: list[Optional[str]] = []
+        total_base = 0.0
+        credits = 0
+        batch: list[ParsedPurchase] = []
+        lines: list[str] = []
+        try:
+            with open(media.storage_path, "wb") as sink, span("ingest.statement_rows"):
+                reader = _HashingReader(upload.file, sink)
+                stream = io.TextIOWrapper(
+                    io.BufferedReader(reader), encoding="utf-8", errors="ignore", newline=""
+                )
+
+                def read_lines() -> Iterator[str]:
+                    for line in stream:
+                        lines.append(line)
+                        yield line
+
+                for parsed in self.parser.iter_statement(read_lines()):
+                    if parsed.total_amount < 0:
+                        credits += 1
+                        continue
+                    batch.append(parsed)
+                    if len(batch) >= STATEMENT_BATCH_SIZE:
+                        ids, amount = self._insert_statement_orders(llc, media, batch, resolver, rates)
+                        order_ids.extend(ids)
+                        references.extend(item.reference for item in batch)
+                        total_base += amount
+                        batch = []
+                if batch:
+                    ids, amount = self._insert_statement_orders(llc, media, batch, resolver, rates)
+                    order_ids.extend(ids)
+                    references.extend(item.reference for item in batch)
+                    total_base += amount
+                lines.extend(stream)
+            if not order_ids:
+                raise ValueError("No purchase line items found in statement")
+        except Exception:
+            # The rows roll back with the session; the stored copy must go too.
+            Path(media.storage_path).unlink(missing_ok=True)
+            raise
+        media.sha256 = reader.hexdigest()
+        text = "".join(lines)
+
+        with span("ingest.events"):
+            events = [
+                record_event(
+                    self.session,
+                    "ingest.received",
+                    {"llc_id": llc.id, "media_object_id": media.id},
+                ),
+                record_event(
+                    self.session,
+                    "ingest.statement_parsed",
+                    {
+                        "llc_id": llc.id,
+                        "media_object_id": media.id,
+                        "line_items": len(order_ids),
+                        "credit_line_items": credits,
+                        "total_amount_base": total_base,
+                    },
+                ),
+            ]
+            record_events(
+                self.session,
+                "purchase_order.created",
+                [
+                    (
+                        {"purchase_order_id": order_id, "reference": reference},
+                        [("llc", llc.id), ("media_object", media.id)],
+                    )
+                    for order_id, reference in zip(order_ids, references)
+                ],
+            )
+
+        strategy, *pending_strategies = ingest_strategies(self.session)
+        with span("ingest.embed"):
+            embedding = embed_text(text, strategy)
+        self._index_document(media, llc, text, {strategy: embedding}, pending_strategies)
+
+        with span("ingest.agent"):
+            suggestions = FinanceAgent(self.session).evaluate_batch(order_ids)
+
+        with span("ingest.commit"):
+            mark_dirty(self.session, "purchase_orders", "events", "suggestions")
+            self.session.commit()
+            for event in events:
+                self.session.refresh(event)
+
+        return StatementIngest(
+            media=media,
+            purchase_order_ids=order_ids,
+            credit_line_items=credits,
+            total_amount_base=total_base,
+            events=events,
+            suggestions=suggestions,
+        )
+
+    def _insert_statement_orders(
+        self,
+        llc: models.LLC,
+        media: models.MediaObject,
+        batch: list[ParsedPurchase],
+        resolver: VendorResolver,
+        rates: RateTable,
+    ) -> tuple[list[int], float]:
+        created_at = datetime.utcnow()
+        with span("ingest.vendor"):
+            vendors = [resolver.resolve(parsed.vendor_name) for parsed in batch]
+        amounts_base = rates.convert_many(
+            [parsed.total_amount for parsed in batch],
+            [parsed.currency for parsed in batch],
+            [created_at] * len(batch),
+        ).tolist()
+        rows = [
+            {
+                "llc_id": llc.id,
+                "vendor_id": vendor.id,
+                "media_object_id": media.id,
+                "total_amount": parsed.total_amount,
+                "currency": parsed.currency,
+                "amount_base": None if math.isnan(amount) else amount,
+                "due_date": parsed.due_date,
+                "description": parsed.description,
+                "status": _order_status(parsed),
+                "created_at": created_at,
+            }
+            for parsed, vendor, amount in zip(batch, vendors, amounts_base)
+        ]
+        with span("ingest.purchase_order"):
+            ids = self.session.scalars(
+                insert(models.PurchaseOrder).returning(
+                    models.PurchaseOrder.id, sort_by_parameter_order=True
+                ),
+                rows,
+            ).all()
+        return list(ids), sum(amount for amount in amounts_base if not math.isnan(amount))
+
+    def _index_document(
+        self,
+        media: models.MediaObject,
+        llc: models.LLC,
+        text: str,
+        embeddings: dict[str, list[float]],
+        pending_strategies: list[str],
+    ) -> None:
+        """Store the document's vectors (computing pending ones) and postings."""
+        for strategy, vector in embeddings.items():
+            self.session.add(
+                models.DocumentVector(
+                    media_object=media, llc_id=llc.id, vector=vector, embedding_strategy=strategy
+                )
+            )
+        with span("ingest.embed"):
+            for pending in pending_strategies:
+                self.session.add(
+                    models.DocumentVector(
+                        media_object=media,
+                        llc_id=llc.id,
+                        vector=embed_text(text, pending),
+                        embedding_strategy=pending,
+                    )
+                )
+        with span("ingest.index_terms"):
+            index_terms(self.session, media.id, text, llc_id=llc.id)
 
     def _store_media(
         self,
@@ -94,32 +358,26 @@ class IngestService:
         raw_bytes: bytes,
         mime: str,
     ) -> models.MediaObject:
-        sha = hashlib.sha256(raw_bytes).hexdigest()
-        storage_path = MEDIA_ROOT / f"{datetime.utcnow().timestamp()}_{filename}"
-        storage_path.write_bytes(raw_bytes)
+        media = self._new_media(llc, filename, mime)
+        Path(media.storage_path).write_bytes(raw_bytes)
+        media.sha256 = hashlib.sha256(raw_bytes).hexdigest()
+        return media
+
+    def _new_media(self, llc: models.LLC, filename: str, mime: str) -> models.MediaObject:
+        """Flush a media row whose file the caller writes to ``storage_path``."""
+        storage_path = _media_root() / f"{datetime.utcnow().timestamp()}_{filename}"
         media = models.MediaObject(
             llc=llc,
             media_type="document",
             mime=mime,
             storage_path=str(storage_path),
-            sha256=sha,
         )
         self.session.add(media)
         self.session.flush()
         return media
 
     def _get_or_create_vendor(self, name: str) -> models.Vendor:
-        vendor = (
-            self.session.query(models.Vendor)
-            .filter(models.Vendor.name == name)
-            .one_or_none()
-        )
-        if vendor:
-            return vendor
-        vendor = models.Vendor(name=name)
-        self.session.add(vendor)
-        self.session.flush()
-        return vendor
+        return VendorResolver(self.session).resolve(name)
 
     def _create_events(
         self,
@@ -129,43 +387,27 @@ class IngestService:
         parsed_payload: dict,
         purchase_order: models.PurchaseOrder,
     ) -> list[models.Event]:
-        ingest_event = models.Event(
-            event_type="ingest.received",
-            payload={"llc_id": llc.id, "media_object_id": media.id},
+        ingest_event = record_event(
+            self.session,
+            "ingest.received",
+            {"llc_id": llc.id, "media_object_id": media.id},
         )
-        parsed_event = models.Event(
-            event_type="ingest.parsed",
-            payload=parsed_payload,
+        parsed_event = record_event(
+            self.session,
+            "ingest.parsed",
+            parsed_payload,
+            entities=[
+                ("llc", llc.id),
+                ("media_object", media.id),
+                ("purchase_order", purchase_order.id),
+            ],
         )
-        purchase_event = models.Event(
-            event_type="purchase_order.created",
-            payload={"purchase_order_id": purchase_order.id},
+        purchase_event = record_event(
+            self.session,
+            "purchase_order.created",
+            {"purchase_order_id": purchase_order.id},
+            entities=[("llc", llc.id), ("media_object", media.id)],
         )
         events = [ingest_event, parsed_event, purchase_event]
-        for event in events:
-            self.session.add(event)
         self.session.flush()
         return events
-
-
-def list_events(session: Session, limit: int = 50) -> Iterable[models.Event]:
-    return (
-        session.query(models.Event)
-        .order_by(models.Event.created_at.desc())
-        .limit(limit)
-    )
-
-
-def search_documents(session: Session, query: str) -> list[tuple[models.MediaObject, float]]:
-    from .vectorizer import cosine_similarity, embed_text
-
-    query_vector = embed_text(query)
-    results: list[tuple[models.MediaObject, float]] = []
-    vectors = session.query(models.DocumentVector).all()
-    for vector in vectors:
-        score = cosine_similarity(vector.vector, query_vector)
-        if score <= 0:
-            continue
-        results.append((vector.media_object, score))
-    results.sort(key=lambda item: item[1], reverse=True)
-    return results
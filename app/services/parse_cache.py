@@ -0,0 +1,108 @@
+"""Persistent parse and embedding cache keyed by document content hash."""
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..instrumentation import count
+from .parser import PARSER_VERSION, ParsedPurchase
+from .vectorizer import EMBEDDING_STRATEGY, embedding_cache_key
+
+MAX_ENTRIES = 50_000
+# Eviction counts the table, so it only runs every few stores.
+EVICTION_INTERVAL = 100
+
+_stores_since_eviction = 0
+
+
+class ParseCache:
+    """Memoize ``(parsed, confidence, vector)`` for identical documents.
+
+    Entries are keyed by ``(sha256, PARSER_VERSION, embedding_cache_key())``;
+    changing the parser version, embedding strategy or its dimension makes
+    existing entries unreachable and they are dropped on the next eviction.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        max_entries: int = MAX_ENTRIES,
+        *,
+        strategy: str = EMBEDDING_STRATEGY,
+    ) -> None:
+        self.session = session
+        self.max_entries = max_entries
+        self.parser_version = PARSER_VERSION
+        self.embedding_strategy = embedding_cache_key(strategy)
+
+    def lookup(self, sha256: str) -> Optional[tuple[ParsedPurchase, float, list[float]]]:
+        entry = self.session.execute(
+            select(models.ParseCacheEntry).where(
+                models.ParseCacheEntry.sha256 == sha256,
+                models.ParseCacheEntry.parser_version == self.parser_version,
+                models.ParseCacheEntry.embedding_strategy == self.embedding_strategy,
+            )
+        ).scalar_one_or_none()
+        if entry is None:
+            count("empire_parse_cache_total", "Parse cache lookups by result.", result="miss")
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = datetime.utcnow()
+        count("empire_parse_cache_total", "Parse cache lookups by result.", result="hit")
+        return ParsedPurchase.parse_obj(entry.parsed), entry.confidence, list(entry.vector)
+
+    def store(
+        self,
+        sha256: str,
+        parsed: ParsedPurchase,
+        confidence: float,
+        vector: list[float],
+    ) -> None:
+        global _stores_since_eviction
+        entry = models.ParseCacheEntry(
+            sha256=sha256,
+            parser_version=self.parser_version,
+            embedding_strategy=self.embedding_strategy,
+            parsed=json.loads(parsed.json()),
+            confidence=confidence,
+            vector=vector,
+        )
+        try:
+            with self.session.begin_nested():
+                self.session.add(entry)
+        except IntegrityError:
+            # A concurrent ingest of the same document stored it first.
+            pass
+
+        _stores_since_eviction += 1
+        if _stores_since_eviction >= EVICTION_INTERVAL:
+            _stores_since_eviction = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop entries from stale versions, then least recently used ones."""
+        table = models.ParseCacheEntry
+        removed = self.session.execute(
+            delete(table).where(
+                or_(
+                    table.parser_version != self.parser_version,
+                    table.embedding_strategy != self.embedding_strategy,
+                )
+            )
+        ).rowcount or 0
+        total = self.session.execute(select(func.count()).select_from(table)).scalar_one()
+        excess = total - self.max_entries
+        if excess > 0:
+            oldest = (
+                select(table.id).order_by(table.last_used_at, table.id).limit(excess)
+            )
+            removed += self.session.execute(
+                delete(table).where(table.id.in_(oldest))
+            ).rowcount or 0
+        return removed
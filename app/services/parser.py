@@ -1,13 +1,19 @@
 """Simple heuristics-based parser for purchase orders."""
 from __future__ import annotations
 
+import csv
+import io
+import itertools
 import re
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 from pydantic import BaseModel, Field
 
 
+# Bump whenever parsing rules change so cached parse results are invalidated.
+PARSER_VERSION = "heuristic-v1"
+
 CURRENCY_SYMBOLS = {
     "$": "USD",
     "€": "EUR",
@@ -25,6 +31,27 @@ CURRENCY_CODES = {
 }
 
 
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d %b %Y", "%B %d, %Y")
+
+# Statement CSV headers (normalized to lowercase words) per ParsedPurchase field.
+STATEMENT_COLUMNS = {
+    "reference": ("invoice", "invoice no", "invoice number", "reference", "ref", "po", "po number", "number"),
+    "vendor_name": ("vendor", "vendor name", "supplier"),
+    "total_amount": ("amount", "total", "total amount", "amount due", "balance", "balance due"),
+    "currency": ("currency", "ccy"),
+    "due_date": ("due", "due date", "pay by", "payment due"),
+    "status": ("status", "payment status"),
+    "description": ("description", "details", "memo", "item"),
+}
+
+_STATEMENT_REFERENCE = re.compile(
+    r"^\s*(?P<ref>(?:invoice|inv|po|bill)[\s#:\-]*[\w\-/]*\d[\w\-/]*)", re.IGNORECASE
+)
+_STATEMENT_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4})\b")
+_STATEMENT_AMOUNT = re.compile(r"(?P<symbol>[\$€£¥])?\s?(?P<value>\(?-?\d[\d,]*(?:\.\d{1,2})?\)?)")
+_STATEMENT_STATUS = re.compile(r"\b(paid|settled|cleared|partial|overdue|late|past due|open|pending)\b", re.IGNORECASE)
+
+
 class ParsedPurchase(BaseModel):
     vendor_name: str
     total_amount: float
@@ -50,15 +77,7 @@ class PurchaseParser:
         reference = self._extract_value(lines, ["invoice", "reference", "po"], default=None)
         status = self._extract_value(lines, ["status", "payment status"], default=None)
 
-        payment_status = None
-        if status:
-            lowered = status.lower()
-            if any(keyword in lowered for keyword in ("paid", "settled", "cleared")):
-                payment_status = "paid"
-            elif any(keyword in lowered for keyword in ("partial", "deposit")):
-                payment_status = "partial"
-            elif any(keyword in lowered for keyword in ("overdue", "late", "past due")):
-                payment_status = "overdue"
+        payment_status = self._payment_status(status)
 
         total_amount = self._extract_amount(lines)
         currency = self._detect_currency(content) or "USD"
@@ -84,6 +103,156 @@ class PurchaseParser:
         confidence = self._calculate_confidence(parsed)
         return parsed, confidence
 
+    def iter_statement(self, content: str | Iterable[str]) -> Iterator[ParsedPurchase]:
+        """Yield one :class:`ParsedPurchase` per line item of a statement.
+
+        CSV statements need a header row naming at least an amount column
+        (see :data:`STATEMENT_COLUMNS`). Text statements list one invoice per
+        line (``INV-1001  2024-03-01  Widgets  $1,250.00  Overdue``), with
+        ``Vendor:`` / ``Currency:`` lines setting the context for the lines
+        that follow. Lines are consumed lazily, so large statements stream.
+        """
+        lines = iter(io.StringIO(content) if isinstance(content, str) else content)
+        for first in lines:
+            if first.strip():
+                break
+        else:
+            return
+        header = self._statement_header(first)
+        if header is not None:
+            delimiter, fields = header
+            reader = csv.reader((line for line in lines if line.strip()), delimiter=delimiter)
+            for cells in reader:
+                parsed = self._parse_statement_record(
+                    {field: cells[index].strip() for index, field in fields.items() if index < len(cells)}
+                )
+                if parsed:
+                    yield parsed
+            return
+
+        context = {"vendor_name": "Unknown Vendor", "currency": "USD"}
+        for line in itertools.chain([first], lines):
+            parsed = self._parse_statement_line(line.strip(), context)
+            if parsed:
+                yield parsed
+
+    def _statement_header(self, line: str) -> Optional[tuple[str, dict[int, str]]]:
+        delimiter = max(",;\t|", key=line.count)
+        if not line.count(delimiter):
+            return None
+        aliases = {alias: field for field, names in STATEMENT_COLUMNS.items() for alias in names}
+        fields: dict[int, str] = {}
+        for index, cell in enumerate(next(csv.reader([line], delimiter=delimiter))):
+            name = re.sub(r"[^a-z0-9]+", " ", cell.lower()).strip()
+            if name in aliases and aliases[name] not in fields.values():
+                fields[index] = aliases[name]
+        if "total_amount" not in fields.values() or len(fields) < 2:
+            return None
+        return delimiter, fields
+
+    def _parse_statement_record(self, record: dict[str, str]) -> Optional[ParsedPurchase]:
+        amount, symbol = self._parse_amount(record.get("total_amount", ""))
+        if amount is None:
+            return None
+        currency = record.get("currency") or ""
+        currency = (
+            CURRENCY_CODES.get(currency.lower(), currency.upper())
+            if currency
+            else CURRENCY_SYMBOLS.get(symbol or "", "USD")
+        )
+        status = record.get("status") or None
+        return ParsedPurchase(
+            vendor_name=record.get("vendor_name") or "Unknown Vendor",
+            total_amount=amount,
+            currency=currency,
+            due_date=self._parse_date(record.get("due_date", "")),
+            description=record.get("description") or None,
+            status=status,
+            payment_status=self._payment_status(status),
+            reference=record.get("reference") or None,
+        )
+
+    def _parse_statement_line(self, line: str, context: dict[str, str]) -> Optional[ParsedPurchase]:
+        lowered = line.lower()
+        for key, prefixes in (("vendor_name", ("vendor", "supplier")), ("currency", ("currency",))):
+            if any(lowered.startswith(prefix) for prefix in prefixes) and ":" in line:
+                value = line.split(":", 1)[1].strip()
+                if key == "currency":
+                    value = CURRENCY_CODES.get(value.lower(), value.upper())
+                context[key] = value or context[key]
+                return None
+
+        reference = _STATEMENT_REFERENCE.match(line)
+        if not reference:
+            return None
+        rest = line[reference.end():]
+        date_match = _STATEMENT_DATE.search(rest)
+        if date_match:
+            rest = rest[:date_match.start()] + " " + rest[date_match.end():]
+        amounts = list(_STATEMENT_AMOUNT.finditer(rest))
+        if not amounts:
+            return None
+        # The amount is the last figure with a currency symbol, else the last
+        # with cents, else the last one: trailing terms ("net 30") are not it.
+        chosen = (
+            next((m for m in reversed(amounts) if m.group("symbol")), None)
+            or next((m for m in reversed(amounts) if "." in m.group("value")), None)
+            or amounts[-1]
+        )
+        amount, symbol = self._parse_amount(chosen.group(0))
+        if amount is None:
+            return None
+        rest = rest[:chosen.start()] + " " + rest[chosen.end():]
+        status_match = _STATEMENT_STATUS.search(rest)
+        status = status_match.group(1) if status_match else None
+        if status_match:
+            rest = rest[:status_match.start()] + " " + rest[status_match.end():]
+        description = " ".join(rest.split()) or None
+        return ParsedPurchase(
+            vendor_name=context["vendor_name"],
+            total_amount=amount,
+            currency=CURRENCY_SYMBOLS.get(symbol or "", context["currency"]),
+            due_date=self._parse_date(date_match.group(1)) if date_match else None,
+            description=description,
+            status=status,
+            payment_status=self._payment_status(status),
+            reference=reference.group("ref").strip(),
+        )
+
+    def _parse_amount(self, raw: str) -> tuple[Optional[float], Optional[str]]:
+        raw = raw.strip()
+        symbol = next((s for s in CURRENCY_SYMBOLS if s in raw), None)
+        value = re.sub(r"[^\d.\-()]", "", raw)
+        negative = value.startswith("(") and value.endswith(")")
+        try:
+            amount = float(value.strip("()"))
+        except ValueError:
+            return None, symbol
+        return (-amount if negative else amount), symbol
+
+    def _payment_status(self, status: Optional[str]) -> Optional[str]:
+        if not status:
+            return None
+        lowered = status.lower()
+        if any(keyword in lowered for keyword in ("paid", "settled", "cleared")):
+            return "paid"
+        if any(keyword in lowered for keyword in ("partial", "deposit")):
+            return "partial"
+        if any(keyword in lowered for keyword in ("overdue", "late", "past due")):
+            return "overdue"
+        return None
+
+    def _parse_date(self, value: str) -> Optional[datetime]:
+        value = value.strip()
+        if not value:
+            return None
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+
     def _extract_value(self, lines: list[str], prefixes: list[str], default: Optional[str]) -> Optional[str]:
         for line in lines:
             lowered = line.lower()
@@ -137,14 +306,7 @@ class PurchaseParser:
 
     def _extract_due_date(self, lines: list[str]) -> Optional[datetime]:
         due_date_str = self._extract_value(lines, ["due", "due date", "pay by", "payment due"], default="")
-        if not due_date_str:
-            return None
-        for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%d %b %Y", "%B %d, %Y"):
-            try:
-                return datetime.strptime(due_date_str, fmt)
-            except ValueError:
-                continue
-        return None
+        return self._parse_date(due_date_str or "")
 
     def _extract_block(self, lines: list[str], prefixes: list[str]) -> Optional[str]:
         for index, line in enumerate(lines):
@@ -0,0 +1,637 @@
+"""Declarative rules for the finance agent.
+
+Rules are plain data: a suggestion type, a list of conditions over purchase
+order facts, named parameters the conditions refer to, a message template and
+optional per-LLC parameter overrides::
+
+    {
+        "id": "create-repayment-plan",
+        "when": [{"fact": "amount_base", "op": ">=", "param": "min_amount"}],
+        "params": {"min_amount": 10000},
+        "overrides": {"Orbital LLC": {"min_amount": 25000}, "Dormant LLC": {"enabled": false}},
+        "message": "Consider creating a repayment plan for this large purchase."
+    }
+
+Point ``EMPIRE_RULES_PATH`` at a JSON file holding a list of rules (or
+``{"rules": [...]}``) to replace the defaults; the file is re-read when it
+changes. Each rule compiles into a per-order evaluator whose conditions run
+cheapest first, so expensive facts (open orders for the vendor, claim links
+in the source document) are only computed for orders that got that far, and
+into a batch evaluator over columnar NumPy arrays for backtesting rules over
+the full purchase order history.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import operator
+import os
+import re
+import string
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import chunked
+from ..instrumentation import ENABLED, count, registry
+from .fx import load_rates
+
+logger = logging.getLogger(__name__)
+
+NOW = "now"
+
+DEFAULT_RULES: list[dict[str, Any]] = [
+    {
+        "id": "flag-overdue",
+        "when": [
+            {"fact": "due_date", "op": "<", "value": NOW},
+            {"fact": "status", "op": "!=", "value": "paid"},
+        ],
+        "message": "Payment appears overdue. Flag for follow-up.",
+    },
+    {
+        "id": "create-repayment-plan",
+        "when": [{"fact": "amount_base", "op": ">=", "param": "min_amount"}],
+        "params": {"min_amount": 10000},
+        "message": "Consider creating a repayment plan for this large purchase.",
+    },
+    {
+        "id": "review-unrated-currency",
+        "when": [{"fact": "fx_unrated", "op": "==", "value": True}],
+        "message": "No exchange rate for {currency}; review the amount by hand.",
+    },
+    {
+        "id": "reconcile-payment-status",
+        "when": [{"fact": "status_lower", "op": "in", "param": "statuses"}],
+        "params": {"statuses": ["overdue", "late", "past-due"]},
+        "message": "Invoice is marked overdue in the source packet. Confirm collections status.",
+    },
+    {
+        "id": "review-vendor-history",
+        "when": [{"fact": "vendor_open_orders", "op": ">=", "param": "min_open_orders"}],
+        "params": {"min_open_orders": 2},
+        "message": (
+            "{vendor_name} has {vendor_open_orders} other open orders. "
+            "Review payment cadence before approving new spend."
+        ),
+    },
+    {
+        "id": "review-related-claim",
+        "when": [{"fact": "claim_links", "op": "nonempty"}],
+        "message": (
+            "Source packet references an open claim ({first_claim_link}). "
+            "Verify status prior to approval."
+        ),
+    },
+]
+
+
+def _contains(value: Any, options: Any) -> bool:
+    return value in options
+
+
+def _not_contains(value: Any, options: Any) -> bool:
+    return value not in options
+
+
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": _contains,
+    "not_in": _not_contains,
+    "nonempty": lambda value, _: bool(value),
+}
+
+# Facts available on every order without extra queries, in rough cost order.
+CHEAP_FACTS = (
+    "id", "llc_id", "llc_name", "vendor_id", "vendor_name", "total_amount",
+    "amount_base", "fx_unrated", "currency", "status", "status_lower", "due_date", "description",
+)
+# Facts that cost a query or a file read; computed on first use.
+LAZY_FACTS = ("vendor_open_orders", "claim_links", "first_claim_link")
+FACTS = frozenset(CHEAP_FACTS + LAZY_FACTS)
+
+
+@dataclass(frozen=True)
+class Condition:
+    fact: str
+    op: str
+    value: Any = None
+
+
+@dataclass
+class Rule:
+    id: str
+    when: list[dict[str, Any]]
+    message: str
+    params: dict[str, Any] = field(default_factory=dict)
+    overrides: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Rule":
+        try:
+            rule = cls(
+                id=data["id"],
+                when=list(data.get("when", [])),
+                message=data["message"],
+                params=dict(data.get("params", {})),
+                overrides={str(k): dict(v) for k, v in data.get("overrides", {}).items()},
+            )
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise ValueError(f"Invalid rule definition {data!r}: {exc}") from exc
+        rule.conditions(rule.params)
+        try:
+            unknown = sorted(set(_template_facts(rule.message)) - FACTS)
+        except ValueError as exc:
+            raise ValueError(f"Rule {rule.id!r} has an invalid message template: {exc}") from exc
+        if unknown:
+            raise ValueError(f"Rule {rule.id!r} message uses unknown facts {unknown}")
+        return rule
+
+    def params_for(self, llc_name: Optional[str]) -> Optional[dict[str, Any]]:
+        """Parameters for ``llc_name``, or ``None`` when the rule is disabled."""
+        params = {**self.params, **self.overrides.get(llc_name or "", {})}
+        if not params.pop("enabled", True):
+            return None
+        return params
+
+    def conditions(self, params: Mapping[str, Any]) -> tuple[Condition, ...]:
+        """Resolve parameters and order conditions cheapest first."""
+        resolved = []
+        for spec in self.when:
+            fact, op = spec.get("fact"), spec.get("op")
+            if fact not in FACTS:
+                raise ValueError(f"Rule {self.id!r} uses unknown fact {fact!r}")
+            if op not in OPERATORS:
+                raise ValueError(f"Rule {self.id!r} uses unknown operator {op!r}")
+            if "param" in spec:
+                if spec["param"] not in params:
+                    raise ValueError(f"Rule {self.id!r} has no parameter {spec['param']!r}")
+                value = params[spec["param"]]
+            else:
+                value = spec.get("value")
+            resolved.append(Condition(fact, op, value))
+        return tuple(sorted(resolved, key=lambda c: c.fact in LAZY_FACTS))
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """A rule with one LLC's parameters bound, evaluated against one order."""
+
+    id: str
+    conditions: tuple[Condition, ...]
+    message: str
+
+    def matches(self, facts: Mapping[str, Any]) -> bool:
+        now = None
+        for condition in self.conditions:
+            actual = facts[condition.fact]
+            expected = condition.value
+            if expected == NOW:
+                now = now or datetime.utcnow()
+                expected = now
+            if actual is None and condition.op not in ("==", "!=", "nonempty"):
+                return False
+            if not OPERATORS[condition.op](actual, expected):
+                return False
+        return True
+
+    def render(self, facts: Mapping[str, Any]) -> str:
+        return self.message.format_map(facts)
+
+
+class OrderFacts(dict):
+    """Facts about one purchase order; expensive ones are computed on access."""
+
+    def __init__(self, session: Session, purchase_order: models.PurchaseOrder) -> None:
+        status = purchase_order.status
+        amount_base = order_amount_base(purchase_order)
+        super().__init__(
+            id=purchase_order.id,
+            llc_id=purchase_order.llc_id,
+            llc_name=purchase_order.llc.name if purchase_order.llc else None,
+            vendor_id=purchase_order.vendor_id,
+            vendor_name=purchase_order.vendor.name if purchase_order.vendor else None,
+            total_amount=purchase_order.total_amount,
+            amount_base=amount_base,
+            fx_unrated=amount_base is None,
+            currency=purchase_order.currency,
+            status=status,
+            status_lower=(status or "").lower(),
+            due_date=purchase_order.due_date,
+            description=purchase_order.description,
+        )
+        self.session = session
+        self.purchase_order = purchase_order
+
+    def __missing__(self, key: str) -> Any:
+        if key == "vendor_open_orders":
+            value = open_orders_for_vendor(self.session, self.purchase_order)
+        elif key == "claim_links":
+            value = claim_links_from_media(self.purchase_order.media_object)
+        elif key == "first_claim_link":
+            links = self["claim_links"]
+            value = links[0] if links else None
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+
+def order_amount_base(purchase_order: models.PurchaseOrder) -> Optional[float]:
+    """The order's base-currency amount for rules.
+
+    Orders stored without one are converted now. When no rate is known this
+    is ``None``: amount rules skip the order (it is never valued as if it were
+    already in base currency) and ``fx_unrated`` flags it for review instead.
+    """
+    if purchase_order.amount_base is not None:
+        return purchase_order.amount_base
+    converted = load_rates().convert(
+        purchase_order.total_amount, purchase_order.currency, purchase_order.created_at
+    )
+    return converted
+
+
+def open_orders_for_vendor(session: Session, purchase_order: models.PurchaseOrder) -> int:
+    return (
+        session.query(models.PurchaseOrder)
+        .filter(
+            models.PurchaseOrder.vendor_id == purchase_order.vendor_id,
+            models.PurchaseOrder.id != purchase_order.id,
+            models.PurchaseOrder.status != "paid",
+        )
+        .count()
+    )
+
+
+def _claim_links(storage_path: Optional[str]) -> list[str]:
+    if not storage_path:
+        return []
+    path = Path(storage_path)
+    if not path.exists():
+        return []
+    try:
+        content = path.read_text(errors="ignore")
+    except OSError:
+        return []
+    return [
+        link
+        for link in re.findall(r"https?://\S+", content)
+        if re.search(r"claim|ticket|case", link, re.IGNORECASE)
+    ]
+
+
+def claim_links_from_media(media: models.MediaObject | None) -> list[str]:
+    return _claim_links(media.storage_path if media else None)
+
+
+class Columns:
+    """Columnar purchase order facts for batch evaluation.
+
+    Cheap facts are loaded up front as NumPy arrays; ``vendor_open_orders``
+    is derived from one grouped count, and claim links are read only for the
+    rows a rule still considers.
+    """
+
+    def __init__(self, session: Session, arrays: dict[str, Any], storage_paths: list) -> None:
+        self.session = session
+        self.arrays = arrays
+        self.storage_paths = storage_paths
+        # Keyed by path: every line item of a statement shares one document.
+        self._claims: dict[Optional[str], list[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.arrays["id"])
+
+    def get(self, fact: str, rows) -> Any:
+        import numpy as np
+
+        if fact not in self.arrays and fact == "vendor_open_orders":
+            self.arrays[fact] = self._vendor_open_orders()
+        if fact in self.arrays:
+            return self.arrays[fact][rows]
+        if fact in ("claim_links", "first_claim_link"):
+            values = np.empty(len(rows), dtype=object)
+            for position, row in enumerate(rows):
+                path = self.storage_paths[row]
+                links = self._claims.get(path)
+                if links is None:
+                    links = self._claims[path] = _claim_links(path)
+                values[position] = links if fact == "claim_links" else (links[0] if links else None)
+            return values
+        raise KeyError(fact)
+
+    def row(self, index: int, facts: Iterable[str] = FACTS) -> dict[str, Any]:
+        """``facts`` (all by default) for one row, for rendering messages."""
+        import numpy as np
+
+        values: dict[str, Any] = {}
+        rows = np.array([index])
+        for fact in facts:
+            value = self.get(fact, rows)[0]
+            values[fact] = value.item() if isinstance(value, np.generic) else value
+        return values
+
+    def _vendor_open_orders(self):
+        import numpy as np
+
+        vendor_ids = self.arrays["vendor_id"]
+        distinct = [int(v) for v in np.unique(vendor_ids)]
+        open_counts: dict[int, int] = {}
+        for chunk in chunked(distinct):
+            open_counts.update(
+                self.session.execute(
+                    select(models.PurchaseOrder.vendor_id, func.count())
+                    .where(
+                        models.PurchaseOrder.vendor_id.in_(chunk),
+                        models.PurchaseOrder.status != "paid",
+                    )
+                    .group_by(models.PurchaseOrder.vendor_id)
+                ).all()
+            )
+        totals = np.array([open_counts.get(int(v), 0) for v in vendor_ids], dtype=np.int64)
+        return totals - (self.arrays["status"] != "paid")
+
+
+def load_columns(
+    session: Session,
+    *,
+    llc_id: Optional[int] = None,
+    purchase_order_ids: Optional[Sequence[int]] = None,
+) -> Columns:
+    import numpy as np
+
+    stmt = (
+        select(
+            models.PurchaseOrder.id,
+            models.PurchaseOrder.llc_id,
+            models.LLC.name,
+            models.PurchaseOrder.vendor_id,
+            models.Vendor.name,
+            models.PurchaseOrder.total_amount,
+            models.PurchaseOrder.amount_base,
+            models.PurchaseOrder.currency,
+            models.PurchaseOrder.status,
+            models.PurchaseOrder.due_date,
+            models.PurchaseOrder.description,
+            models.PurchaseOrder.created_at,
+            models.MediaObject.storage_path,
+        )
+        .join(models.LLC, models.PurchaseOrder.llc_id == models.LLC.id)
+        .outerjoin(models.Vendor, models.PurchaseOrder.vendor_id == models.Vendor.id)
+        .outerjoin(models.MediaObject, models.PurchaseOrder.media_object_id == models.MediaObject.id)
+        .order_by(models.PurchaseOrder.id)
+    )
+    if llc_id is not None:
+        stmt = stmt.where(models.PurchaseOrder.llc_id == llc_id)
+    if purchase_order_ids is not None:
+        stmt = stmt.where(models.PurchaseOrder.id.in_(list(purchase_order_ids)))
+    rows = session.execute(stmt).all()
+    (ids, llc_ids, llc_names, vendor_ids, vendor_names, amounts, amounts_base, currencies,
+     statuses, due_dates, descriptions, created, paths) = (
+        (list(col) for col in zip(*rows)) if rows else [[]] * 13
+    )
+
+    def objects(values: list) -> Any:
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
+    amount_base = _amount_base(amounts, amounts_base, currencies, created)
+    arrays = {
+        "id": np.array(ids, dtype=np.int64),
+        "llc_id": np.array(llc_ids, dtype=np.int64),
+        "llc_name": objects(llc_names),
+        "vendor_id": np.array([v or 0 for v in vendor_ids], dtype=np.int64),
+        "vendor_name": objects(vendor_names),
+        "total_amount": np.array(amounts, dtype=float),
+        "amount_base": amount_base,
+        "fx_unrated": np.isnan(amount_base),
+        "currency": objects(currencies),
+        "status": objects(statuses),
+        "status_lower": objects([(s or "").lower() for s in statuses]),
+        "due_date": np.array(due_dates, dtype="datetime64[us]"),
+        "description": objects(descriptions),
+    }
+    return Columns(session, arrays, paths)
+
+
+def _amount_base(amounts: list, amounts_base: list, currencies: list, created: list):
+    """Stored base amounts, converting rows stored without one.
+
+    Like :func:`order_amount_base`, rows with no known rate stay NaN, which
+    compares false against every amount threshold.
+    """
+    import numpy as np
+
+    stored = np.array(amounts_base, dtype=float)
+    missing = np.isnan(stored)
+    if missing.any():
+        rows = np.flatnonzero(missing)
+        totals = np.array(amounts, dtype=float)[rows]
+        converted = load_rates().convert_many(
+            totals,
+            [currencies[i] for i in rows],
+            np.array(created, dtype="datetime64[us]")[rows],
+        )
+        stored[rows] = converted
+    return stored
+
+
+def _vector_op(op: str, values, expected):
+    import numpy as np
+
+    if op in ("in", "not_in"):
+        hit = np.fromiter((v in expected for v in values), dtype=bool, count=len(values))
+        return hit if op == "in" else ~hit
+    if op == "nonempty":
+        return np.fromiter((bool(v) for v in values), dtype=bool, count=len(values))
+    if values.dtype == object and op not in ("==", "!="):
+        return np.fromiter(
+            (v is not None and OPERATORS[op](v, expected) for v in values),
+            dtype=bool,
+            count=len(values),
+        )
+    return np.asarray(OPERATORS[op](values, expected), dtype=bool)
+
+
+@dataclass
+class BatchResult:
+    columns: Columns
+    hits: dict[str, Any]
+
+    def purchase_order_ids(self, rule_id: str) -> list[int]:
+        return [int(i) for i in self.columns.arrays["id"][self.hits[rule_id]]]
+
+
+def _template_facts(message: str) -> tuple[str, ...]:
+    """Facts a message template refers to (``{fact.attr}`` counts as ``fact``).
+
+    Positional fields come back as ``""`` or a digit string, which are never
+    facts. Raises ``ValueError`` for malformed templates.
+    """
+    return tuple(
+        re.split(r"[.\[]", name, maxsplit=1)[0]
+        for _, name, _, _ in string.Formatter().parse(message)
+        if name is not None
+    )
+
+
+class RuleSet:
+    """Compiled rules; ``observed`` rule sets record per-rule metrics.
+
+    Ad-hoc rule sets (backtests of posted rules) pass ``observed=False`` so
+    arbitrary rule ids never become metric labels.
+    """
+
+    def __init__(self, rules: Iterable[Rule], *, observed: bool = True) -> None:
+        self.rules = list(rules)
+        self.observed = observed
+        self._overridden = {name for rule in self.rules for name in rule.overrides}
+        self._compiled: dict[Optional[str], list[CompiledRule]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_data(cls, data: Any, *, observed: bool = True) -> "RuleSet":
+        if isinstance(data, Mapping):
+            data = data.get("rules", [])
+        if not isinstance(data, list):
+            raise ValueError("Rules must be a list or an object with a 'rules' list")
+        return cls((Rule.from_dict(item) for item in data), observed=observed)
+
+    def compiled_for(self, llc_name: Optional[str]) -> list[CompiledRule]:
+        if llc_name not in self._overridden:
+            llc_name = None
+        compiled = self._compiled.get(llc_name)
+        if compiled is None:
+            compiled = []
+            for rule in self.rules:
+                params = rule.params_for(llc_name)
+                if params is not None:
+                    compiled.append(CompiledRule(rule.id, rule.conditions(params), rule.message))
+            with self._lock:
+                self._compiled[llc_name] = compiled
+        return compiled
+
+    def evaluate(
+        self,
+        facts: Mapping[str, Any],
+        *,
+        skip: Iterable[str] = (),
+    ) -> Iterator[tuple[str, str]]:
+        """Yield ``(rule id, rendered message)`` for each rule ``facts`` match."""
+        skipped = set(skip)
+        for rule in self.compiled_for(facts.get("llc_name")):
+            if rule.id in skipped:
+                continue
+            started = time.perf_counter()
+            hit = rule.matches(facts)
+            if self.observed:
+                _observe(rule.id, "order", started, int(hit))
+            if hit:
+                yield rule.id, rule.render(facts)
+
+    def evaluate_batch(self, columns: Columns) -> BatchResult:
+        """Evaluate every rule over all rows; returns a boolean mask per rule."""
+        import numpy as np
+
+        llc_names = columns.arrays["llc_name"]
+        now = np.datetime64(datetime.utcnow(), "us")
+        hits: dict[str, Any] = {}
+        for rule in self.rules:
+            started = time.perf_counter()
+            mask = np.zeros(len(columns), dtype=bool)
+            overridden = [name for name in rule.overrides if name]
+            is_overridden = np.fromiter(
+                (name in rule.overrides for name in llc_names), dtype=bool, count=len(llc_names)
+            )
+            variants: list[tuple[Any, Optional[str]]] = [(np.flatnonzero(~is_overridden), None)]
+            variants += [(np.flatnonzero(llc_names == name), name) for name in overridden]
+            for rows, llc_name in variants:
+                params = rule.params_for(llc_name)
+                if params is None or not len(rows):
+                    continue
+                for condition in rule.conditions(params):
+                    expected = now if condition.value == NOW else condition.value
+                    rows = rows[_vector_op(condition.op, columns.get(condition.fact, rows), expected)]
+                    if not len(rows):
+                        break
+                mask[rows] = True
+            hits[rule.id] = mask
+            if self.observed:
+                _observe(rule.id, "batch", started, int(mask.sum()))
+        return BatchResult(columns=columns, hits=hits)
+
+    def batch_suggestions(self, result: BatchResult) -> Iterator[tuple[int, str, str]]:
+        """Yield ``(row index, rule id, rendered message)`` for every hit."""
+        import numpy as np
+
+        for rule in self.rules:
+            template_facts = _template_facts(rule.message)
+            for index in np.flatnonzero(result.hits[rule.id]).tolist():
+                facts = result.columns.row(index, template_facts)
+                yield index, rule.id, rule.message.format_map(facts)
+
+
+def _observe(rule_id: str, mode: str, started: float, hits: int) -> None:
+    if not ENABLED:
+        return
+    registry.histogram(
+        "empire_rule_duration_seconds",
+        "Time spent evaluating agent rules.",
+        rule=rule_id,
+        mode=mode,
+    ).observe(time.perf_counter() - started)
+    if hits:
+        count("empire_rule_hits_total", "Agent rule matches.", hits, rule=rule_id, mode=mode)
+
+
+_default_rules: Optional[RuleSet] = None
+# Path -> (modification time last seen, rules in effect for it).
+_loaded: dict[str, tuple[Optional[int], RuleSet]] = {}
+
+
+def _defaults() -> RuleSet:
+    global _default_rules
+    if _default_rules is None:
+        _default_rules = RuleSet.from_data(DEFAULT_RULES)
+    return _default_rules
+
+
+def load_rules(path: Optional[str | Path] = None) -> RuleSet:
+    """Rules from ``path`` or ``EMPIRE_RULES_PATH``, else the defaults.
+
+    Files are cached by modification time, so edits apply without restarts.
+    A file that cannot be read or parsed is logged once per modification and
+    the last good rules for that path (the defaults if there are none) stay
+    in effect.
+    """
+    path = path or os.getenv("EMPIRE_RULES_PATH")
+    if not path:
+        return _defaults()
+    key = str(path)
+    cached = _loaded.get(key)
+    mtime: Optional[int] = None
+    try:
+        mtime = Path(path).stat().st_mtime_ns
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        rules = RuleSet.from_data(json.loads(Path(path).read_text()))
+    except (OSError, ValueError) as exc:
+        if cached is None or cached[0] != mtime:
+            logger.error("Keeping previous agent rules; cannot load %s: %s", path, exc)
+        rules = cached[1] if cached is not None else _defaults()
+    _loaded[key] = (mtime, rules)
+    return rules
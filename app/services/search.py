@@ -0,0 +1,130 @@
+"""Document search over the inverted term index and stored embeddings."""
+from __future__ import annotations
+
+import heapq
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import chunked
+from ..instrumentation import span
+from .embeddings import active_strategy
+from .vectorizer import _tokenize
+
+SEARCH_MODES = ("hybrid", "vector")
+DEFAULT_LIMIT = 20
+
+
+def index_terms(
+    session: Session,
+    media_object_id: int,
+    text: str,
+    *,
+    llc_id: Optional[int] = None,
+) -> int:
+    """Write postings for every distinct token in ``text``; returns the count."""
+    frequencies = Counter(_tokenize(text))
+    if not frequencies:
+        return 0
+    session.execute(
+        insert(models.DocumentTerm),
+        [
+            {
+                "media_object_id": media_object_id,
+                "llc_id": llc_id,
+                "term": term,
+                "term_frequency": tf,
+            }
+            for term, tf in frequencies.items()
+        ],
+    )
+    return len(frequencies)
+
+
+def _candidates(session: Session, terms: set[str], llc_id: Optional[int]) -> dict[int, int]:
+    """Map media ids containing any of ``terms`` to how many terms they match."""
+    stmt = (
+        select(models.DocumentTerm.media_object_id, func.count())
+        .where(models.DocumentTerm.term.in_(terms))
+        .group_by(models.DocumentTerm.media_object_id)
+    )
+    if llc_id is not None:
+        stmt = stmt.where(models.DocumentTerm.llc_id == llc_id)
+    rows = session.execute(stmt)
+    return {media_id: matched for media_id, matched in rows}
+
+
+def search_documents(
+    session: Session,
+    query: str,
+    *,
+    mode: str = "hybrid",
+    limit: Optional[int] = DEFAULT_LIMIT,
+    llc_id: Optional[int] = None,
+    strategy: Optional[str] = None,
+) -> list[tuple[models.MediaObject, float]]:
+    """Rank documents for ``query`` by embedding similarity.
+
+    Only embeddings of ``strategy`` (default: the active one) are considered. ``hybrid`` only
+    scores documents sharing at least one token with the query (ties broken
+    by the number of matched tokens); ``vector`` scores every stored
+    embedding. ``llc_id`` restricts both to that LLC's postings and vectors.
+    """
+    from .vectorizer import cosine_similarity, embed_text
+
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}")
+
+    strategy = strategy or active_strategy(session)
+    with span("search.embed_query"):
+        query_vector = embed_text(query, strategy)
+
+    scored: list[tuple[float, int, int]] = []
+    if mode == "hybrid":
+        terms = set(_tokenize(query))
+        if not terms:
+            return []
+        with span("search.candidates"):
+            matches = _candidates(session, terms, llc_id)
+        with span("search.score"):
+            for chunk in chunked(list(matches)):
+                rows = session.execute(
+                    select(models.DocumentVector.media_object_id, models.DocumentVector.vector)
+                    .where(
+                        models.DocumentVector.embedding_strategy == strategy,
+                        models.DocumentVector.media_object_id.in_(chunk),
+                    )
+                )
+                for media_id, vector in rows:
+                    score = cosine_similarity(vector, query_vector)
+                    if score > 0:
+                        scored.append((score, matches[media_id], media_id))
+    else:
+        with span("search.score"):
+            stmt = select(
+                models.DocumentVector.media_object_id, models.DocumentVector.vector
+            ).where(models.DocumentVector.embedding_strategy == strategy)
+            if llc_id is not None:
+                stmt = stmt.where(models.DocumentVector.llc_id == llc_id)
+            rows = session.execute(stmt)
+            for media_id, vector in rows:
+                score = cosine_similarity(vector, query_vector)
+                if score > 0:
+                    scored.append((score, 0, media_id))
+
+    with span("search.rank"):
+        if limit:
+            top = heapq.nlargest(limit, scored)
+        else:
+            top = sorted(scored, reverse=True)
+        media_by_id = {
+            media.id: media
+            for chunk in chunked([media_id for _, _, media_id in top])
+            for media in session.scalars(
+                select(models.MediaObject).where(models.MediaObject.id.in_(chunk))
+            )
+        }
+    return [(media_by_id[media_id], score) for score, _, media_id in top]
@@ -0,0 +1,128 @@
+"""Review-queue queries over agent suggestions.
+
+Pages are keyset paginated: the cursor carries the sort key, id and LLC of
+the last row served, and resumes with a ``(sort key, id)`` row-value bound
+that SQLite seeks to in the queue indexes. Queries filtered on ``approved``
+(with or without ``llc_id``) are served in index order for both sort orders,
+so deep pages cost the same as the first one. Without an ``approved`` filter
+the matching rows are sorted instead; the review UI always pages one side.
+Ids are only unique within a shard, so pages merged from several shards
+break ties on ``(id, llc_id)``; rows from different shards never share an
+LLC.
+
+``priority`` is snapshotted when a suggestion is created (see
+:func:`app.services.agent.suggestion_priority`): overdue orders do not climb
+the priority queue as they age further, they keep the weight they had then.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import Select, case, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from .. import models, serializers
+
+QUEUE_ORDERS = ("recent", "priority")
+
+
+def _sort_column(order: str):
+    if order == "priority":
+        return models.AgentSuggestion.priority
+    return models.AgentSuggestion.created_at
+
+
+def sort_key(order: str, row: Sequence[Any]) -> tuple[Any, int, int]:
+    """Sort key of a :data:`serializers.SUGGESTION_COLUMNS` row."""
+    return (row[10] if order == "priority" else row[5]), row[0], row[8] or 0
+
+
+def encode_cursor(order: str, row: Sequence[Any]) -> str:
+    value, row_id, llc_id = sort_key(order, row)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([order, value, row_id, llc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(order: str, cursor: str) -> tuple[Any, int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order, value, row_id, llc_id = json.loads(raw)
+        if cursor_order != order or not isinstance(row_id, int) or not isinstance(llc_id, int):
+            raise ValueError
+        if order == "recent":
+            value = datetime.fromisoformat(value)
+        else:
+            value = float(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor for order {order!r}") from None
+    return value, row_id, llc_id
+
+
+def queue_filters(
+    *,
+    approved: Optional[bool] = None,
+    suggestion_type: Optional[str] = None,
+    purchase_order_id: Optional[int] = None,
+    vendor_id: Optional[int] = None,
+    llc_id: Optional[int] = None,
+) -> list:
+    table = models.AgentSuggestion
+    filters = []
+    if approved is not None:
+        filters.append(table.approved == approved)
+    if suggestion_type:
+        filters.append(table.suggestion_type == suggestion_type)
+    if purchase_order_id is not None:
+        filters.append(table.purchase_order_id == purchase_order_id)
+    if vendor_id is not None:
+        filters.append(table.vendor_id == vendor_id)
+    if llc_id is not None:
+        filters.append(table.llc_id == llc_id)
+    return filters
+
+
+def select_queue(
+    filters: Sequence[Any],
+    *,
+    order: str = "recent",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = 50,
+) -> Select:
+    """Rows for one queue page, newest (or highest priority) first."""
+    if order not in QUEUE_ORDERS:
+        raise ValueError(f"Unknown order {order!r}; expected one of {', '.join(QUEUE_ORDERS)}")
+    column = _sort_column(order)
+    table = models.AgentSuggestion
+    stmt = serializers.select_suggestions().where(*filters)
+    if cursor:
+        value, row_id, llc_id = decode_cursor(order, cursor)
+        key = tuple_(column, table.id)
+        stmt = stmt.where(
+            key <= (value, row_id),
+            or_(key < (value, row_id), func.coalesce(table.llc_id, 0) < llc_id),
+        )
+    stmt = stmt.order_by(column.desc(), table.id.desc())
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def summarize(session: Session, filters: Sequence[Any]) -> list[tuple[str, int, int]]:
+    """``(suggestion_type, total, approved)`` for every type matching ``filters``."""
+    table = models.AgentSuggestion
+    rows = session.execute(
+        select(
+            table.suggestion_type,
+            func.count(),
+            func.sum(case((table.approved.is_(True), 1), else_=0)),
+        )
+        .where(*filters)
+        .group_by(table.suggestion_type)
+        .order_by(table.suggestion_type)
+    )
+    return [(suggestion_type, total, approved or 0) for suggestion_type, total, approved in rows]
@@ -1,13 +1,37 @@
-"""Lightweight deterministic embedding generator."""
+"""Lightweight deterministic embedding generator.
+
+NumPy is imported on first use so processes that never embed or score
+documents do not pay its import cost.
+"""
 from __future__ import annotations
 
 import hashlib
 import math
 from typing import Iterable, List
 
-import numpy as np
-
 VECTOR_DIM = 12
+VECTOR_DIM_V2 = 64
+EMBEDDING_STRATEGY = "hash-v1"
+EMBEDDING_STRATEGIES = ("hash-v1", "hash-v2")
+
+
+def strategy_dim(strategy: str) -> int:
+    if strategy == "hash-v1":
+        return VECTOR_DIM
+    if strategy == "hash-v2":
+        return VECTOR_DIM_V2
+    raise ValueError(f"Unknown embedding strategy {strategy!r}")
+
+
+def embedding_cache_key(strategy: str = EMBEDDING_STRATEGY) -> str:
+    """Identify the embedding configuration that produced a cached vector."""
+    return f"{strategy}:{strategy_dim(strategy)}"
+
+
+def _token_digest(token: str, strategy: str) -> bytes:
+    if strategy == "hash-v1":
+        return hashlib.sha256(token.encode("utf-8")).digest()
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=VECTOR_DIM_V2).digest()
 
 
 def _tokenize(text: str) -> Iterable[str]:
@@ -17,15 +41,22 @@ def _tokenize(text: str) -> Iterable[str]:
             yield cleaned
 
 
-def embed_text(text: str) -> List[float]:
-    """Create a deterministic embedding using hashing and sine transforms."""
+def embed_text(text: str, strategy: str = EMBEDDING_STRATEGY) -> List[float]:
+    """Create a deterministic embedding using hashing and sine transforms.
+
+    ``hash-v1`` uses the first ``VECTOR_DIM`` bytes of a SHA-256 token digest;
+    ``hash-v2`` uses a ``VECTOR_DIM_V2``-byte BLAKE2b digest.
+    """
+    dim = strategy_dim(strategy)
     if not text:
-        return [0.0] * VECTOR_DIM
+        return [0.0] * dim
 
-    vector = np.zeros(VECTOR_DIM, dtype=float)
+    import numpy as np
+
+    vector = np.zeros(dim, dtype=float)
     for token in _tokenize(text):
-        token_hash = hashlib.sha256(token.encode("utf-8")).digest()
-        for i in range(VECTOR_DIM):
+        token_hash = _token_digest(token, strategy)
+        for i in range(dim):
             raw = token_hash[i] / 255.0
             vector[i] += math.sin(raw * math.pi)
 
@@ -36,6 +67,8 @@ def embed_text(text: str) -> List[float]:
 
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
+    import numpy as np
+
     vec_a = np.array(a)
     vec_b = np.array(b)
     denom = np.linalg.norm(vec_a) * np.linalg.norm(vec_b)
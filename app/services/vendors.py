@@ -0,0 +1,240 @@
+"""Vendor resolution with normalized-name caching and fuzzy matching."""
+from __future__ import annotations
+
+import re
+import threading
+import weakref
+from typing import Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+from ..instrumentation import count
+
+DEFAULT_THRESHOLD = 0.8
+
+LEGAL_SUFFIXES = {
+    "co",
+    "company",
+    "corp",
+    "corporation",
+    "gmbh",
+    "inc",
+    "incorporated",
+    "limited",
+    "llc",
+    "llp",
+    "ltd",
+    "plc",
+}
+
+
+def normalize_vendor_name(name: str) -> str:
+    """Lowercase, strip punctuation and trailing legal-entity suffixes."""
+    tokens = re.sub(r"[^\w\s]", " ", name.lower()).split()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens.pop(0)
+    return " ".join(tokens)
+
+
+def trigrams(value: str) -> set[str]:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class VendorIndex:
+    """In-memory normalized-name map and trigram postings for one database."""
+
+    def __init__(self) -> None:
+        self.by_name: dict[str, int] = {}
+        self.canonical: dict[int, str] = {}
+        self.names: dict[int, Optional[str]] = {}
+        self.numbers: dict[int, frozenset[str]] = {}
+        self.grams: dict[int, set[str]] = {}
+        self.postings: dict[str, set[int]] = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self, session: Session) -> None:
+        self.by_name.clear()
+        self.canonical.clear()
+        self.names.clear()
+        self.numbers.clear()
+        self.grams.clear()
+        self.postings.clear()
+        rows = session.execute(
+            select(models.Vendor.id, models.Vendor.name, models.Vendor.normalized_name)
+        )
+        for vendor_id, name, normalized in rows:
+            self.add(vendor_id, normalized or normalize_vendor_name(name or ""), name)
+        self.loaded = True
+
+    def add(self, vendor_id: int, normalized: str, name: Optional[str] = None) -> None:
+        self.by_name.setdefault(normalized, vendor_id)
+        if vendor_id in self.grams:
+            return
+        grams = trigrams(normalized)
+        self.canonical[vendor_id] = normalized
+        self.names[vendor_id] = name
+        self.numbers[vendor_id] = numeric_tokens(normalized)
+        self.grams[vendor_id] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(vendor_id)
+
+    def discard(self, vendor_id: int) -> None:
+        self.canonical.pop(vendor_id, None)
+        self.names.pop(vendor_id, None)
+        self.numbers.pop(vendor_id, None)
+        for gram in self.grams.pop(vendor_id, ()):
+            self.postings.get(gram, set()).discard(vendor_id)
+        for name in [name for name, known in self.by_name.items() if known == vendor_id]:
+            del self.by_name[name]
+
+    def best_match(self, normalized: str, threshold: float) -> Optional[int]:
+        """Return the vendor with the highest trigram Jaccard similarity.
+
+        Candidates must carry exactly the same numeric tokens, so "Warehouse
+        12" never absorbs "Warehouse 13" however close the spelling is.
+        """
+        grams = trigrams(normalized)
+        numbers = numeric_tokens(normalized)
+        shared: dict[int, int] = {}
+        for gram in grams:
+            for vendor_id in self.postings.get(gram, ()):
+                shared[vendor_id] = shared.get(vendor_id, 0) + 1
+        best_id, best_score = None, threshold
+        for vendor_id, overlap in shared.items():
+            if self.numbers[vendor_id] != numbers:
+                continue
+            score = overlap / (len(grams) + len(self.grams[vendor_id]) - overlap)
+            if score >= best_score:
+                best_id, best_score = vendor_id, score
+        return best_id
+
+    def match(self, normalized: str, threshold: float) -> tuple[Optional[int], str]:
+        vendor_id = self.by_name.get(normalized)
+        if vendor_id is not None:
+            return vendor_id, "exact"
+        return self.best_match(normalized, threshold), "fuzzy"
+
+
+def numeric_tokens(normalized: str) -> frozenset[str]:
+    return frozenset(token for token in normalized.split() if any(c.isdigit() for c in token))
+
+
+_indexes: "weakref.WeakKeyDictionary[Engine, VendorIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+# Vendors created by a session are only published to the shared index once
+# that session commits; until then they resolve through a per-session index.
+_PENDING = "vendor_index_pending"
+
+
+def _index_for(session: Session) -> VendorIndex:
+    engine = session.get_bind().engine
+    index = _indexes.get(engine)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(engine, VendorIndex())
+    if not index.loaded:
+        with index.lock:
+            if not index.loaded:
+                index.load(session)
+    return index
+
+
+def _pending_for(session: Session) -> tuple[VendorIndex, dict[int, models.Vendor]]:
+    pending = session.info.get(_PENDING)
+    if pending is None:
+        pending = session.info[_PENDING] = (_index_for(session), VendorIndex(), {})
+    return pending[1], pending[2]
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_created_vendors(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending is None:
+        return
+    shared, created, vendors = pending
+    with shared.lock:
+        for vendor_id, vendor in vendors.items():
+            shared.add(vendor_id, created.canonical[vendor_id], vendor.name)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_created_vendors(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+class VendorResolver:
+    """Map raw vendor names from parsed documents onto canonical vendors.
+
+    Exact normalized-name hits are served from a process-wide index per
+    engine, close spellings are matched through trigram postings, and new
+    vendors are inserted under a unique ``normalized_name`` constraint so
+    concurrent ingests of the same new vendor converge on one row. Index hits
+    do not query the database: the vendor is attached to the session as a
+    detached reference built from the cached id and name.
+    """
+
+    def __init__(self, session: Session, threshold: float = DEFAULT_THRESHOLD) -> None:
+        self.session = session
+        self.threshold = threshold
+        self.index = _index_for(session)
+
+    def resolve(self, name: str) -> models.Vendor:
+        normalized = normalize_vendor_name(name) or name.lower()
+        vendor = self._cached(normalized)
+        if vendor is not None:
+            return vendor
+        return self._create(name, normalized)
+
+    def _cached(self, normalized: str) -> Optional[models.Vendor]:
+        created, vendors = _pending_for(self.session)
+        vendor_id, result = created.match(normalized, self.threshold)
+        if vendor_id is not None:
+            count("empire_vendor_resolution_total", "Vendor resolutions by outcome.", result=result)
+            return vendors[vendor_id]
+
+        vendor_id, result = self.index.match(normalized, self.threshold)
+        if vendor_id is None:
+            return None
+        if result == "fuzzy":
+            with self.index.lock:
+                self.index.by_name.setdefault(normalized, vendor_id)
+        count("empire_vendor_resolution_total", "Vendor resolutions by outcome.", result=result)
+        return self._reference(vendor_id)
+
+    def _reference(self, vendor_id: int) -> models.Vendor:
+        vendor = models.Vendor(
+            id=vendor_id,
+            name=self.index.names.get(vendor_id),
+            normalized_name=self.index.canonical.get(vendor_id),
+        )
+        make_transient_to_detached(vendor)
+        return self.session.merge(vendor, load=False)
+
+    def _create(self, name: str, normalized: str) -> models.Vendor:
+        vendor = models.Vendor(name=name, normalized_name=normalized)
+        try:
+            with self.session.begin_nested():
+                self.session.add(vendor)
+        except IntegrityError:
+            existing = self.session.execute(
+                select(models.Vendor).where(models.Vendor.normalized_name == normalized)
+            ).scalar_one()
+            with self.index.lock:
+                self.index.add(existing.id, normalized, existing.name)
+            count("empire_vendor_resolution_total", "Vendor resolutions by outcome.", result="raced")
+            return existing
+        created, vendors = _pending_for(self.session)
+        created.add(vendor.id, normalized, name)
+        vendors[vendor.id] = vendor
+        count("empire_vendor_resolution_total", "Vendor resolutions by outcome.", result="created")
+        return vendor
@@ -0,0 +1,179 @@
+"""Per-LLC shard routing.
+
+LLCs listed as dedicated get their own SQLite file under ``shard_dir``; every
+other LLC stays in the primary database, which also remains the directory of
+LLC rows. A dedicated shard holds a replica of its LLC row with the same id,
+so ``llc_id`` filters work identically on every shard. Row ids other than LLC
+ids are shard-local: rows merged from several shards carry their ``llc_id``,
+and writes addressing rows by id should pass it back (or the ``llc`` name)
+so they reach the right shard.
+
+Configure with ``EMPIRE_DEDICATED_LLCS`` (comma separated LLC names) and
+``EMPIRE_SHARD_DIR`` (default ``shards``).
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, TypeVar
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+from .database import init_db
+
+T = TypeVar("T")
+
+
+@dataclass
+class ShardScope:
+    """Sessions a request reads from, plus the LLC it is filtered to (if any).
+
+    ``shards`` parallels ``sessions``: the LLC id of each dedicated shard, or
+    ``None`` for the primary database.
+    """
+
+    llc: Optional[models.LLC]
+    sessions: list[Session] = field(default_factory=list)
+    shards: list[Optional[int]] = field(default_factory=list)
+
+    @property
+    def llc_id(self) -> Optional[int]:
+        return self.llc.id if self.llc else None
+
+
+class UnknownLLC(LookupError):
+    pass
+
+
+class ShardRouter:
+    def __init__(
+        self,
+        shard_dir: Path | str = "shards",
+        dedicated: Iterable[str] = (),
+    ) -> None:
+        self.shard_dir = Path(shard_dir)
+        self.dedicated = frozenset(name for name in dedicated if name)
+        self._factories: dict[int, sessionmaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ShardRouter":
+        names = os.getenv("EMPIRE_DEDICATED_LLCS", "")
+        return cls(
+            shard_dir=os.getenv("EMPIRE_SHARD_DIR", "shards"),
+            dedicated=(name.strip() for name in names.split(",")),
+        )
+
+    def is_dedicated(self, llc: models.LLC) -> bool:
+        return llc.name in self.dedicated
+
+    def sessionmaker_for(self, llc_id: int) -> sessionmaker:
+        factory = self._factories.get(llc_id)
+        if factory is None:
+            with self._lock:
+                factory = self._factories.get(llc_id)
+                if factory is None:
+                    self.shard_dir.mkdir(parents=True, exist_ok=True)
+                    engine = create_engine(
+                        f"sqlite:///{self.shard_dir / f'llc_{llc_id}.db'}",
+                        connect_args={"check_same_thread": False},
+                    )
+                    init_db(engine)
+                    factory = sessionmaker(
+                        bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
+                    )
+                    self._factories[llc_id] = factory
+        return factory
+
+    @contextmanager
+    def session_for(self, primary: Session, llc: models.LLC) -> Iterator[Session]:
+        """Yield the session holding ``llc``'s data (``primary`` if not dedicated)."""
+        if not self.is_dedicated(llc):
+            yield primary
+            return
+        with self.sessionmaker_for(llc.id)() as session:
+            if session.get(models.LLC, llc.id) is None:
+                session.add(models.LLC(id=llc.id, name=llc.name, ein=llc.ein))
+                session.commit()
+            yield session
+
+    def local_llc(self, session: Session, llc: models.LLC) -> models.LLC:
+        """Return the copy of ``llc`` that belongs to ``session``."""
+        return session.get(models.LLC, llc.id) or llc
+
+    def shard_ids(self) -> list[int]:
+        """LLC ids of the dedicated shard databases present in ``shard_dir``."""
+        if not self.shard_dir.is_dir():
+            return []
+        ids = {
+            int(path.stem.removeprefix("llc_"))
+            for path in self.shard_dir.glob("llc_*.db")
+            if path.stem.removeprefix("llc_").isdigit()
+        }
+        return sorted(ids | set(self._factories))
+
+    @contextmanager
+    def scope(
+        self,
+        primary: Session,
+        llc_name: Optional[str] = None,
+        *,
+        llc_id: Optional[int] = None,
+    ) -> Iterator[ShardScope]:
+        """Resolve the sessions to read for an optional LLC filter.
+
+        With an ``llc_name`` or ``llc_id``, the scope is that LLC's shard;
+        without either it fans out over the primary database and every
+        dedicated shard.
+        """
+        if llc_name or llc_id is not None:
+            stmt = select(models.LLC)
+            if llc_name:
+                stmt = stmt.where(models.LLC.name == llc_name)
+            if llc_id is not None:
+                stmt = stmt.where(models.LLC.id == llc_id)
+            llc = primary.execute(stmt).scalar_one_or_none()
+            if llc is None:
+                raise UnknownLLC(llc_name or llc_id)
+            shard = llc.id if self.is_dedicated(llc) else None
+            with self.session_for(primary, llc) as session:
+                yield ShardScope(llc=llc, sessions=[session], shards=[shard])
+            return
+
+        shard_ids: Sequence[int] = []
+        if self.dedicated:
+            shard_ids = primary.scalars(
+                select(models.LLC.id).where(models.LLC.name.in_(self.dedicated))
+            ).all()
+        present = [
+            shard_id
+            for shard_id in shard_ids
+            if shard_id in self._factories or (self.shard_dir / f"llc_{shard_id}.db").exists()
+        ]
+        opened = [self.sessionmaker_for(shard_id)() for shard_id in present]
+        try:
+            yield ShardScope(llc=None, sessions=[primary, *opened], shards=[None, *present])
+        finally:
+            for session in opened:
+                session.close()
+
+
+def merge_sorted(
+    results: Sequence[Iterable[T]],
+    key: Callable[[T], Any],
+    *,
+    limit: Optional[int] = None,
+) -> list[T]:
+    """Merge per-shard results that are each sorted descending by ``key``."""
+    if len(results) == 1:
+        merged: Iterable[T] = results[0]
+    else:
+        merged = heapq.merge(*results, key=key, reverse=True)
+    return list(islice(merged, limit) if limit else merged)
@@ -0,0 +1 @@
+"""Benchmark suite for Empire OS ingest, parse, embed and search hot paths."""
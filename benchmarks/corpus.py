@@ -0,0 +1,73 @@
+"""Synthetic invoice corpus generator."""
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+from typing import Iterator
+
+VENDORS = [
+    "Stellar Supplies",
+    "Nova Parts",
+    "Orbital Freight",
+    "Helios Fabrication",
+    "Quasar Logistics",
+    "Zenith Office Goods",
+    "Atlas Machining",
+    "Comet Courier",
+]
+
+ITEMS = [
+    "Satellite Antenna",
+    "Server Rack",
+    "Forklift Rental",
+    "Solar Panel Array",
+    "Packing Materials",
+    "Consulting Retainer",
+    "Hydraulic Pump",
+    "Office Chairs",
+]
+
+CURRENCIES = [("$", "USD"), ("€", "EUR"), ("£", "GBP"), ("", "CAD")]
+
+STATUSES = ["Pending", "Paid", "Partial deposit", "Overdue", "Net 30"]
+
+FILLER = (
+    "Line item reconciled against receiving log.",
+    "Freight included per master services agreement.",
+    "Warranty coverage applies for twelve months from delivery.",
+    "Please reference the invoice number on remittance.",
+)
+
+
+def generate_invoice(rng: random.Random, index: int, *, size: str | None = None) -> str:
+    """Return one invoice document with randomized fields and body length."""
+    vendor = rng.choice(VENDORS)
+    item = rng.choice(ITEMS)
+    symbol, code = rng.choice(CURRENCIES)
+    amount = round(rng.lognormvariate(7.5, 1.4), 2)
+    due = date(2023, 1, 1) + timedelta(days=rng.randrange(0, 1200))
+    size = size or rng.choice(["small", "small", "medium", "large"])
+
+    lines = [
+        f"Vendor: {vendor}",
+        f"Invoice: INV-{index:07d}",
+        f"Item: {item}",
+        f"Total: {symbol}{amount:,.2f}",
+        f"Due: {due.isoformat()}",
+        f"Status: {rng.choice(STATUSES)}",
+    ]
+    if not symbol:
+        lines.append(f"Currency: {code}")
+    if rng.random() < 0.15:
+        lines.append(f"See https://support.example.com/claims/{rng.randrange(10_000)}")
+    lines.append(f"Description: {item} for site {rng.randrange(1, 40)}")
+
+    filler_lines = {"small": 0, "medium": 20, "large": 200}[size]
+    lines.extend(rng.choice(FILLER) for _ in range(filler_lines))
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(count: int, *, seed: int = 1234) -> Iterator[str]:
+    rng = random.Random(seed)
+    for index in range(count):
+        yield generate_invoice(rng, index)
@@ -0,0 +1,103 @@
+"""Timing harness, result format and baseline comparison."""
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+RESULTS_VERSION = 1
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    iterations: int
+    mean_s: float
+    p50_s: float
+    p95_s: float
+    ops_per_s: float
+
+
+def measure(name: str, calls: Iterable[Callable[[], Any]]) -> BenchmarkResult:
+    """Time each call individually and summarise the distribution."""
+    samples: list[float] = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    if not samples:
+        raise ValueError(f"benchmark {name!r} produced no samples")
+    ordered = sorted(samples)
+    total = sum(samples)
+    return BenchmarkResult(
+        name=name,
+        iterations=len(samples),
+        mean_s=total / len(samples),
+        p50_s=statistics.median(ordered),
+        p95_s=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        ops_per_s=len(samples) / total if total else float("inf"),
+    )
+
+
+def results_document(results: Iterable[BenchmarkResult], **meta: Any) -> dict[str, Any]:
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            **meta,
+        },
+        "benchmarks": {result.name: asdict(result) for result in results},
+    }
+
+
+def write_results(document: dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+
+
+def load_results(path: Path) -> Optional[dict[str, Any]]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline_mean_s: float
+    current_mean_s: float
+    ratio: float
+    regressed: bool
+
+
+def compare(
+    current: dict[str, Any],
+    baseline: dict[str, Any],
+    *,
+    tolerance: float = 0.2,
+) -> list[Comparison]:
+    """Compare mean latencies; a benchmark regresses when it is slower than
+    the baseline by more than ``tolerance`` (0.2 means 20%)."""
+    comparisons: list[Comparison] = []
+    for name, result in sorted(current["benchmarks"].items()):
+        reference = baseline.get("benchmarks", {}).get(name)
+        if not reference or not reference["mean_s"]:
+            continue
+        ratio = result["mean_s"] / reference["mean_s"]
+        comparisons.append(
+            Comparison(
+                name=name,
+                baseline_mean_s=reference["mean_s"],
+                current_mean_s=result["mean_s"],
+                ratio=ratio,
+                regressed=ratio > 1 + tolerance,
+            )
+        )
+    return comparisons
@@ -0,0 +1,76 @@
+"""Run the benchmark suite and compare against a stored baseline.
+
+Usage::
+
+    python -m benchmarks.run --output bench_results.json
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --search-docs 1000000 --tolerance 0.1
+
+Exits with status 1 when any benchmark regresses past the tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .harness import compare, load_results, results_document, write_results
+from .scenarios import run_all
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--micro-docs", type=int, default=500)
+    parser.add_argument("--search-docs", type=int, default=2_000)
+    parser.add_argument("--api-docs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run_all(
+        micro_docs=args.micro_docs,
+        search_docs=args.search_docs,
+        api_docs=args.api_docs,
+        seed=args.seed,
+    )
+    document = results_document(
+        results,
+        micro_docs=args.micro_docs,
+        search_docs=args.search_docs,
+        api_docs=args.api_docs,
+        seed=args.seed,
+    )
+    for result in results:
+        print(
+            f"{result.name:<24} {result.iterations:>7} iters  "
+            f"mean {result.mean_s * 1000:9.3f} ms  p95 {result.p95_s * 1000:9.3f} ms  "
+            f"{result.ops_per_s:10.1f} ops/s"
+        )
+    if args.output:
+        write_results(document, args.output)
+    if args.save_baseline:
+        write_results(document, args.baseline)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; skipping comparison")
+        return 0
+
+    regressed = False
+    for item in compare(document, baseline, tolerance=args.tolerance):
+        marker = "REGRESSED" if item.regressed else "ok"
+        print(f"{item.name:<24} {item.ratio:6.2f}x baseline  {marker}")
+        regressed = regressed or item.regressed
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
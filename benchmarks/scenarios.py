@@ -0,0 +1,189 @@
+"""Micro and end-to-end benchmark scenarios."""
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.database import Base
+
+from .corpus import generate_corpus
+from .harness import BenchmarkResult, measure
+
+SEARCH_QUERIES = ["satellite antenna", "overdue freight", "Stellar Supplies", "hydraulic pump"]
+# Synthetic rates used by the test suite; only used when no feed is configured.
+FX_RATES_FIXTURE = Path(__file__).resolve().parent.parent / "tests" / "data" / "fx_rates.csv"
+
+
+def bench_parse(docs: list[str]) -> BenchmarkResult:
+    from app.services.parser import PurchaseParser
+
+    parser = PurchaseParser()
+    return measure("parse_text", (lambda doc=doc: parser.parse_text(doc) for doc in docs))
+
+
+def bench_embed(docs: list[str]) -> BenchmarkResult:
+    from app.services.vectorizer import embed_text
+
+    return measure("embed_text", (lambda doc=doc: embed_text(doc) for doc in docs))
+
+
+@contextmanager
+def seeded_session(docs: list[str], workdir: Path, *, batch_size: int = 5_000) -> Iterator[Session]:
+    """Yield a session on a scratch database holding one vector per document.
+
+    Rows are bulk inserted so large corpora can be seeded without going
+    through the ingest API.
+    """
+    from app.services.search import index_terms
+    from app.services.vectorizer import embed_text
+
+    engine = create_engine(f"sqlite:///{workdir / 'search.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    with factory() as session:
+        llc = models.LLC(name="Benchmark LLC")
+        session.add(llc)
+        session.flush()
+        for start in range(0, len(docs), batch_size):
+            chunk = docs[start:start + batch_size]
+            media_ids = session.scalars(
+                insert(models.MediaObject).returning(models.MediaObject.id),
+                [
+                    {"llc_id": llc.id, "media_type": "document", "mime": "text/plain"}
+                    for _ in chunk
+                ],
+            ).all()
+            session.execute(
+                insert(models.DocumentVector),
+                [
+                    {"media_object_id": media_id, "llc_id": llc.id, "vector": embed_text(doc)}
+                    for media_id, doc in zip(media_ids, chunk)
+                ],
+            )
+            for media_id, doc in zip(media_ids, chunk):
+                index_terms(session, media_id, doc, llc_id=llc.id)
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def bench_search(session: Session, *, mode: str = "hybrid", repeat: int = 5) -> BenchmarkResult:
+    from app.services.search import search_documents
+
+    calls = [
+        (lambda query=query: search_documents(session, query, mode=mode))
+        for _ in range(repeat)
+        for query in SEARCH_QUERIES
+    ]
+    name = "search_documents" if mode == "hybrid" else f"search_documents_{mode}"
+    return measure(name, calls)
+
+
+@contextmanager
+def api_client(workdir: Path):
+    """TestClient wired to a scratch database, mirroring ``tests/conftest.py``."""
+    from fastapi.testclient import TestClient
+
+    import app.database as database
+    from app.admission import DEFAULT_POLICIES, AdmissionPolicy
+    from app.database import get_db
+    from app.main import create_app
+    from app.services import ingest as ingest_module
+
+    engine = create_engine(
+        f"sqlite:///{workdir / 'api.db'}", connect_args={"check_same_thread": False}
+    )
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+    Base.metadata.create_all(bind=engine)
+
+    original_session_local = database.SessionLocal
+    original_media_root = ingest_module.MEDIA_ROOT
+    original_rates_path = os.environ.get("EMPIRE_FX_RATES_PATH")
+    os.environ.setdefault("EMPIRE_FX_RATES_PATH", str(FX_RATES_FIXTURE))
+    database.SessionLocal = factory
+    media_root = workdir / "media"
+    media_root.mkdir(parents=True, exist_ok=True)
+    ingest_module.MEDIA_ROOT = media_root
+
+    # One client drives every request; measure the app, not the rate limits.
+    unlimited = AdmissionPolicy(rate=float("inf"), burst=1_000_000_000, concurrency=1024)
+    app = create_app(admission_policies={name: unlimited for name in DEFAULT_POLICIES})
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+        database.SessionLocal = original_session_local
+        ingest_module.MEDIA_ROOT = original_media_root
+        if original_rates_path is None:
+            os.environ.pop("EMPIRE_FX_RATES_PATH", None)
+        engine.dispose()
+
+
+def bench_api(docs: list[str], workdir: Path) -> list[BenchmarkResult]:
+    with api_client(workdir) as client:
+
+        def ingest(index: int, doc: str) -> None:
+            response = client.post(
+                "/ingest/purchase",
+                data={"llc_name": f"Bench LLC {index % 4}"},
+                files={"file": (f"invoice-{index}.txt", doc, "text/plain")},
+            )
+            response.raise_for_status()
+
+        ingest_result = measure(
+            "api_ingest_purchase",
+            (lambda i=i, doc=doc: ingest(i, doc) for i, doc in enumerate(docs)),
+        )
+
+        def get(path: str, **params: str) -> None:
+            client.get(path, params=params).raise_for_status()
+
+        read_result = measure(
+            "api_dashboard_reads",
+            (
+                (lambda path=path: get(path))
+                for _ in range(5)
+                for path in ("/purchase_orders", "/events", "/agents/suggestions")
+            ),
+        )
+        search_result = measure(
+            "api_search_documents",
+            (lambda query=query: get("/search/documents", query=query) for query in SEARCH_QUERIES),
+        )
+    return [ingest_result, read_result, search_result]
+
+
+def run_all(
+    *,
+    micro_docs: int = 500,
+    search_docs: int = 2_000,
+    api_docs: int = 100,
+    seed: int = 1234,
+) -> list[BenchmarkResult]:
+    micro_corpus = list(generate_corpus(micro_docs, seed=seed))
+    results = [bench_parse(micro_corpus), bench_embed(micro_corpus)]
+    with tempfile.TemporaryDirectory(prefix="empire-bench-") as tmp:
+        workdir = Path(tmp)
+        search_corpus = list(generate_corpus(search_docs, seed=seed + 1))
+        with seeded_session(search_corpus, workdir) as session:
+            results.append(bench_search(session))
+            results.append(bench_search(session, mode="vector"))
+        results.extend(bench_api(list(generate_corpus(api_docs, seed=seed + 2)), workdir))
+    return results
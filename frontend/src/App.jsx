@@ -213,13 +213,13 @@ export default function App() {
   );
 
   const handleApprove = useCallback(
-    async (suggestionId) => {
+    async (suggestionId, llcId) => {
       if (!suggestionId) {
         return;
       }
       setApproving((prev) => [...prev, suggestionId]);
       try {
-        await approveSuggestion(suggestionId);
+        await approveSuggestion(suggestionId, llcId);
         await refreshCore();
       } catch (err) {
         setError(err.message ?? 'Unable to approve suggestion.');
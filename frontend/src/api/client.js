@@ -67,21 +67,32 @@ function buildUrl(path) {
   }
 }
 
-export async function fetchEvents() {
-  return request("/events");
+export async function fetchEvents({ entity, type, limit } = {}) {
+  const params = new URLSearchParams();
+  if (entity) params.set("entity", entity);
+  if (type) params.set("type", type);
+  if (limit) params.set("limit", String(limit));
+  const query = params.toString();
+  return request(query ? `/events?${query}` : "/events");
 }
 
 export async function fetchPurchaseOrders() {
   return request("/purchase_orders");
 }
 
-export async function fetchSuggestions(limit = 50) {
+export async function fetchSuggestions({ limit = 50, ...filters } = {}) {
   const query = new URLSearchParams({ limit: String(limit) });
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== null && value !== "") {
+      query.set(key, String(value));
+    }
+  }
   return request(`/agents/suggestions?${query.toString()}`);
 }
 
-export async function approveSuggestion(suggestionId) {
-  return request(`/agents/suggestions/${suggestionId}/approve`, {
+export async function approveSuggestion(suggestionId, llcId) {
+  const query = llcId == null ? "" : `?${new URLSearchParams({ llc_id: llcId }).toString()}`;
+  return request(`/agents/suggestions/${suggestionId}/approve${query}`, {
     method: "POST",
   });
 }
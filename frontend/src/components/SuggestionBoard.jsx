@@ -57,7 +57,7 @@ function SuggestionCard({ suggestion, onApprove, isApproving }) {
         <footer>
           <button
             className="button primary"
-            onClick={() => onApprove?.(suggestion.id)}
+            onClick={() => onApprove?.(suggestion.id, suggestion.llc_id)}
             disabled={isApproving}
           >
             {isApproving ? 'Approving…' : 'Approve'}
@@ -75,7 +75,7 @@ export default function SuggestionBoard({ open, resolved, onApprove, approving =
       <div style={{ display: 'grid', gap: '16px' }}>
         {open.map((suggestion) => (
           <SuggestionCard
-            key={suggestion.id}
+            key={`${suggestion.llc_id}:${suggestion.id}`}
             suggestion={suggestion}
             onApprove={onApprove}
             isApproving={approving.includes(suggestion.id)}
@@ -96,7 +96,7 @@ export default function SuggestionBoard({ open, resolved, onApprove, approving =
           <h3 style={{ marginBottom: '12px' }}>Recently approved</h3>
           <div className="document-list">
             {resolved.map((suggestion) => (
-              <SuggestionCard key={suggestion.id} suggestion={suggestion} onApprove={onApprove} isApproving={false} />
+              <SuggestionCard key={`${suggestion.llc_id}:${suggestion.id}`} suggestion={suggestion} onApprove={onApprove} isApproving={false} />
             ))}
           </div>
         </div>
@@ -14,6 +14,16 @@ import app.database as database
 from app.services import ingest as ingest_module
 
 
+FX_RATES_FIXTURE = Path(__file__).resolve().parent / "data" / "fx_rates.csv"
+
+
+@pytest.fixture(autouse=True)
+def fx_rates(monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Synthetic month-start rates; the app ships none and requires a feed."""
+    monkeypatch.setenv("EMPIRE_FX_RATES_PATH", str(FX_RATES_FIXTURE))
+    return FX_RATES_FIXTURE
+
+
 @pytest.fixture()
 def client(tmp_path: Path) -> Generator[TestClient, None, None]:
     db_path = tmp_path / "test.db"
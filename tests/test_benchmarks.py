@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+from app.services.parser import PurchaseParser
+from benchmarks.corpus import generate_corpus, generate_invoice
+from benchmarks.harness import compare, load_results, results_document, write_results
+from benchmarks.run import main
+from benchmarks.scenarios import run_all
+
+
+def test_generated_invoices_parse() -> None:
+    parser = PurchaseParser()
+    rng = random.Random(7)
+    for index in range(25):
+        parsed, confidence = parser.parse_text(generate_invoice(rng, index))
+        assert parsed.vendor_name != "Unknown Vendor"
+        assert parsed.total_amount > 0
+        assert parsed.due_date is not None
+        assert confidence >= 0.8
+    assert list(generate_corpus(5, seed=3)) == list(generate_corpus(5, seed=3))
+
+
+def test_suite_writes_results_and_flags_regressions(tmp_path: Path) -> None:
+    results = run_all(micro_docs=5, search_docs=20, api_docs=3)
+    names = {result.name for result in results}
+    assert {"parse_text", "embed_text", "search_documents", "api_ingest_purchase"} <= names
+
+    document = results_document(results, micro_docs=5)
+    path = tmp_path / "results.json"
+    write_results(document, path)
+    loaded = load_results(path)
+    assert loaded["benchmarks"].keys() == document["benchmarks"].keys()
+
+    faster = {"benchmarks": {name: {**r, "mean_s": r["mean_s"] / 10} for name, r in loaded["benchmarks"].items()}}
+    assert all(item.regressed for item in compare(loaded, faster))
+    assert not any(item.regressed for item in compare(loaded, loaded))
+
+    baseline = tmp_path / "baseline.json"
+    args = ["--micro-docs", "3", "--search-docs", "10", "--api-docs", "2", "--baseline", str(baseline)]
+    assert main([*args, "--save-baseline"]) == 0
+    assert baseline.exists()
+    assert main([*args, "--tolerance", "1000"]) == 0
@@ -49,3 +49,1180 @@ def test_purchase_ingest_and_agent_flow(client: TestClient) -> None:
     approval_payload = approve_response.json()
     assert approval_payload["suggestion"]["approved"] is True
     assert approval_payload["event"]["event_type"] == "agent_suggestion.approved"
+
+
+def _ingest(client: TestClient, content: str, filename: str = "invoice.txt", llc_name: str = "Orbital LLC") -> dict:
+    response = client.post(
+        "/ingest/purchase",
+        data={"llc_name": llc_name},
+        files={"file": (filename, content, "text/plain")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_events_filtered_by_entity_and_type(client: TestClient) -> None:
+    first = _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\n")
+    second = _ingest(client, "Vendor: Nova Parts\nTotal: 200\n", filename="invoice2.txt")
+    order_id = first["purchase_order"]["id"]
+
+    response = client.get("/events", params={"entity": f"purchase_order:{order_id}"})
+    assert response.status_code == 200
+    events = response.json()
+    assert {event["event_type"] for event in events} == {"ingest.parsed", "purchase_order.created"}
+    assert all(
+        event["payload"].get("purchase_order_id") in (None, order_id) for event in events
+    )
+
+    suggestion_id = first["suggestions"][0]["id"]
+    client.post(f"/agents/suggestions/{suggestion_id}/approve")
+    approved = client.get(
+        "/events",
+        params={"entity": f"purchase_order:{order_id}", "type": "agent_suggestion.approved"},
+    ).json()
+    assert [event["payload"]["suggestion_id"] for event in approved] == [suggestion_id]
+
+    other = client.get(
+        "/events", params={"entity": f"purchase_order:{second['purchase_order']['id']}"}
+    ).json()
+    assert all(event["id"] not in {e["id"] for e in events} for event in other)
+
+    assert client.get("/events", params={"entity": "purchase_order"}).status_code == 400
+
+
+def test_event_chain_verification_detects_tampering(client: TestClient) -> None:
+    from app import database, models
+    from app.services.chain import verify_incremental, verify_segments
+
+    _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\n")
+    first = client.post("/events/verify").json()
+    assert first["ok"] is True
+    assert first["verified_events"] == 3
+
+    _ingest(client, "Vendor: Nova Parts\nTotal: 200\n", filename="invoice2.txt")
+    incremental = client.post("/events/verify").json()
+    assert incremental["ok"] is True
+    assert incremental["verified_events"] == 3
+
+    with database.SessionLocal() as session:
+        verify_incremental(session, from_checkpoint=False, segment_size=2)
+        assert verify_segments(session).segments_verified == 3
+
+        event = session.query(models.Event).order_by(models.Event.id).first()
+        event.payload = {**event.payload, "llc_id": 999}
+        session.commit()
+
+        full = verify_incremental(session, from_checkpoint=False)
+        assert full.ok is False
+        assert full.first_invalid_event_id == event.id
+        segments = verify_segments(session)
+        assert segments.ok is False
+        assert segments.first_invalid_event_id == event.id
+
+
+def test_segment_audit_runs_inline_over_in_memory_databases() -> None:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.pool import StaticPool
+
+    from app import models
+    from app.services.chain import verify_incremental, verify_segments
+    from app.services.events import record_event
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for index in range(5):
+            record_event(session, "test.event", {"index": index})
+        session.commit()
+        assert verify_incremental(session, segment_size=2).verified_events == 5
+        result = verify_segments(session)
+        assert result.ok is True
+        assert result.segments_verified == 2
+        assert result.verified_events == 4
+    engine.dispose()
+
+
+def test_concurrent_writers_link_events_in_turn(client: TestClient) -> None:
+    import threading
+    import time
+
+    from app import database
+    from app.services.chain import verify_incremental
+    from app.services.events import record_event
+
+    errors: list[Exception] = []
+
+    def second_writer() -> None:
+        try:
+            with database.SessionLocal() as session:
+                record_event(session, "test.second", {"writer": 2})
+                session.commit()
+        except Exception as exc:
+            errors.append(exc)
+
+    with database.SessionLocal() as first:
+        record_event(first, "test.first", {"writer": 1})
+        first.flush()
+        writer = threading.Thread(target=second_writer)
+        writer.start()
+        time.sleep(0.2)
+        first.commit()
+    writer.join()
+    assert errors == []
+    with database.SessionLocal() as session:
+        result = verify_incremental(session, from_checkpoint=False)
+        assert result.ok is True
+        assert result.verified_events == 2
+
+
+def test_list_endpoints_support_etags_and_invalidate_on_write(client: TestClient) -> None:
+    _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\n")
+    first = client.get("/purchase_orders")
+    etag = first.headers["etag"]
+    assert len(first.json()) == 1
+
+    not_modified = client.get("/purchase_orders", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+    suggestions = client.get("/agents/suggestions")
+    suggestion_id = suggestions.json()[0]["id"]
+    client.post(f"/agents/suggestions/{suggestion_id}/approve")
+    refreshed = client.get(
+        "/agents/suggestions", headers={"If-None-Match": suggestions.headers["etag"]}
+    )
+    assert refreshed.status_code == 200
+    assert refreshed.json()[0]["approved"] is True
+
+    _ingest(client, "Vendor: Nova Parts\nTotal: 200\n", filename="invoice2.txt")
+    changed = client.get("/purchase_orders", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+
+def test_cache_tag_versions_are_shared_through_the_backend() -> None:
+    from starlette.requests import Request
+
+    from app.cache import LRUCacheBackend, ResponseCache, invalidate
+
+    shared = LRUCacheBackend()
+    worker_a, worker_b = ResponseCache(shared), ResponseCache(shared)
+    request = Request(
+        {"type": "http", "method": "GET", "path": "/events", "query_string": b"limit=5", "headers": []}
+    )
+    produced: list[bytes] = []
+
+    def produce() -> bytes:
+        produced.append(b"[]")
+        return b"[]"
+
+    worker_a.respond(request, ["events"], produce)
+    worker_b.respond(request, ["events"], produce)
+    assert len(produced) == 1
+
+    # A commit in another process bumps the tag in the shared store only.
+    shared.bump_tags(["events"])
+    worker_b.respond(request, ["events"], produce)
+    assert len(produced) == 2
+
+    invalidate("events")
+    assert shared.tag_versions(["events", "suggestions"]) == [2, 0]
+
+
+def test_fast_serializers_match_pydantic_schemas(client: TestClient, monkeypatch) -> None:
+    import json
+
+    from fastapi.encoders import jsonable_encoder
+
+    from app import database, models, schemas, serializers
+
+    first = _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\nDue: 2020-01-01\n")
+    client.post(f"/agents/suggestions/{first['suggestions'][0]['id']}/approve")
+
+    with database.SessionLocal() as session:
+        expected = {
+            "purchase_orders": [
+                jsonable_encoder(schemas.PurchaseOrder.from_orm(row))
+                for row in session.query(models.PurchaseOrder).all()
+            ],
+            "events": [
+                jsonable_encoder(schemas.Event.from_orm(row))
+                for row in session.query(models.Event).all()
+            ],
+            "suggestions": [
+                jsonable_encoder(schemas.AgentSuggestion.from_orm(row))
+                for row in session.query(models.AgentSuggestion).all()
+            ],
+        }
+        for orjson_module in (serializers.orjson, None):
+            monkeypatch.setattr(serializers, "orjson", orjson_module)
+            encoded = {
+                "purchase_orders": serializers.encode_purchase_orders(
+                    session.execute(serializers.select_purchase_orders())
+                ),
+                "events": serializers.encode_events(
+                    session.execute(serializers.select_events())
+                ),
+                "suggestions": serializers.encode_suggestions(
+                    session.execute(serializers.select_suggestions())
+                ),
+            }
+            for name, body in encoded.items():
+                assert json.loads(body) == expected[name], name
+
+
+def test_metrics_endpoint_reports_stage_and_sql_timings(client: TestClient) -> None:
+    _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\n")
+    client.get("/search/documents", params={"query": "Stellar"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for stage in ("ingest.parse", "ingest.embed", "ingest.vendor", "search.score"):
+        assert f'empire_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'empire_sql_statements_total{operation="INSERT"}' in body
+    assert "# TYPE empire_sql_duration_seconds histogram" in body
+
+
+def test_schema_check_runs_in_lifespan_and_is_cached(tmp_path, monkeypatch) -> None:
+    from sqlalchemy import create_engine, inspect, text
+    from sqlalchemy.orm import sessionmaker
+
+    import app.database as database
+    from app.main import create_app
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+
+    app = create_app()
+    assert "events" not in inspect(engine).get_table_names()
+
+    with TestClient(app) as lifespan_client:
+        assert "events" in inspect(engine).get_table_names()
+        with engine.connect() as conn:
+            version = conn.execute(text("PRAGMA user_version")).scalar()
+        assert version == database.schema_fingerprint()
+        metrics = lifespan_client.get("/metrics").text
+        assert 'empire_startup_seconds{phase="schema"}' in metrics
+
+    calls = []
+    monkeypatch.setattr(database.Base.metadata, "create_all", lambda **kw: calls.append(kw))
+    database.init_db(engine)
+    database._checked_engines.clear()
+    database.init_db(engine)
+    assert calls == []
+
+
+def test_init_db_migrates_a_baseline_database(tmp_path, monkeypatch) -> None:
+    from datetime import datetime
+
+    import pytest
+    from sqlalchemy import MetaData, Table, create_engine, func, inspect, select, text
+    from sqlalchemy.orm import Session
+
+    from app import database, migrations, models
+    from app.services.agent import suggestion_priority
+    from app.services.chain import verify_incremental
+
+    # Tables and columns added to the schema after the baseline release.
+    later_tables = {
+        "app_settings", "embedding_backfills", "parse_cache", "document_terms",
+        "event_entities", "event_chain_checkpoints", "event_chain_segments", "schema_backfills",
+    }
+    later_columns = {
+        "vendors.normalized_name", "document_vectors.llc_id", "events.prev_hash",
+        "events.chain_hash", "purchase_orders.amount_base", "agent_suggestions.llc_id",
+        "agent_suggestions.vendor_id", "agent_suggestions.priority",
+    }
+
+    def baseline_engine(name: str):
+        baseline = MetaData()
+        for table in database.Base.metadata.sorted_tables:
+            if table.name not in later_tables:
+                Table(table.name, baseline, *[
+                    column._copy() for column in table.columns
+                    if f"{table.name}.{column.name}" not in later_columns
+                ])
+        engine = create_engine(f"sqlite:///{tmp_path / name}")
+        baseline.create_all(engine)
+        return engine, baseline.tables
+
+    engine, tables = baseline_engine("baseline.db")
+    created = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(tables["llcs"].insert(), [{"id": 1, "name": "Orbital LLC"}])
+        conn.execute(tables["vendors"].insert(), [
+            {"id": 1, "name": "Stellar Supplies Inc"}, {"id": 2, "name": "Stellar Supplies, Inc."},
+        ])
+        conn.execute(tables["media_objects"].insert(), [{"id": 1, "llc_id": 1}])
+        conn.execute(tables["purchase_orders"].insert(), [{
+            "id": 1, "llc_id": 1, "vendor_id": 1, "media_object_id": 1, "total_amount": 15000.0,
+            "currency": "USD", "status": "pending", "due_date": datetime(2020, 1, 1), "created_at": created,
+        }, {
+            "id": 2, "llc_id": 1, "vendor_id": 1, "media_object_id": 1, "total_amount": 15000.0,
+            "currency": "CHF", "status": "pending", "due_date": None, "created_at": created,
+        }])
+        conn.execute(tables["agent_suggestions"].insert(), [{
+            "id": 1, "purchase_order_id": 1, "agent_name": "FinanceAgent", "suggestion_type": "flag-overdue",
+            "message": "overdue", "approved": False, "created_at": created,
+        }, {
+            "id": 2, "purchase_order_id": 2, "agent_name": "FinanceAgent",
+            "suggestion_type": "review-unrated-currency", "message": "unrated", "approved": False,
+            "created_at": created,
+        }])
+        conn.execute(tables["events"].insert(), [
+            {"event_type": "ingest.received", "payload": {"llc_id": 1, "media_object_id": 1}, "created_at": created},
+            {"event_type": "purchase_order.created", "payload": {"purchase_order_id": 1}, "created_at": created},
+        ])
+
+    database.init_db(engine)
+
+    assert migrations.missing_columns(engine) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA user_version")).scalar() == database.schema_fingerprint()
+    indexes = {index["name"] for index in inspect(engine).get_indexes("agent_suggestions")}
+    assert "ix_agent_suggestions_queue_priority" in indexes
+    with Session(engine) as session:
+        assert [v.normalized_name for v in session.query(models.Vendor).order_by(models.Vendor.id)] == [
+            "stellar supplies", None,
+        ]
+        assert session.get(models.PurchaseOrder, 1).amount_base == 15000.0
+        suggestion = session.get(models.AgentSuggestion, 1)
+        assert (suggestion.llc_id, suggestion.vendor_id) == (1, 1)
+        assert suggestion.priority == suggestion_priority(15000.0, datetime(2020, 1, 1), now=created)
+        # Unrated orders are not ranked by their raw total.
+        assert session.get(models.AgentSuggestion, 2).priority == 0.0
+        assert session.execute(select(func.count()).select_from(models.EventEntity)).scalar_one() == 3
+        chain = verify_incremental(session, from_checkpoint=False)
+        assert chain.ok and chain.verified_events == 2
+
+    # A backfill interrupted mid-way resumes from its checkpoint on the next start.
+    resumed, tables = baseline_engine("resumed.db")
+    with resumed.begin() as conn:
+        conn.execute(tables["events"].insert(), [
+            {"event_type": "test.event", "payload": {"index": index}, "created_at": created}
+            for index in range(5)
+        ])
+    chain_events = migrations.BACKFILLS["events.chain_hash"]
+    batches = []
+
+    def flaky_chain(conn, after_id):
+        if len(batches) == 2:
+            raise RuntimeError("interrupted")
+        batches.append(after_id)
+        return chain_events(conn, after_id)
+
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 2)
+    monkeypatch.setitem(migrations.BACKFILLS, "events.chain_hash", flaky_chain)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        database.init_db(resumed)
+    with resumed.connect() as conn:
+        assert conn.execute(text("PRAGMA user_version")).scalar() == 0
+    monkeypatch.setitem(migrations.BACKFILLS, "events.chain_hash", chain_events)
+    database.init_db(resumed)
+    assert batches == [0, 2]
+    with Session(resumed) as session:
+        progress = session.get(models.SchemaBackfill, "events.chain_hash")
+        assert progress.completed_at is not None
+        chain = verify_incremental(session, from_checkpoint=False)
+        assert chain.ok and chain.verified_events == 5
+    with resumed.connect() as conn:
+        assert conn.execute(text("PRAGMA user_version")).scalar() == database.schema_fingerprint()
+
+    stale, _ = baseline_engine("stale.db")
+    monkeypatch.setattr(migrations, "migrate", lambda bind: [])
+    with pytest.raises(migrations.SchemaMismatch, match="vendors.normalized_name"):
+        database.init_db(stale)
+    with stale.connect() as conn:
+        assert conn.execute(text("PRAGMA user_version")).scalar() == 0
+
+
+def test_duplicate_documents_reuse_cached_parse(client: TestClient, monkeypatch) -> None:
+    from app import database, models
+    from app.services import parse_cache, parser, vectorizer
+    from app.services.parser import PurchaseParser
+
+    content = "Vendor: Stellar Supplies\nTotal: 15000\nDue: 2023-09-01\n"
+    first = _ingest(client, content)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached document was parsed again")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(PurchaseParser, "parse_text", fail)
+        second = _ingest(client, content, filename="resend.txt")
+    assert second["purchase_order"]["total_amount"] == first["purchase_order"]["total_amount"]
+    assert second["purchase_order"]["due_date"] == first["purchase_order"]["due_date"]
+
+    with database.SessionLocal() as session:
+        entry = session.query(models.ParseCacheEntry).one()
+        assert entry.hits == 1
+        vectors = session.query(models.DocumentVector).all()
+        assert vectors[0].vector == vectors[1].vector
+
+    monkeypatch.setattr(vectorizer, "VECTOR_DIM", 16)
+    _ingest(client, content, filename="after-upgrade.txt")
+    with database.SessionLocal() as session:
+        assert session.query(models.ParseCacheEntry).count() == 2
+        assert parse_cache.ParseCache(session).evict() == 1
+        session.commit()
+        remaining = session.query(models.ParseCacheEntry).one()
+        assert remaining.embedding_strategy == "hash-v1:16"
+        assert len(remaining.vector) == 16
+    assert parser.PARSER_VERSION == remaining.parser_version
+
+
+def test_hybrid_search_only_returns_matching_documents(client: TestClient) -> None:
+    satellite = _ingest(client, "Vendor: Stellar Supplies\nItem: Satellite Antenna\nTotal: 15000\n")
+    _ingest(client, "Vendor: Nova Parts\nItem: Office Chairs\nTotal: 200\n", filename="chairs.txt")
+    _ingest(client, "Vendor: Comet Courier\nItem: Satellite Dish\nTotal: 900\n", filename="dish.txt")
+
+    hybrid = client.get("/search/documents", params={"query": "satellite antenna"}).json()
+    media_ids = [result["media_object_id"] for result in hybrid]
+    assert len(media_ids) == 2
+    assert satellite["purchase_order"]["media_object"]["id"] in media_ids
+
+    assert client.get("/search/documents", params={"query": "zeppelin"}).json() == []
+    vector = client.get("/search/documents", params={"query": "zeppelin", "mode": "vector"}).json()
+    assert len(vector) == 3
+
+    limited = client.get("/search/documents", params={"query": "satellite", "limit": 1}).json()
+    assert len(limited) == 1
+    assert client.get("/search/documents", params={"query": "x", "mode": "bogus"}).status_code == 400
+
+
+def test_backfill_reembeds_and_switches_search_strategy(client: TestClient) -> None:
+    from app import database, models
+    from app.services.backfill import coverage, run_backfill
+    from app.services.embeddings import active_strategy
+
+    for index in range(5):
+        _ingest(client, f"Vendor: Vendor {index}\nItem: Satellite Antenna\nTotal: {100 + index}\n", filename=f"{index}.txt")
+
+    job = run_backfill(database.SessionLocal, "hash-v2", chunk_size=2, max_chunks=1)
+    assert job.status == "running"
+    assert job.processed == 2
+    with database.SessionLocal() as session:
+        assert active_strategy(session) == "hash-v1"
+        assert coverage(session, "hash-v2") == (2, 5)
+
+    # Documents ingested mid-backfill are embedded with both strategies.
+    _ingest(client, "Vendor: Late Arrival\nItem: Satellite Antenna\nTotal: 50\n", filename="late.txt")
+    assert client.get("/search/documents", params={"query": "satellite"}).json()
+
+    job = run_backfill(database.SessionLocal, "hash-v2", chunk_size=2, workers=2)
+    assert job.status == "completed"
+    with database.SessionLocal() as session:
+        assert active_strategy(session) == "hash-v2"
+        assert coverage(session, "hash-v2") == (6, 6)
+        v2 = session.query(models.DocumentVector).filter_by(embedding_strategy="hash-v2").all()
+        assert {len(vector.vector) for vector in v2} == {64}
+        assert session.query(models.EmbeddingBackfill).count() == 1
+
+    results = client.get("/search/documents", params={"query": "satellite"}).json()
+    assert len(results) == 6
+
+
+def test_dedicated_llc_is_routed_to_its_own_shard(client: TestClient, tmp_path, monkeypatch) -> None:
+    from app import database, models
+    from app.main import create_app
+    from app.services import backfill
+    from app.services.embeddings import active_strategy, set_active_strategy
+    from app.sharding import ShardRouter
+
+    router = ShardRouter(shard_dir=tmp_path / "shards", dedicated={"Noisy LLC"})
+    app = create_app(shard_router=router)
+    app.dependency_overrides = client.app.dependency_overrides
+    with TestClient(app) as sharded:
+        orbital = _ingest(sharded, "Vendor: Stellar Supplies\nItem: Satellite Antenna\nTotal: 15000\n")
+        noisy = _ingest(
+            sharded,
+            "Vendor: Nova Parts\nItem: Satellite Dish\nTotal: 15000\n",
+            filename="noisy.txt",
+            llc_name="Noisy LLC",
+        )
+        noisy_llc_id = noisy["purchase_order"]["llc_id"]
+
+        with database.SessionLocal() as primary:
+            assert primary.query(models.PurchaseOrder).count() == 1
+        assert router.shard_ids() == [noisy_llc_id]
+
+        noisy_orders = sharded.get("/purchase_orders", params={"llc": "Noisy LLC"}).json()
+        assert [order["vendor"]["name"] for order in noisy_orders] == ["Nova Parts"]
+        orbital_orders = sharded.get("/purchase_orders", params={"llc": "Orbital LLC"}).json()
+        assert [order["vendor"]["name"] for order in orbital_orders] == ["Stellar Supplies"]
+        everything = sharded.get("/purchase_orders").json()
+        assert {(order["vendor"]["name"], order["llc_id"]) for order in everything} == {
+            ("Stellar Supplies", orbital["purchase_order"]["llc_id"]),
+            ("Nova Parts", noisy_llc_id),
+        }
+
+        scoped_search = sharded.get(
+            "/search/documents", params={"query": "satellite", "llc": "Noisy LLC"}
+        ).json()
+        assert [r["media_object_id"] for r in scoped_search] == [
+            noisy["purchase_order"]["media_object"]["id"]
+        ]
+        fanned_out = sharded.get("/search/documents", params={"query": "satellite"}).json()
+        assert {(r["media_object_id"], r["llc_id"]) for r in fanned_out} == {
+            (orbital["purchase_order"]["media_object"]["id"], orbital["purchase_order"]["llc_id"]),
+            (noisy["purchase_order"]["media_object"]["id"], noisy_llc_id),
+        }
+
+        # Without an LLC every shard's chain is verified, not just the primary's.
+        verified = sharded.post("/events/verify", params={"mode": "full"}).json()
+        assert verified["ok"] is True
+        assert [shard["shard_llc_id"] for shard in verified["shards"]] == [None, noisy_llc_id]
+        assert verified["verified_events"] == sum(s["verified_events"] for s in verified["shards"])
+        with router.sessionmaker_for(noisy_llc_id)() as shard:
+            tampered = shard.query(models.Event).order_by(models.Event.id).first()
+            tampered.payload = {**tampered.payload, "tampered": True}
+            shard.commit()
+        broken = sharded.post("/events/verify", params={"mode": "full"}).json()
+        assert broken["ok"] is False
+        assert (broken["shard_llc_id"], broken["first_invalid_event_id"]) == (noisy_llc_id, tampered.id)
+        assert [shard["ok"] for shard in broken["shards"]] == [True, False]
+        with router.sessionmaker_for(noisy_llc_id)() as shard:
+            shard.get(models.Event, tampered.id).payload = {
+                k: v for k, v in tampered.payload.items() if k != "tampered"
+            }
+            shard.commit()
+        assert sharded.post("/events/verify", params={"mode": "full"}).json()["ok"] is True
+
+        # Ids are shard-local: both tenants have suggestion 1, told apart by llc_id.
+        suggestion_id = noisy["suggestions"][0]["id"]
+        assert suggestion_id == orbital["suggestions"][0]["id"]
+        ambiguous = sharded.post(f"/agents/suggestions/{suggestion_id}/approve")
+        assert ambiguous.status_code == 409
+        assert sharded.post("/agents/suggestions/approve", json={"ids": [suggestion_id]}).status_code == 409
+        approved = sharded.post(
+            f"/agents/suggestions/{suggestion_id}/approve", params={"llc_id": noisy_llc_id}
+        )
+        assert approved.status_code == 200
+        assert approved.json()["suggestion"]["llc_id"] == noisy_llc_id
+        pending = sharded.get("/agents/suggestions", params={"approved": False}).json()
+        assert {(s["id"], s["llc_id"]) for s in pending if s["id"] == suggestion_id} == {
+            (suggestion_id, orbital["purchase_order"]["llc_id"])
+        }
+
+        # Equal priorities and ids across shards still page without skipping rows.
+        seen, cursor = [], None
+        while True:
+            params = {"order": "priority", "limit": 1, **({"cursor": cursor} if cursor else {})}
+            page = sharded.get("/agents/suggestions", params=params)
+            seen.extend((s["id"], s["llc_id"]) for s in page.json())
+            cursor = page.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        everything_suggested = sharded.get("/agents/suggestions", params={"limit": 0}).json()
+        assert sorted(seen) == sorted((s["id"], s["llc_id"]) for s in everything_suggested)
+
+        noisy_events = sharded.get("/events", params={"llc": "Noisy LLC"}).json()
+        assert "agent_suggestion.approved" in {event["event_type"] for event in noisy_events}
+        assert sharded.get("/purchase_orders", params={"llc": "Missing LLC"}).status_code == 404
+
+        # A strategy switched on one shard only is not mixed into fan-out
+        # scores: both shards still cover hash-v1, so fan-out search uses it.
+        with router.sessionmaker_for(noisy_llc_id)() as shard:
+            set_active_strategy(shard, "hash-v2")
+            shard.commit()
+        assert len(sharded.get("/search/documents", params={"query": "satellite"}).json()) == 2
+
+        monkeypatch.setenv("EMPIRE_SHARD_DIR", str(tmp_path / "shards"))
+        assert backfill.main(["--strategy", "hash-v2"]) == 0
+        with database.SessionLocal() as primary, router.sessionmaker_for(noisy_llc_id)() as shard:
+            assert active_strategy(primary) == active_strategy(shard) == "hash-v2"
+            assert backfill.coverage(shard, "hash-v2") == (1, 1)
+        assert len(sharded.get("/search/documents", params={"query": "satellite"}).json()) == 2
+
+
+def test_vendor_names_resolve_through_normalized_and_fuzzy_matching(client: TestClient) -> None:
+    import pytest
+    from sqlalchemy import event
+    from sqlalchemy.exc import IntegrityError
+
+    from app import database, models
+
+    first = _ingest(client, "Vendor: Stellar Supplies\nTotal: 100\n")
+    second = _ingest(client, "Vendor: Stellar Supplies Inc.\nTotal: 200\n", filename="b.txt")
+    third = _ingest(client, "Vendor: STELLAR SUPPLIES, LLC\nTotal: 300\n", filename="c.txt")
+    fuzzy = _ingest(client, "Vendor: Blue Ocean Logistic\nTotal: 50\n", filename="d.txt")
+    canonical = _ingest(client, "Vendor: Blue Ocean Logistics\nTotal: 60\n", filename="e.txt")
+    other = _ingest(client, "Vendor: Nova Arts\nTotal: 70\n", filename="f.txt")
+    nova = _ingest(client, "Vendor: Nova Parts\nTotal: 80\n", filename="g.txt")
+
+    stellar_ids = {
+        payload["purchase_order"]["vendor"]["id"] for payload in (first, second, third)
+    }
+    assert len(stellar_ids) == 1
+    assert second["purchase_order"]["vendor"]["name"] == "Stellar Supplies"
+    assert fuzzy["purchase_order"]["vendor"]["id"] == canonical["purchase_order"]["vendor"]["id"]
+    assert other["purchase_order"]["vendor"]["id"] != nova["purchase_order"]["vendor"]["id"]
+
+    twelve = _ingest(client, "Vendor: Harbor Warehouse 12\nTotal: 90\n", filename="h.txt")
+    thirteen = _ingest(client, "Vendor: Harbor Warehouse 13\nTotal: 90\n", filename="i.txt")
+    assert twelve["purchase_order"]["vendor"]["id"] != thirteen["purchase_order"]["vendor"]["id"]
+
+    # Index hits attach the cached vendor without selecting it again.
+    engine = database.SessionLocal.kw["bind"]
+    statements: list[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    try:
+        repeat = _ingest(client, "Vendor: Stellar Supplies Corp\nTotal: 400\n", filename="j.txt")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert repeat["purchase_order"]["vendor"] == first["purchase_order"]["vendor"]
+    assert not [statement for statement in statements if "FROM vendors" in statement]
+
+    with database.SessionLocal() as session:
+        assert session.query(models.Vendor).count() == 6
+        duplicate = models.Vendor(name="Stellar Supplies Ltd", normalized_name="stellar supplies")
+        session.add(duplicate)
+        with pytest.raises(IntegrityError):
+            session.flush()
+
+
+def test_rule_engine_overrides_and_batch_backtest(client: TestClient, tmp_path, monkeypatch) -> None:
+    import json
+    import os
+    import time
+
+    from app import database, models
+    from app.services.rules import DEFAULT_RULES, load_columns, load_rules
+
+    rules = json.loads(json.dumps(DEFAULT_RULES))
+    repayment = next(rule for rule in rules if rule["id"] == "create-repayment-plan")
+    repayment["overrides"] = {"Frugal LLC": {"min_amount": 500}, "Quiet LLC": {"enabled": False}}
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps({"rules": rules}))
+    monkeypatch.setenv("EMPIRE_RULES_PATH", str(rules_path))
+
+    frugal = _ingest(client, "Vendor: Nova Parts\nTotal: 800\n", llc_name="Frugal LLC")
+    quiet = _ingest(client, "Vendor: Nova Parts\nTotal: 20000\n", filename="b.txt", llc_name="Quiet LLC")
+    _ingest(client, "Vendor: Nova Parts\nTotal: 900\nDue: 2020-01-01\n", filename="c.txt")
+    claim = _ingest(
+        client,
+        "Vendor: Nova Parts\nTotal: 50\nSee https://example.com/claims/7\n",
+        filename="d.txt",
+    )
+
+    def types(payload: dict) -> set[str]:
+        return {s["suggestion_type"] for s in payload["suggestions"]}
+
+    assert "create-repayment-plan" in types(frugal)
+    assert "create-repayment-plan" not in types(quiet)
+    history = next(s for s in claim["suggestions"] if s["suggestion_type"] == "review-vendor-history")
+    assert history["message"].startswith("Nova Parts has 3 other open orders")
+    assert "review-related-claim" in types(claim)
+
+    with database.SessionLocal() as session:
+        rule_set = load_rules()
+        batch = rule_set.evaluate_batch(load_columns(session))
+        for rule in rule_set.rules:
+            expected = sorted(
+                s.purchase_order_id
+                for s in session.query(models.AgentSuggestion).filter_by(suggestion_type=rule.id)
+            )
+            if rule.id == "review-vendor-history":
+                # Only the later orders had open history when they were ingested.
+                assert set(expected) <= set(batch.purchase_order_ids(rule.id))
+            else:
+                assert batch.purchase_order_ids(rule.id) == expected, rule.id
+
+    backtest = client.post(
+        "/agents/rules/evaluate",
+        json={"rules": [{**repayment, "overrides": {}, "params": {"min_amount": 850}}]},
+    )
+    assert backtest.status_code == 200
+    [result] = backtest.json()
+    assert result["evaluated"] == 4
+    assert result["hits"] == 2
+    invalid = {"id": "x", "when": [{"fact": "nope", "op": "=="}], "message": ""}
+    assert client.post("/agents/rules/evaluate", json={"rules": [invalid]}).status_code == 400
+    for message in ("Owed by {vendor}", "Owed {0}", "Owed {amount_base"):
+        templated = {**repayment, "id": "templated", "message": message}
+        response = client.post("/agents/rules/evaluate", json={"rules": [templated]})
+        assert response.status_code == 400, message
+    assert client.post("/agents/rules/evaluate", params={"llc": "Frugal LLC"}).json()[1]["hits"] == 1
+
+    # Posted rules are backtested without becoming metric labels.
+    adhoc = {**repayment, "id": "adhoc-backtest-rule"}
+    assert client.post("/agents/rules/evaluate", json={"rules": [adhoc]}).status_code == 200
+    metrics = client.get("/metrics").text
+    assert 'rule="create-repayment-plan"' in metrics
+    assert "adhoc-backtest-rule" not in metrics
+
+    # A broken edit keeps the last good rules in effect.
+    last_good = load_rules()
+    rules_path.write_text("{not json")
+    os.utime(rules_path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+    assert load_rules() is last_good
+    broken = _ingest(client, "Vendor: Nova Parts\nTotal: 800\n", filename="e.txt", llc_name="Frugal LLC")
+    assert "create-repayment-plan" in types(broken)
+
+
+def test_bulk_approval_by_ids_and_filters_keeps_chain_valid(client: TestClient) -> None:
+    first = _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\nDue: 2020-01-01\n")
+    second = _ingest(client, "Vendor: Nova Parts\nTotal: 12000\nDue: 2020-02-01\n", filename="b.txt")
+    _ingest(client, "Vendor: Apex Tools\nTotal: 11000\n", filename="c.txt", llc_name="Other LLC")
+
+    overdue = [
+        s["id"] for payload in (first, second) for s in payload["suggestions"]
+        if s["suggestion_type"] == "flag-overdue"
+    ]
+    assert client.post(f"/agents/suggestions/{overdue[0]}/approve").status_code == 200
+
+    response = client.post("/agents/suggestions/approve", json={"ids": [*overdue, 9999]})
+    assert response.status_code == 200
+    assert response.json() == {
+        "approved": 1,
+        "already_approved": 1,
+        "not_found": 1,
+        "approved_ids": [overdue[1]],
+    }
+
+    by_filter = client.post(
+        "/agents/suggestions/approve",
+        params={"llc": "Orbital LLC"},
+        json={"suggestion_type": "create-repayment-plan"},
+    ).json()
+    assert by_filter["approved"] == 2
+    assert by_filter["already_approved"] == 0
+    # Matches approved earlier are not conflicts; filters report none.
+    repeat = client.post(
+        "/agents/suggestions/approve",
+        params={"llc": "Orbital LLC"},
+        json={"suggestion_type": "create-repayment-plan"},
+    ).json()
+    assert (repeat["approved"], repeat["already_approved"], repeat["not_found"]) == (0, 0, 0)
+    suggestions = client.get("/agents/suggestions").json()
+    pending = {s["suggestion_type"] for s in suggestions if not s["approved"]}
+    assert pending == {"create-repayment-plan"}
+
+    assert client.post("/agents/suggestions/approve", json={}).status_code == 400
+
+    approvals = client.get(
+        "/events", params={"type": "agent_suggestion.approved", "entity": f"suggestion:{overdue[1]}"}
+    ).json()
+    assert len(approvals) == 1
+    assert approvals[0]["payload"]["suggestion_type"] == "flag-overdue"
+    verification = client.post("/events/verify", params={"mode": "full"}).json()
+    assert verification["ok"] is True
+
+
+def test_suggestion_queue_filters_pages_and_summarizes(client: TestClient) -> None:
+    import itertools
+
+    from sqlalchemy import text
+
+    from app import database, serializers
+    from app.services.suggestions import QUEUE_ORDERS, encode_cursor, queue_filters, select_queue
+
+    big = _ingest(client, "Vendor: Stellar Supplies\nTotal: 15000\nDue: 2020-01-01\n")
+    small = _ingest(client, "Vendor: Nova Parts\nTotal: 300\nDue: 2020-01-01\n", filename="b.txt")
+    _ingest(client, "Vendor: Apex Tools\nTotal: 20000\n", filename="c.txt", llc_name="Other LLC")
+    client.post(f"/agents/suggestions/{small['suggestions'][0]['id']}/approve")
+
+    everything = client.get("/agents/suggestions").json()
+    assert len(everything) == 4
+    assert all(s["llc_id"] is not None and s["vendor_id"] for s in everything)
+
+    pending = client.get("/agents/suggestions", params={"approved": False}).json()
+    assert {s["id"] for s in pending} == {s["id"] for s in everything if not s["approved"]}
+    for_order = client.get(
+        "/agents/suggestions", params={"purchase_order_id": big["purchase_order"]["id"]}
+    ).json()
+    assert {s["suggestion_type"] for s in for_order} == {"flag-overdue", "create-repayment-plan"}
+    vendor_id = small["purchase_order"]["vendor"]["id"]
+    for_vendor = client.get("/agents/suggestions", params={"vendor_id": vendor_id}).json()
+    assert [s["vendor_id"] for s in for_vendor] == [vendor_id]
+    orbital = client.get("/agents/suggestions", params={"llc": "Orbital LLC"}).json()
+    assert len(orbital) == 3
+
+    # Overdue large orders outrank fresh ones, which outrank small ones.
+    by_priority = client.get("/agents/suggestions", params={"order": "priority"}).json()
+    assert [s["priority"] for s in by_priority] == sorted(
+        (s["priority"] for s in by_priority), reverse=True
+    )
+    assert by_priority[0]["purchase_order_id"] == big["purchase_order"]["id"]
+
+    for order in ("recent", "priority"):
+        seen, cursor = [], None
+        while True:
+            params = {"order": order, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/agents/suggestions", params=params)
+            seen.extend(s["id"] for s in page.json())
+            cursor = page.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        expected = client.get("/agents/suggestions", params={"order": order}).json()
+        assert seen == [s["id"] for s in expected]
+    assert client.get("/agents/suggestions", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/agents/suggestions", params={"order": "amount"}).status_code == 400
+
+    # Pending pages, first or deep, seek an index in sort order for both orders.
+    engine = database.SessionLocal.kw["bind"]
+    with database.SessionLocal() as session:
+        row = session.execute(serializers.select_suggestions().limit(1)).one()
+    for order, llc_id in itertools.product(QUEUE_ORDERS, (None, row[8])):
+        for cursor in (None, encode_cursor(order, row)):
+            stmt = select_queue(queue_filters(approved=False, llc_id=llc_id), order=order, cursor=cursor)
+            compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+            with engine.connect() as conn:
+                plan = [step[-1] for step in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+            assert len(plan) == 1 and "USING" in plan[0] and "INDEX" in plan[0], (order, llc_id, plan)
+            assert ("approved=?" in plan[0]) and (llc_id is None or "llc_id=?" in plan[0])
+            assert cursor is None or "<?" in plan[0], plan
+
+    summary = client.get("/agents/suggestions/summary").json()
+    assert {row["suggestion_type"]: (row["total"], row["pending"]) for row in summary} == {
+        "create-repayment-plan": (2, 2),
+        "flag-overdue": (2, 1),
+    }
+    orbital_summary = client.get("/agents/suggestions/summary", params={"llc": "Orbital LLC"})
+    assert {row["suggestion_type"]: row["total"] for row in orbital_summary.json()} == {
+        "create-repayment-plan": 1,
+        "flag-overdue": 2,
+    }
+
+
+def test_analytics_export_and_spend_summary(client: TestClient, tmp_path, monkeypatch) -> None:
+    import io
+    import os
+    import time
+    import zipfile
+    from datetime import datetime
+    from pathlib import Path
+
+    import numpy as np
+    import pytest
+
+    from app import database, models
+    from app.services import analytics
+    from app.services.fx import load_rates
+
+    monkeypatch.setattr(analytics, "EXPORT_ROOT", tmp_path / "exports")
+    first = _ingest(client, "Vendor: Stellar Supplies\nTotal: 100\n")
+    _ingest(client, "Vendor: Stellar Supplies\nTotal: 250\nCurrency: EUR\n", filename="b.txt")
+    _ingest(client, "Vendor: Nova Parts\nTotal: 40\n", filename="c.txt")
+    _ingest(client, "Vendor: Apex Tools\nTotal: 999\n", filename="d.txt", llc_name="Other LLC")
+    with database.SessionLocal() as session:
+        session.add_all(
+            [
+                models.Transaction(
+                    purchase_order_id=first["purchase_order"]["id"],
+                    amount=60,
+                    happened_at=datetime(2024, 3, 5),
+                ),
+                models.Transaction(amount=5, direction="incoming", happened_at=datetime(2024, 3, 6)),
+            ]
+        )
+        session.commit()
+
+    response = client.post("/analytics/exports", params={"llc": "Orbital LLC"})
+    assert response.status_code == 200
+    manifest = response.json()
+    assert manifest["rows"] == 3
+    columns = analytics.load_export(manifest["path"])
+    assert isinstance(columns.arrays["total_amount"], np.memmap)
+    assert sorted(columns.arrays["total_amount"].tolist()) == [40.0, 100.0, 250.0]
+    assert set(columns.decode("vendor")) == {"Stellar Supplies", "Nova Parts"}
+
+    # Remote clients download the export as a zip; expired exports are pruned.
+    download = client.get(manifest["download_url"])
+    assert download.status_code == 200
+    assert download.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(download.content)) as archive:
+        assert "manifest.json" in archive.namelist()
+        assert np.load(io.BytesIO(archive.read("total_amount.npy"))).tolist() == (
+            columns.arrays["total_amount"].tolist()
+        )
+    assert client.get("/analytics/exports/..%2F..%2Fetc").status_code == 404
+    newer = client.post("/analytics/exports", params={"table": "transactions"}).json()
+    expired = time.time() - analytics.EXPORT_RETENTION.total_seconds() - 60
+    os.utime(manifest["path"], (expired, expired))
+    client.post("/analytics/exports", params={"table": "transactions"})
+    assert not Path(manifest["path"]).exists()
+    assert client.get(manifest["download_url"]).status_code == 404
+    assert client.delete(f"/analytics/exports/{newer['id']}").status_code == 204
+    assert client.get(f"/analytics/exports/{newer['id']}").status_code == 404
+
+    month = datetime.utcnow().strftime("%Y-%m")
+    eur = load_rates().rate("EUR")
+    summary = client.get("/analytics/spend", params={"llc": "Orbital LLC"}).json()
+    assert summary == [
+        {"vendor": "Stellar Supplies", "month": month, "currency": "EUR", "total": 250.0,
+         "total_base": pytest.approx(250 * eur), "count": 1, "unrated": 0},
+        {"vendor": "Stellar Supplies", "month": month, "currency": "USD", "total": 100.0,
+         "total_base": 100.0, "count": 1, "unrated": 0},
+        {"vendor": "Nova Parts", "month": month, "currency": "USD", "total": 40.0,
+         "total_base": 40.0, "count": 1, "unrated": 0},
+    ]
+    by_vendor = client.get("/analytics/spend", params={"group_by": "vendor"}).json()
+    assert [(row["vendor"], row["total_base"]) for row in by_vendor] == [
+        ("Apex Tools", 999.0),
+        ("Stellar Supplies", pytest.approx(100 + 250 * eur)),
+        ("Nova Parts", 40.0),
+    ]
+    future = client.get("/analytics/spend", params={"start": "2999-01-01T00:00:00"}).json()
+    assert future == []
+
+    transactions = client.get(
+        "/analytics/spend", params={"table": "transactions", "group_by": "month"}
+    ).json()
+    assert transactions == [{"month": "2024-03", "total": 60.0, "total_base": 60.0, "count": 1, "unrated": 0}]
+    assert client.get("/analytics/spend", params={"group_by": "colour"}).status_code == 400
+    assert client.post("/analytics/exports", params={"table": "users"}).status_code == 400
+
+
+def test_fx_normalizes_amounts_for_rules_and_rollups(
+    client: TestClient, tmp_path, monkeypatch, caplog
+) -> None:
+    import logging
+    from datetime import date
+
+    import pytest
+
+    from app import database, models
+    from app.services import fx
+    from app.services.rules import load_columns, load_rules
+
+    rates = tmp_path / "rates.csv"
+    rates.write_text("date,currency,rate\n2020-01-01,JPY,0.01\n2024-01-01,JPY,0.0065\n2024-01-01,EUR,1.10\n")
+    monkeypatch.setenv("EMPIRE_FX_RATES_PATH", str(rates))
+    table = fx.load_rates()
+    assert table.rate("JPY", date(2019, 6, 1)) == 0.01
+    assert table.rate("JPY", date(2023, 12, 31)) == 0.01
+    assert table.rate("JPY", date(2024, 1, 1)) == 0.0065
+    assert table.rate("usd") == 1.0
+    assert table.rate("CHF") is None
+    converted = table.convert_many(
+        [100, 100, 100, 100],
+        ["JPY", "JPY", None, "CHF"],
+        ["2021-01-01", "2025-01-01", "2025-01-01", "2025-01-01"],
+    )
+    assert converted[:3].tolist() == pytest.approx([1.0, 0.65, 100.0])
+    assert converted[3] != converted[3]
+
+    yen = _ingest(client, "Vendor: Tokyo Parts\nTotal: 1200000\nCurrency: JPY\n")
+    euros = _ingest(client, "Vendor: Berlin Parts\nTotal: 9500\nCurrency: EUR\n", filename="b.txt")
+    assert yen["purchase_order"]["amount_base"] == pytest.approx(7800.0)
+    assert euros["purchase_order"]["amount_base"] == pytest.approx(10450.0)
+    # 1.2M yen is below the 10k base threshold; 9.5k euros is above it.
+    assert "create-repayment-plan" not in {s["suggestion_type"] for s in yen["suggestions"]}
+    assert "create-repayment-plan" in {s["suggestion_type"] for s in euros["suggestions"]}
+
+    with database.SessionLocal() as session:
+        legacy = session.get(models.PurchaseOrder, yen["purchase_order"]["id"])
+        legacy.amount_base = None
+        session.commit()
+        columns = load_columns(session)
+        assert columns.arrays["amount_base"].tolist() == pytest.approx([7800.0, 10450.0])
+        batch = load_rules().evaluate_batch(columns)
+        assert batch.purchase_order_ids("create-repayment-plan") == [euros["purchase_order"]["id"]]
+
+    totals = client.get("/analytics/spend", params={"group_by": ""}).json()
+    assert totals == [
+        {"total": 1209500.0, "total_base": pytest.approx(18250.0), "count": 2, "unrated": 0}
+    ]
+
+    # Unrated currencies are never valued as base currency: amount rules skip
+    # them, they are flagged for review and reported apart in spend summaries.
+    francs = _ingest(client, "Vendor: Zurich Parts\nTotal: 15000\nCurrency: CHF\n", filename="c.txt")
+    assert francs["purchase_order"]["amount_base"] is None
+    types = {s["suggestion_type"]: s for s in francs["suggestions"]}
+    assert "create-repayment-plan" not in types
+    assert types["review-unrated-currency"]["message"] == (
+        "No exchange rate for CHF; review the amount by hand."
+    )
+    assert types["review-unrated-currency"]["priority"] == 0.0
+    with database.SessionLocal() as session:
+        batch = load_rules().evaluate_batch(load_columns(session))
+        assert francs["purchase_order"]["id"] not in batch.purchase_order_ids("create-repayment-plan")
+        assert batch.purchase_order_ids("review-unrated-currency") == [francs["purchase_order"]["id"]]
+    totals = client.get("/analytics/spend", params={"group_by": ""}).json()
+    assert totals == [
+        {"total": 1224500.0, "total_base": pytest.approx(18250.0), "count": 3, "unrated": 1}
+    ]
+
+    # No feed means no rates, not an outage: reads and ingest keep working.
+    monkeypatch.delenv("EMPIRE_FX_RATES_PATH")
+    monkeypatch.setattr(fx, "_unconfigured", None)
+    with caplog.at_level(logging.WARNING, logger="app.services.fx"):
+        assert fx.load_rates().rate("EUR") is None
+        assert fx.load_rates().rate("USD") == 1.0
+    assert len([r for r in caplog.records if "EMPIRE_FX_RATES_PATH" in r.getMessage()]) == 1
+    unrated = _ingest(client, "Vendor: Berlin Parts\nTotal: 90\nCurrency: EUR\n", filename="d.txt")
+    assert unrated["purchase_order"]["amount_base"] is None
+    assert client.get("/purchase_orders").status_code == 200
+
+
+def test_statement_ingest_streams_line_items_into_batched_orders(client: TestClient) -> None:
+    import hashlib
+    from pathlib import Path
+
+    import pytest
+    from sqlalchemy import select
+
+    from app import database, models
+    from app.services.parser import PurchaseParser
+
+    csv_statement = (
+        "Invoice No,Vendor,Amount,Currency,Due Date,Status\n"
+        "INV-1001,Stellar Supplies,\"15,000.00\",USD,2020-01-01,Open\n"
+        "INV-1002,Nova Parts,200.00,EUR,2030-05-01,Paid\n"
+        "INV-1003,Apex Tools,(50.00),USD,,Open\n"
+    )
+    response = client.post(
+        "/ingest/statement",
+        data={"llc_name": "Orbital LLC"},
+        files={"file": ("statement.csv", csv_statement, "text/csv")},
+    )
+    assert response.status_code == 200
+    payload = response.json()
+    # The (50.00) credit is counted, not turned into a negative order.
+    assert len(payload["purchase_order_ids"]) == 2
+    assert payload["credit_line_items"] == 1
+    assert payload["suggestions"] == {"create-repayment-plan": 1, "flag-overdue": 1}
+
+    orders = {order["id"]: order for order in client.get("/purchase_orders").json()}
+    first, second = (orders[order_id] for order_id in payload["purchase_order_ids"])
+    assert first["total_amount"] == 15000.0
+    assert payload["media_object"]["mime"] == "text/csv"
+    assert second["status"] == "paid"
+    assert second["amount_base"] > second["total_amount"]
+    assert all(order["total_amount"] > 0 for order in orders.values())
+    assert payload["total_amount_base"] == pytest.approx(
+        sum(order["amount_base"] for order in (first, second))
+    )
+
+    # Stored bytes, hash and term index all come from the single streamed read.
+    with database.SessionLocal() as session:
+        media = session.get(models.MediaObject, payload["media_object"]["id"])
+        assert Path(media.storage_path).read_text() == csv_statement
+        assert media.sha256 == hashlib.sha256(csv_statement.encode()).hexdigest()
+        terms = set(
+            session.scalars(
+                select(models.DocumentTerm.term).where(models.DocumentTerm.media_object_id == media.id)
+            )
+        )
+        assert {"invoice", "inv1003apex"} <= terms
+
+    text_statement = (
+        "Vendor: Orbit Metals\n"
+        "Currency: USD\n"
+        "INV-2001  2020-03-01  Steel plates  $12,500.00  Overdue\n"
+        "INV-2002  2031-03-01  Bolts  $75.00\n"
+    )
+    text_payload = client.post(
+        "/ingest/statement",
+        data={"llc_name": "Orbital LLC"},
+        files={"file": ("statement.txt", text_statement, "text/plain")},
+    ).json()
+    assert len(text_payload["purchase_order_ids"]) == 2
+    assert text_payload["suggestions"]["flag-overdue"] == 1
+
+    created = client.get("/events", params={"type": "purchase_order.created", "limit": 10}).json()
+    assert len(created) == 4
+    assert client.post("/events/verify", params={"mode": "full"}).json()["ok"] is True
+
+    # Trailing terms are not the amount: the symbol-marked figure wins.
+    parsed = list(PurchaseParser().iter_statement("Vendor: Widget Co\nINV-7 Widgets $1,250.00 net 30\n"))
+    assert [(item.total_amount, item.description) for item in parsed] == [(1250.0, "Widgets net 30")]
+    parsed = list(PurchaseParser().iter_statement("Vendor: Widget Co\nINV-8 Bolts 1,250.00 net 30\n"))
+    assert [item.total_amount for item in parsed] == [1250.0]
+
+    storage = Path(media.storage_path).parent
+    stored = set(storage.iterdir())
+    empty = client.post(
+        "/ingest/statement",
+        data={"llc_name": "Orbital LLC"},
+        files={"file": ("empty.csv", "Vendor,Amount\n", "text/csv")},
+    )
+    assert empty.status_code == 400
+    assert set(storage.iterdir()) == stored
+
+
+def test_admission_control_rate_limits_and_sheds_by_endpoint_class() -> None:
+    import asyncio
+
+    from app.admission import (
+        AdmissionMiddleware,
+        AdmissionPolicy,
+        ConcurrencyGate,
+        Shed,
+        classify,
+        client_id,
+        parse_trusted_proxies,
+    )
+    from app.instrumentation import render_metrics
+
+    async def ok(scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    policies = {
+        "ingest": AdmissionPolicy(rate=0.5, burst=2, concurrency=1),
+        "search": AdmissionPolicy(rate=100.0, burst=100, concurrency=1),
+        "heavy": AdmissionPolicy(rate=0.01, burst=1, concurrency=1),
+        "reads": AdmissionPolicy(rate=100.0, burst=100, concurrency=4),
+    }
+    limited = TestClient(AdmissionMiddleware(ok, policies=policies))
+    statuses = [limited.post("/ingest/purchase").status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    rejected = limited.post("/ingest/purchase")
+    assert rejected.headers["Retry-After"] == "2"
+    assert rejected.json() == {"detail": "rate limited"}
+    # Self-declared client ids and forwarded headers from untrusted peers don't reset the bucket.
+    assert limited.post("/ingest/purchase", headers={"X-Client-Id": "other"}).status_code == 429
+    assert limited.post("/ingest/purchase", headers={"X-Forwarded-For": "198.51.100.1"}).status_code == 429
+    assert limited.get("/purchase_orders").status_code == 200
+    assert limited.post("/events/verify", params={"mode": "full"}).status_code == 200
+    assert limited.post("/events/verify").status_code == 429
+    assert [classify(path) for path in ("/analytics/exports", "/agents/rules/evaluate", "/events")] == [
+        "heavy",
+        "heavy",
+        "reads",
+    ]
+
+    proxies = parse_trusted_proxies("10.0.0.0/8, 192.0.2.7")
+
+    def scope(peer: str, forwarded: str) -> dict:
+        return {"client": (peer, 4321), "headers": [(b"x-forwarded-for", forwarded.encode())]}
+
+    assert client_id(scope("10.1.2.3", "198.51.100.7, 203.0.113.9, 192.0.2.7"), proxies) == "203.0.113.9"
+    assert client_id(scope("203.0.113.50", "198.51.100.7"), proxies) == "203.0.113.50"
+    assert client_id(scope("10.1.2.3", "10.0.0.9"), proxies) == "10.1.2.3"
+    assert limited.get("/metrics").status_code == 200
+    assert 'empire_admission_shed_total{endpoint_class="ingest",reason="rate_limited"}' in render_metrics()
+
+    async def contend() -> list[str]:
+        gate = ConcurrencyGate("search", AdmissionPolicy(1.0, 1, 1, queue_timeout=0.05, max_queue=1))
+        await gate.acquire()
+        outcomes = []
+        for _ in range(2):
+            try:
+                await gate.acquire()
+            except Shed as shed:
+                outcomes.append(shed.reason)
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        try:
+            await gate.acquire()
+        except Shed as shed:
+            outcomes.append(shed.reason)
+        gate.release()
+        await waiter
+        outcomes.append(f"in_flight={gate.in_flight}")
+        gate.release()
+        return outcomes
+
+    assert asyncio.run(contend()) == ["queue_timeout", "queue_timeout", "queue_full", "in_flight=1"]